@@ -0,0 +1,68 @@
+"""Per-row PayrollDB writes against the bulk executemany API.
+
+    python -m benchmarks.bench_bulk_writes --sizes 1k,10k,50k --commit-every 1000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import parse_sizes, rate, temporary_db
+
+
+def employee_rows(count):
+    for i in range(count):
+        yield f"Employee {i}", 4000 + i % 5000, 10 + i % 15, 500 + i % 1500
+
+
+def payroll_rows(count):
+    for i in range(count):
+        yield i % 1000 + 1, i % 4, i % 6, i % 21, 100.0, 6000.0, 4400.0, f"2024-{i % 12 + 1:02d}-28"
+
+
+def per_row(count):
+    with temporary_db() as db:
+        start = time.perf_counter()
+        for row in employee_rows(count):
+            db.insert(*row)
+        employees = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for row in payroll_rows(count):
+            db.record_payroll(*row)
+        payroll = time.perf_counter() - start
+    return employees, payroll
+
+
+def bulk(count, commit_every):
+    with temporary_db() as db:
+        start = time.perf_counter()
+        db.insert_many(employee_rows(count), commit_every)
+        employees = time.perf_counter() - start
+
+        start = time.perf_counter()
+        db.record_payroll_many(payroll_rows(count), commit_every)
+        payroll = time.perf_counter() - start
+    return employees, payroll
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1k,10k,50k')
+    parser.add_argument('--commit-every', type=int, default=1000)
+    parser.add_argument('--skip-per-row', action='store_true', help="only run the bulk paths")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'path':<22} {'insert':>14} {'record_payroll':>16}")
+    for count in parse_sizes(args.sizes):
+        paths = [('bulk, commit at end', lambda: bulk(count, None)),
+                 (f'bulk, every {args.commit_every}', lambda: bulk(count, args.commit_every))]
+        if not args.skip_per_row:
+            paths.insert(0, ('per row', lambda: per_row(count)))
+
+        for name, run in paths:
+            employees, payroll = run()
+            print(f"{count:>8,} {name:<22} {rate(count, employees):>14} {rate(count, payroll):>16}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Cold-start time of the command-line interface.
+
+    python -m benchmarks.bench_cli_startup --runs 20 --output cli_startup.jsonl
+
+Each command is started as a fresh interpreter. The heavy GUI/Excel modules must not be imported
+by commands that do not need them; the benchmark fails if they are.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'payroll_cli.py')
+
+FORBIDDEN_MODULES = ('tkinter', 'tkcalendar', 'openpyxl')
+
+COMMANDS = {
+    'help': ['--help'],
+    'db info': ['db', 'info'],
+    'report csv': ['report', 'gross', '--start', '2024-01-01', '--end', '2024-12-31', '--format', 'csv'],
+}
+
+
+def imported_modules(command, cwd):
+    # Top-level packages imported by the command, read from -X importtime
+    process = subprocess.run([sys.executable, '-X', 'importtime', CLI] + command, cwd=cwd,
+                             capture_output=True, text=True)
+    modules = set()
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.rsplit('|', 1)[1].strip().split('.')[0])
+    return modules
+
+
+def cold_start(command, cwd, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, CLI] + command, cwd=cwd, capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help="append the results as one JSON line to this file")
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, command in COMMANDS.items():
+            leaked = sorted(imported_modules(command, cwd).intersection(FORBIDDEN_MODULES))
+            timings = cold_start(command, cwd, args.runs)
+            results[name] = {'median_ms': statistics.median(timings) * 1000, 'min_ms': min(timings) * 1000}
+            print(f"{name:<12} median {results[name]['median_ms']:7.1f}ms  min {results[name]['min_ms']:7.1f}ms"
+                  + (f"  imports {', '.join(leaked)}!" if leaked else ""))
+            failed = failed or bool(leaked)
+
+    if args.output:
+        with open(args.output, 'a') as file:
+            file.write(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}) + '\n')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Report queries from several threads while a payroll run writes to the same database, in WAL mode
+(the default) and with the old rollback journal, where readers wait for the writer.
+
+    python -m benchmarks.bench_concurrent_reads --employees 20000 --months 12 --readers 4
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+from payroll_database import PayrollDB
+
+
+def percentile(values, share):
+    return float(np.percentile(values, share)) * 1000 if values else float('nan')
+
+
+def read_reports(db, employees, stop, latencies, errors):
+    # Alternates between one employee's summary and a month of the gross pay report
+    rng = np.random.default_rng(threading.get_ident())
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            employee_id = int(rng.integers(1, employees + 1))
+            db.get_overall_salary_summary(employee_id, '2018-01-01', '2018-12-31')
+            db.conn.execute("SELECT COUNT(*), TOTAL(gross_pay) FROM salary_rollup WHERE period = '2018-06'").fetchone()
+        except sqlite3.OperationalError:
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def run_payroll_months(db, months):
+    # A payroll run per month after the existing history, all in one transaction
+    from payroll_engine import AttendanceTable, run_payroll
+
+    attendance = AttendanceTable.from_rows([])
+    with db.transaction():
+        for month in range(1, months + 1):
+            start = date(2030, month, 1)
+            run_payroll(db, attendance, start, start.replace(day=28))
+
+
+def measure(journal_mode, args):
+    from synthetic_data import generate_dataset
+
+    with tempfile.TemporaryDirectory() as folder:
+        db = PayrollDB(os.path.join(folder, 'bench_payroll.db'), busy_timeout=args.busy_timeout,
+                       journal_mode=journal_mode)
+        generate_dataset(db, args.employees, 12)
+
+        results = {}
+        for phase in ('idle', 'during write'):
+            stop = threading.Event()
+            latencies, errors = [], []
+            readers = [threading.Thread(target=read_reports, args=(db, args.employees, stop, latencies, errors))
+                       for _ in range(args.readers)]
+            for reader in readers:
+                reader.start()
+
+            start = time.perf_counter()
+            if phase == 'idle':
+                time.sleep(args.idle)
+            else:
+                run_payroll_months(db, args.months)
+            elapsed = time.perf_counter() - start
+
+            stop.set()
+            for reader in readers:
+                reader.join()
+            results[phase] = (elapsed, latencies, len(errors))
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', type=int, default=20000)
+    parser.add_argument('--months', type=int, default=12, help="months written by the payroll run")
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--idle', type=float, default=2.0, help="seconds of reads without a writer")
+    parser.add_argument('--busy-timeout', type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'journal':<10} {'phase':<14} {'seconds':>8} {'reads':>8} {'reads/s':>9} {'p50':>9} {'p99':>9} "
+          f"{'max':>9} {'errors':>7}")
+    for journal_mode in ('WAL', 'DELETE'):
+        for phase, (elapsed, latencies, errors) in measure(journal_mode, args).items():
+            print(f"{journal_mode:<10} {phase:<14} {elapsed:>8.2f} {len(latencies):>8} "
+                  f"{len(latencies) / elapsed:>9.0f} {percentile(latencies, 50):>7.2f}ms "
+                  f"{percentile(latencies, 99):>7.2f}ms {max(latencies, default=0) * 1000:>7.1f}ms {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Payroll runs over a large workforce with the employee cache on and off: monthly batch runs (the
+employee rates are read once per run) and per-employee lookups as the Salary tab makes them.
+
+    python -m benchmarks.bench_employee_cache --employees 100k --months 3
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+from benchmarks.common import parse_sizes
+from payroll_database import PayrollDB
+from payroll_engine import AttendanceTable, EmployeeRates, compute_payroll, run_payroll
+from synthetic_data import generate_employees
+
+
+def monthly_runs(db, months):
+    # One payroll run per month; the salary rows are written as usual
+    attendance = AttendanceTable.from_rows([])
+    start = time.perf_counter()
+    for month in range(1, months + 1):
+        first = date(2030, month, 1)
+        run_payroll(db, attendance, first, first.replace(day=28))
+    return time.perf_counter() - start
+
+
+def rates_loads(db, runs):
+    # The read side of a batch run alone
+    start = time.perf_counter()
+    for _ in range(runs):
+        EmployeeRates.load(db)
+    return (time.perf_counter() - start) / runs
+
+
+def rate_lookups(db, employees, passes, rng):
+    # Salary tab style: look up an employee, then compute their pay
+    ids = rng.integers(1, employees + 1, employees * passes).tolist()
+    start = time.perf_counter()
+    for employee_id in ids:
+        _, _, monthly_salary, overtime_rate, allowances = db.search(employee_id)
+        compute_payroll(monthly_salary, allowances, overtime_rate, 1, 8, 30)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', default='100k')
+    parser.add_argument('--months', type=int, default=3)
+    parser.add_argument('--passes', type=int, default=3, help="lookups per employee in the per-employee test")
+    parser.add_argument('--cache-size', type=int, default=150000,
+                        help="entries of the cache when on (the application default is smaller)")
+    args = parser.parse_args()
+
+    employees = parse_sizes(args.employees)[0]
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'bench_payroll.db')
+        db = PayrollDB(path, cache_size=0)
+        generate_employees(db, employees, np.random.default_rng(0))
+        db.close()
+
+        print(f"{'cache':<6} {'monthly runs':>13} {'rates load':>11} {'lookups':>9} {'lookups/s':>10}  cache stats")
+        for label, cache_size in (('off', 0), ('on', args.cache_size)):
+            db = PayrollDB(path, cache_size=cache_size)
+            runs = monthly_runs(db, args.months)
+            load = rates_loads(db, 10)
+            # Start each variant from the same salary table
+            db.conn.execute("DELETE FROM salary")
+            db.conn.commit()
+            lookups = rate_lookups(db, employees, args.passes, np.random.default_rng(1))
+            stats = db.employee_cache.stats() if db.employee_cache else {}
+            summary = ", ".join(f"{name} {value:.2f}" if isinstance(value, float) else f"{name} {value}"
+                                for name, value in stats.items())
+            print(f"{label:<6} {runs:>12.2f}s {load * 1000:>9.1f}ms {lookups:>8.2f}s "
+                  f"{employees * args.passes / lookups:>10,.0f}  {summary}")
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Scroll and refresh latency of the employee list: the old full reload (every employee fetched after
+each edit) against the paginated model behind the Employee tab's grid.
+
+Measures the database side only (the model runs without a display).
+
+    python -m benchmarks.bench_employee_grid --sizes 1k,100k
+"""
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from benchmarks.common import parse_sizes, temporary_db
+from employee_grid import EmployeePageModel
+from synthetic_data import generate_employees
+
+VISIBLE_ROWS = 12
+
+
+def timed(repeat, action):
+    # Mean milliseconds per call
+    start = time.perf_counter()
+    for _ in range(repeat):
+        action()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def measure(db, count, repeat):
+    model = EmployeePageModel(db)
+    rng = random.Random(0)
+    position = [0]
+
+    def scroll(step):
+        def action():
+            position[0] = (position[0] + step) % max(count - VISIBLE_ROWS, 1)
+            model.window(position[0], VISIBLE_ROWS)
+        return action
+
+    def jump():
+        model.window(rng.randrange(count), VISIBLE_ROWS)
+
+    def resort():
+        model.sort_by(rng.choice(('name', 'monthly_salary', 'overtime_rate', 'allowances')), rng.random() < 0.5)
+        model.window(0, VISIBLE_ROWS)
+
+    def update():
+        # Edit an employee on screen, keeping its sort key, and patch the row
+        model.sort_by('id')
+        rows = model.window(count // 2, VISIBLE_ROWS)
+        employee_id, name, monthly_salary, overtime_rate, allowances = rows[0]
+        db.update(name, monthly_salary, overtime_rate, allowances + 1, employee_id)
+        model.patch(employee_id)
+
+    def insert():
+        db.insert("New Employee", 5000, 15, 1000)
+        model.inserted()
+        model.window(position[0], VISIBLE_ROWS)
+
+    return {
+        'full reload (old list)': timed(max(repeat // 20, 1), lambda: [tuple(row) for row in db.fetch()]),
+        'first page': timed(repeat, lambda: EmployeePageModel(db).window(0, VISIBLE_ROWS)),
+        'scroll 1 row': timed(repeat, scroll(1)),
+        'scroll 1 page': timed(repeat, scroll(VISIBLE_ROWS)),
+        'jump (scrollbar drag)': timed(repeat, jump),
+        'sort by column': timed(repeat, resort),
+        'update + patch row': timed(repeat, update),
+        'insert + refresh': timed(repeat, insert),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='1k,100k')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    sizes = parse_sizes(args.sizes)
+    results = {}
+    for count in sizes:
+        with temporary_db() as db:
+            generate_employees(db, count, np.random.default_rng(0))
+            results[count] = measure(db, count, args.repeat)
+
+    print(f"{'operation':<26}" + "".join(f"{f'{count:,} employees':>18}" for count in sizes))
+    for name in results[sizes[0]]:
+        print(f"{name:<26}" + "".join(f"{results[count][name]:>16.3f}ms" for count in sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Type-ahead search latency (PayrollDB.search_names) on a large workforce, for name prefixes of one to
+four letters, two-word queries and ID prefixes. Exits with status 1 when the p99 latency of a query
+kind is over the budget.
+
+    python -m benchmarks.bench_employee_search --employees 100k --budget-ms 10
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.common import parse_sizes, temporary_db
+from synthetic_data import FIRST_NAMES, LAST_NAMES, generate_employees
+
+
+def queries(rng, count, employees):
+    names = FIRST_NAMES + LAST_NAMES
+    kinds = {
+        '1 letter': lambda: rng.choice(names)[:1],
+        '2 letters': lambda: rng.choice(names)[:2],
+        '4 letters': lambda: rng.choice(names)[:4],
+        'first + last prefix': lambda: f"{rng.choice(FIRST_NAMES)[:3]} {rng.choice(LAST_NAMES)[:2]}",
+        'no match': lambda: "zq" + rng.choice(names)[:2],
+        'ID prefix': lambda: str(rng.randint(1, employees))[:rng.randint(1, 4)],
+    }
+    return {kind: [make() for _ in range(count)] for kind, make in kinds.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', default='100k')
+    parser.add_argument('--queries', type=int, default=200, help="queries per kind")
+    parser.add_argument('--budget-ms', type=float, default=10.0)
+    args = parser.parse_args()
+
+    employees = parse_sizes(args.employees)[0]
+    rng = random.Random(0)
+    failed = False
+
+    with temporary_db() as db:
+        start = time.perf_counter()
+        generate_employees(db, employees, np.random.default_rng(0))
+        print(f"{employees:,} employees loaded and indexed in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'query':<22} {'p50':>9} {'p99':>9} {'max':>9} {'matches':>8}")
+        for kind, texts in queries(rng, args.queries, employees).items():
+            latencies, matches = [], 0
+            for text in texts:
+                start = time.perf_counter()
+                matches += len(db.search_names(text))
+                latencies.append((time.perf_counter() - start) * 1000)
+            p99 = np.percentile(latencies, 99)
+            over = p99 > args.budget_ms
+            failed |= over
+            print(f"{kind:<22} {np.percentile(latencies, 50):>7.2f}ms {p99:>7.2f}ms {max(latencies):>7.2f}ms "
+                  f"{matches / len(texts):>8.1f}{'  OVER BUDGET' if over else ''}")
+
+        # What keeping the index in sync costs the writers
+        timings = {}
+        for name, action in (('insert', lambda i: db.insert(f"Search Test {i}", 5000, 15, 1000)),
+                             ('rename', lambda i: db.update(f"Renamed Test {i}", 5000, 15, 1000, i + 1)),
+                             ('delete', lambda i: db.delete(i + 1))):
+            start = time.perf_counter()
+            for i in range(200):
+                action(i)
+            timings[name] = (time.perf_counter() - start) / 200 * 1000
+        print("write with index sync: " + ", ".join(f"{name} {ms:.2f}ms" for name, ms in timings.items()))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
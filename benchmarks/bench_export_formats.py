@@ -0,0 +1,39 @@
+"""Write throughput and file size of every export format for the Gross Pay Report.
+
+    python -m benchmarks.bench_export_formats --rows 1M
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.common import dataset_db, parse_sizes
+from report_export import EXPORTERS, export_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='1M')
+    parser.add_argument('--formats', default=','.join(EXPORTERS))
+    args = parser.parse_args()
+    rows = parse_sizes(args.rows)[0]
+
+    with dataset_db(rows) as db, tempfile.TemporaryDirectory() as folder:
+
+        print(f"{'format':<10} {'time':>9} {'rows/s':>12} {'size':>10}")
+        for export_format in args.formats.split(','):
+            report = db.stream_salary_values_for_date_range('0000-01-01', '9999-12-31')
+            start = time.perf_counter()
+            try:
+                file_path, written = export_report(report, 'gross_pay_report', export_format, folder)
+            except RuntimeError as error:
+                print(f"{export_format:<10} skipped: {error}")
+                continue
+            elapsed = time.perf_counter() - start
+            print(f"{export_format:<10} {elapsed:>8.2f}s {written / elapsed:>12,.0f} "
+                  f"{os.path.getsize(file_path) / 2 ** 20:>7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Event-loop latency while a large report is exported: inline in an event handler (as the Report tab
+used to) versus on the TaskRunner workers. Latency is how late a 10 ms after() timer fires.
+
+Runs on a real Tk root with --tk (needs a display), otherwise on a minimal stand-in event loop that
+only implements after(), which is all the TaskRunner uses.
+
+    python -m benchmarks.bench_gui_latency --rows 1M --format csv
+"""
+
+import argparse
+import heapq
+import itertools
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import dataset_db, parse_sizes
+import report_export
+from task_runner import LatencyMonitor, Task, TaskRunner
+
+
+class HeadlessLoop:
+    # Single-threaded timer loop with the after()/mainloop()/quit() subset of Tk
+
+    def __init__(self):
+        self._timers = []
+        self._order = itertools.count()
+        self._running = False
+
+    def after(self, ms, callback):
+        heapq.heappush(self._timers, (time.perf_counter() + ms / 1000, next(self._order), callback))
+
+    def quit(self):
+        self._running = False
+
+    def mainloop(self):
+        self._running = True
+        while self._running and self._timers:
+            due, _, callback = self._timers[0]
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            heapq.heappop(self._timers)
+            callback()
+
+
+def make_loop(use_tk):
+    if use_tk:
+        from tkinter import Tk
+
+        root = Tk()
+        root.withdraw()
+        return root
+    return HeadlessLoop()
+
+
+def export(db, args, folder, progress=None):
+    report, name = report_export.open_report(db, 'gross', None, '2000-01-01', '2100-12-31')
+    return report_export.export_report(report, name, args.format, folder, progress)[1]
+
+
+def measure(db, args, background):
+    loop = make_loop(args.tk)
+    monitor = LatencyMonitor(loop)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as folder:
+        def finish(task=None, rows=None):
+            results['rows'] = rows
+            monitor.stop()
+            loop.after(50, loop.quit)
+
+        def start():
+            results['start'] = time.perf_counter()
+            if background:
+                runner = TaskRunner(loop, workers=1)
+                runner.submit(Task('export', lambda task: export(db, args, folder, task.progress),
+                                   on_done=finish))
+            else:
+                finish(rows=export(db, args, folder))
+
+        monitor.start()
+        loop.after(100, start)
+        loop.mainloop()
+        results['seconds'] = time.perf_counter() - results['start']
+
+    if args.tk:
+        loop.destroy()
+    results['delays'] = np.array(monitor.delays) * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='1M', help="salary rows in the database (all are exported)")
+    parser.add_argument('--format', choices=list(report_export.EXPORTERS), default='csv')
+    parser.add_argument('--tk', action='store_true', help="measure a real Tk event loop")
+    args = parser.parse_args()
+
+    with dataset_db(parse_sizes(args.rows)[0]) as db:
+        print(f"{'export':<12} {'rows':>10} {'seconds':>8} {'ticks':>7} {'p50':>9} {'p99':>9} {'max':>10}")
+        for label, background in (('inline', False), ('background', True)):
+            results = measure(db, args, background)
+            delays = results['delays']
+            print(f"{label:<12} {results['rows']:>10,} {results['seconds']:>8.2f} {len(delays):>7} "
+                  f"{np.percentile(delays, 50):>7.1f}ms {np.percentile(delays, 99):>7.1f}ms "
+                  f"{delays.max():>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
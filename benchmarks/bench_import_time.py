@@ -0,0 +1,87 @@
+"""Import time of the application modules, checked against a budget.
+
+    python -m benchmarks.bench_import_time
+
+Each module is imported in a fresh interpreter with `python -X importtime`, from an empty working
+directory. The check fails (exit status 1) when a module exceeds its budget, pulls in one of the
+heavy GUI/Excel/NumPy modules at import time, or leaves a database file behind. The same check runs
+under pytest in tests/test_import_time.py.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module -> cumulative import time budget in milliseconds (median of the runs)
+BUDGETS_MS = {
+    'payroll_database': 40,
+    'report_export': 40,
+    'payroll_cli': 60,
+    'grifindo_toys_payroll_system': 100,
+}
+
+HEAVY_MODULES = ('tkcalendar', 'openpyxl', 'numpy', 'pyarrow')
+
+
+def import_profile(module, cwd):
+    # Cumulative import time (ms) of the module and the top-level packages it imported
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd, env=env,
+                             capture_output=True, text=True, check=True)
+    cumulative_ms = None
+    imported = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        imported.add(name.split('.')[0])
+        if name == module:
+            cumulative_ms = int(cumulative) / 1000
+    return cumulative_ms, imported
+
+
+def check_module(module, runs=5):
+    # Median import time (ms) of the module and what is wrong with its import, if anything
+    with tempfile.TemporaryDirectory() as cwd:
+        timings = []
+        for _ in range(runs):
+            cumulative_ms, imported = import_profile(module, cwd)
+            timings.append(cumulative_ms)
+        leftovers = os.listdir(cwd)
+
+    median = sorted(timings)[len(timings) // 2]
+    failures = []
+    if median > BUDGETS_MS[module]:
+        failures.append(f"{module} takes {median:.1f}ms to import, budget {BUDGETS_MS[module]}ms")
+    heavy = sorted(imported.intersection(HEAVY_MODULES))
+    if heavy:
+        failures.append(f"{module} imports {', '.join(heavy)} at import time")
+    if leftovers:
+        failures.append(f"importing {module} created {', '.join(leftovers)}")
+    return median, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<30} {'median':>9} {'budget':>9}")
+    for module, budget in BUDGETS_MS.items():
+        median, module_failures = check_module(module, args.runs)
+        print(f"{module:<30} {median:>7.1f}ms {budget:>7}ms")
+        failures.extend(module_failures)
+
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
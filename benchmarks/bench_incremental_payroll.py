@@ -0,0 +1,70 @@
+"""Incremental payroll recomputation against a full recompute of the latest pay period, after a change
+set touching a small share of the workforce: rate changes through PayrollDB.update_many and
+attendance corrections on the latest salary entries.
+
+The full recompute goes through the same engine with every employee logged as changed. It reads and
+computes the whole period but rewrites only the entries that differ, so it is a lower bound for a
+full re-run; it also checks the incremental result, since it must find nothing left to rewrite.
+
+    python -m benchmarks.bench_incremental_payroll --employees 100k --months 12 --changes 0.01
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import parse_sizes, temporary_db
+from payroll_engine import recompute_changes
+from synthetic_data import generate_dataset
+
+
+def apply_change_set(db, share, rng):
+    # Changes the rates of `share` of the employees and corrects the latest attendance of as many others
+    employees = db.fetch()
+    count = max(int(len(employees) * share), 1)
+    picked = rng.choice(len(employees), count * 2, replace=False)
+    db.update_many((employee.name, employee.monthly_salary + 100, employee.overtime_rate, employee.allowances,
+                    employee.id) for employee in (employees[i] for i in picked[:count]))
+
+    latest = db.conn.execute("SELECT MAX(salaried_month) FROM salary").fetchone()[0]
+    with db.transaction():
+        db.conn.executemany("UPDATE salary SET absent = absent + 1 WHERE employee_id = ? AND salaried_month = ?",
+                            ((employees[i].id, latest) for i in picked[count:]))
+    return count, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', default='100k')
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--changes', type=float, default=0.01, help="share of employees with changed rates, and "
+                                                                   "again with corrected attendance")
+    args = parser.parse_args()
+
+    employees = parse_sizes(args.employees)[0]
+    with temporary_db() as db:
+        generate_dataset(db, employees, args.months)
+        rate_changes, corrections = apply_change_set(db, args.changes, np.random.default_rng(1))
+        print(f"{employees:,} employees x {args.months} months; {rate_changes:,} rate changes, "
+              f"{corrections:,} attendance corrections ({db.pending_changes():,} logged)")
+
+        start = time.perf_counter()
+        incremental = recompute_changes(db)
+        incremental_time = time.perf_counter() - start
+
+        db.conn.execute("INSERT INTO payroll_changes (employee_id) SELECT id FROM employees")
+        db.conn.commit()
+        start = time.perf_counter()
+        remaining = recompute_changes(db)
+        full_time = time.perf_counter() - start
+
+        print(f"{'recompute':<12} {'seconds':>8} {'rewritten':>10}")
+        print(f"{'incremental':<12} {incremental_time:>8.3f} {len(incremental):>10,}")
+        print(f"{'full period':<12} {full_time:>8.3f} {len(remaining):>10,}")
+        print(f"speed-up {full_time / incremental_time:.1f}x; "
+              f"{'consistent' if not remaining else 'INCONSISTENT: the full recompute found stale entries'}")
+
+
+if __name__ == '__main__':
+    main()
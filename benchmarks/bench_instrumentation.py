@@ -0,0 +1,100 @@
+"""Cost of the instrumentation (payroll_metrics): the same workloads with it disabled and enabled.
+
+Disabled is how the application normally runs, so it is the baseline; enabled times every PayrollDB
+call and SQL statement. The workloads are call-heavy (cached employee lookups, one small query per
+call) as well as row-heavy (a payroll run and a report export), which bound the overhead per call and
+per row.
+
+    python -m benchmarks.bench_instrumentation --employees 50000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import date
+
+import numpy as np
+
+import payroll_metrics
+import report_export
+from benchmarks.common import temporary_db
+from payroll_database import PayrollDB
+from payroll_engine import AttendanceTable, run_payroll
+from synthetic_data import generate_dataset
+
+
+def workloads(db, employees, folder):
+    # name -> function running it once
+    ids = np.arange(1, employees + 1)
+    zeros = np.zeros(employees, dtype=np.int64)
+
+    def cached_lookups():
+        for employee_id in range(1, 20001):
+            db.search(employee_id % 1000 + 1)
+
+    def small_queries():
+        for employee_id in range(1, 5001):
+            db.search_uncached(employee_id % employees + 1)
+
+    def payroll():
+        run_payroll(db, AttendanceTable(ids, zeros, zeros, zeros), date(2030, 1, 1), date(2030, 1, 31))
+
+    def export():
+        report, name = report_export.open_report(db, 'gross', None, '2018-01-01', '2018-12-31')
+        report_export.export_report(report, name, 'csv', folder)
+
+    return {
+        '20k cached lookups of 1k employees': cached_lookups,
+        '5k employee queries': small_queries,
+        f'payroll run, {employees:,} employees': payroll,
+        'gross pay report, 1 year, csv': export,
+    }
+
+
+def best_of(repeat, run):
+    # After a warm-up run, so both modes time the same work (a payroll run replaces the month it wrote)
+    run()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', type=int, default=20000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with temporary_db() as db, tempfile.TemporaryDirectory() as folder:
+        generate_dataset(db, args.employees, args.months)
+        path = db.pool.path
+        db.close()
+
+        timings = {}
+        for mode in ('disabled', 'enabled'):
+            if mode == 'enabled':
+                payroll_metrics.enable()
+            # Connections are traced from when they are opened, so a fresh PayrollDB per mode
+            db = PayrollDB(path)
+            for name, run in workloads(db, args.employees, os.path.join(folder, mode)).items():
+                timings[name, mode] = best_of(args.repeat, run)
+            db.close()
+        payroll_metrics.disable()
+
+        print(f"{'workload':<40} {'disabled ms':>12} {'enabled ms':>12} {'overhead':>9}")
+        for name in dict.fromkeys(name for name, _ in timings):
+            disabled, enabled = timings[name, 'disabled'], timings[name, 'enabled']
+            print(f"{name:<40} {disabled * 1000:>12.1f} {enabled * 1000:>12.1f} "
+                  f"{(enabled / disabled - 1) * 100:>8.1f}%")
+        print(f"\n{len(payroll_metrics.metrics.statements)} distinct statements and "
+              f"{len(payroll_metrics.metrics.methods)} methods recorded while enabled")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Scaling of the multi-process payroll run over 1..N worker processes: the computation alone and the
+full run with the single writer, against the single-process run. Every variant must write the same
+rows in the same order; the benchmark checks that with a digest of the salary table.
+
+    python -m benchmarks.bench_parallel_payroll --employees 500k --workers 1,2,4,8
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from datetime import date
+
+import numpy as np
+
+from benchmarks.common import parse_sizes, temporary_db
+from payroll_engine import (AttendanceTable, EmployeeRates, compute_period, compute_period_parallel, cycle_days,
+                            run_payroll)
+from synthetic_data import generate_employees
+
+START, END = date(2030, 1, 1), date(2030, 1, 31)
+
+
+def salary_digest(db):
+    digest = hashlib.sha1()
+    for row in db.conn.execute("SELECT employee_id, absent, holidays, overtime_hours, no_pay, base_pay, gross_pay, "
+                               "salaried_month FROM salary ORDER BY id"):
+        digest.update(repr(row).encode())
+    return digest.hexdigest()[:12]
+
+
+def attendance_for(employees, rng):
+    # Attendance for a tenth of the workforce
+    ids = np.sort(rng.choice(np.arange(1, employees + 1), employees // 10, replace=False))
+    return AttendanceTable(ids, rng.poisson(1.0, len(ids)), rng.poisson(2.0, len(ids)), rng.poisson(8.0, len(ids)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', default='500k')
+    cpus = os.cpu_count() or 1
+    parser.add_argument('--workers', default=",".join(str(2 ** n) for n in range(4) if 2 ** n <= max(cpus, 2)),
+                        help="worker counts to try (default: powers of two up to the CPU count, at least 2)")
+    args = parser.parse_args()
+
+    employees = parse_sizes(args.employees)[0]
+    attendance = attendance_for(employees, np.random.default_rng(0))
+    print(f"{os.cpu_count()} CPU(s), {employees:,} employees")
+
+    with temporary_db() as db:
+        generate_employees(db, employees, np.random.default_rng(0))
+        db.employee_cache = None
+
+        print(f"{'workers':<14} {'compute':>9} {'speed-up':>9} {'full run':>9} {'speed-up':>9}  digest")
+        baseline = None
+        for workers in [1] + [int(part) for part in args.workers.split(',') if int(part) > 1]:
+            # The computation alone: the shards are collected, nothing is written
+            start = time.perf_counter()
+            if workers > 1:
+                list(compute_period_parallel(db, attendance, cycle_days(START, END), '2030-01-31', workers=workers))
+            else:
+                compute_period(EmployeeRates.load(db), attendance, cycle_days(START, END), '2030-01-31')
+            compute = time.perf_counter() - start
+
+            db.conn.execute("DELETE FROM salary")
+            db.conn.commit()
+            start = time.perf_counter()
+            run_payroll(db, attendance, START, END, workers=workers)
+            full = time.perf_counter() - start
+
+            baseline = baseline or (compute, full)
+            label = "1 (in-process)" if workers == 1 else str(workers)
+            print(f"{label:<14} {compute:>7.2f}s {baseline[0] / compute:>8.2f}x {full:>8.2f}s "
+                  f"{baseline[1] / full:>8.2f}x  {salary_digest(db)}")
+
+
+if __name__ == '__main__':
+    main()
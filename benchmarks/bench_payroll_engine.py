@@ -0,0 +1,48 @@
+"""Throughput of the batch payroll engine.
+
+    python -m benchmarks.bench_payroll_engine --sizes 10k,100k,1M
+"""
+import argparse
+from datetime import date
+
+import numpy as np
+
+from benchmarks.common import parse_sizes, rate, temporary_db, timer
+from payroll_engine import AttendanceTable, EmployeeRates, compute_period, cycle_days, write_period
+from synthetic_data import generate_employees
+
+
+def run(count, seed=0):
+    rng = np.random.default_rng(seed)
+    results = {}
+    with temporary_db() as db:
+        generate_employees(db, count, rng)
+        attendance = AttendanceTable(np.arange(1, count + 1), rng.integers(0, 4, count),
+                                     rng.integers(0, 6, count), rng.integers(0, 21, count))
+        start_date, end_date = date(2024, 1, 1), date(2024, 1, 31)
+
+        with timer(results, 'load'):
+            rates = EmployeeRates.load(db)
+        with timer(results, 'compute'):
+            result = compute_period(rates, attendance, cycle_days(start_date, end_date), end_date.isoformat())
+        with timer(results, 'write'):
+            write_period(db, result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10k,100k,1M')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'employees':>10} {'load':>9} {'compute':>9} {'write':>9} {'total':>9} {'throughput':>14}")
+    for count in parse_sizes(args.sizes):
+        results = run(count, args.seed)
+        total = sum(results.values())
+        print(f"{count:>10,} {results['load']:>8.3f}s {results['compute']:>8.3f}s {results['write']:>8.3f}s "
+              f"{total:>8.3f}s {rate(count, total):>14}")
+
+
+if __name__ == '__main__':
+    main()
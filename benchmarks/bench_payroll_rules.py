@@ -0,0 +1,76 @@
+"""Tax evaluation over a whole workforce with progressive brackets: the compiled TaxSchedule against a
+per-employee Python loop over the brackets, with the flat rate as the reference. Every variant must
+give the same tax to the cent.
+
+    python -m benchmarks.bench_payroll_rules --employees 100k --brackets 0:0.1,2500:0.2,5000:0.3,8000:0.4
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import parse_sizes
+from payroll_engine import AttendanceTable, EmployeeRates, compute_period
+from payroll_rules import TaxSchedule
+
+
+def python_tax(brackets, base_pay):
+    # What the rules look like without compiling them: branching over the brackets for every employee
+    taxes = []
+    for pay in base_pay:
+        tax = 0.0
+        for index, (lower_bound, rate) in enumerate(brackets):
+            upper_bound = brackets[index + 1][0] if index + 1 < len(brackets) else None
+            if pay <= lower_bound:
+                break
+            tax += ((pay if upper_bound is None else min(pay, upper_bound)) - lower_bound) * rate
+        taxes.append(tax)
+    return np.array(taxes)
+
+
+def best_of(repeat, function, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', default='100k')
+    parser.add_argument('--brackets', default='0:0.1,2500:0.2,5000:0.3,8000:0.4',
+                        help="tax brackets as LOWER:RATE, separated by commas")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    employees = parse_sizes(args.employees)[0]
+    brackets = sorted(tuple(float(value) for value in part.split(':')) for part in args.brackets.split(','))
+    rng = np.random.default_rng(0)
+    rates = EmployeeRates(np.arange(1, employees + 1), rng.integers(3000, 10001, employees).astype(np.float64),
+                          rng.integers(10, 26, employees).astype(np.float64),
+                          rng.integers(500, 2001, employees).astype(np.float64))
+    attendance = AttendanceTable(rates.employee_id, rng.poisson(1.0, employees), rng.poisson(2.0, employees),
+                                 rng.poisson(8.0, employees))
+    base_pay = compute_period(rates, attendance, 31, '2030-01-28').base_pay
+
+    compile_time, schedule = best_of(args.repeat, TaxSchedule, brackets)
+    compiled_time, compiled = best_of(args.repeat, schedule, base_pay)
+    python_time, reference = best_of(1, python_tax, brackets, base_pay.tolist())
+    flat_time, _ = best_of(args.repeat, TaxSchedule(((0, 0.25),)), base_pay)
+    period_time, _ = best_of(args.repeat, compute_period, rates, attendance, 31, '2030-01-28', schedule)
+
+    print(f"{employees:,} employees, {len(brackets)} tax brackets")
+    print(f"{'evaluation':<28} {'seconds':>9} {'employees/s':>14}")
+    for name, seconds in (('python loop per employee', python_time), ('compiled schedule', compiled_time),
+                          ('flat rate (reference)', flat_time), ('whole period, compiled', period_time)):
+        print(f"{name:<28} {seconds:>9.4f} {employees / seconds:>14,.0f}")
+    print(f"compiling the brackets: {compile_time * 1e6:.0f} us; speed-up over the loop "
+          f"{python_time / compiled_time:.0f}x; largest difference {np.abs(compiled - reference).max():.2e}")
+
+
+if __name__ == '__main__':
+    main()
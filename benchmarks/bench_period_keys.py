@@ -0,0 +1,131 @@
+"""Month range queries on a large salary table with the month as text against the integer period key
+(salary.period, YYYYMM), and the gross pay report over a text-keyed rollup against the integer one.
+
+"text, indexed" is the schema before the integer keys: an index on salaried_month and 'YYYY-MM'
+rollup periods. "text, normalized in the query" is what a range over mixed-format months needs: the
+month is cut out of every row, so no index applies. Every variant must find the same rows.
+
+    python -m benchmarks.bench_period_keys --rows 10M
+"""
+
+import argparse
+import time
+
+from benchmarks.common import fill_db, parse_sizes, temporary_db
+from payroll_database import GROSS_PAY_REPORT, period_bounds
+
+RANGE_TOTALS = {
+    'text, normalized in the query': '''
+        SELECT COUNT(*), TOTAL(gross_pay) FROM salary
+        WHERE substr(salaried_month, 1, 7) BETWEEN substr(?, 1, 7) AND substr(?, 1, 7)''',
+    'text, indexed': '''
+        SELECT COUNT(*), TOTAL(gross_pay) FROM salary INDEXED BY salary_month
+        WHERE salaried_month >= ? AND salaried_month <= ?''',
+    'integer period': '''
+        SELECT COUNT(*), TOTAL(gross_pay) FROM salary INDEXED BY salary_period
+        WHERE period BETWEEN ? AND ?''',
+}
+
+EMPLOYEE_RANGE_TOTALS = {
+    'text, normalized in the query': '''
+        SELECT COUNT(*), TOTAL(gross_pay) FROM salary
+        WHERE employee_id = ? AND substr(salaried_month, 1, 7) BETWEEN substr(?, 1, 7) AND substr(?, 1, 7)''',
+    'text, indexed': '''
+        SELECT COUNT(*), TOTAL(gross_pay) FROM salary
+        WHERE employee_id = ? AND salaried_month >= ? AND salaried_month <= ?''',
+    'integer period': '''
+        SELECT COUNT(*), TOTAL(gross_pay) FROM salary
+        WHERE employee_id = ? AND period BETWEEN ? AND ?''',
+}
+
+# The gross pay report as it read the rollup with 'YYYY-MM' periods
+TEXT_GROSS_PAY_REPORT = '''
+    SELECT employee_id, period AS salaried_month, no_pay, base_pay, gross_pay
+    FROM salary_rollup_text
+    WHERE period >= substr(?, 1, 7) AND period <= substr(?, 1, 7)
+    ORDER BY period DESC, employee_id
+'''
+
+
+def best_of(repeat, query):
+    best = result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = query()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='10M')
+    parser.add_argument('--months', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = parse_sizes(args.rows)[0]
+    with temporary_db() as db:
+        start = time.perf_counter()
+        employees, rows = fill_db(db, rows, args.months)
+        print(f"loaded {rows:,} salary rows ({employees:,} employees x {args.months} months) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        # The text-keyed schema next to the integer one
+        start = time.perf_counter()
+        with db.transaction():
+            db.conn.execute("CREATE INDEX salary_month ON salary (salaried_month)")
+            db.conn.execute('''
+                CREATE TABLE salary_rollup_text (
+                    employee_id INTEGER NOT NULL, period TEXT NOT NULL, entries INT NOT NULL,
+                    base_pay REAL NOT NULL, no_pay REAL NOT NULL, gross_pay REAL NOT NULL,
+                    PRIMARY KEY (employee_id, period)) WITHOUT ROWID
+            ''')
+            db.conn.execute("CREATE INDEX salary_rollup_text_period ON salary_rollup_text (period DESC, employee_id)")
+            db.conn.execute('''
+                INSERT INTO salary_rollup_text
+                SELECT employee_id, printf('%04d-%02d', period / 100, period % 100), entries, base_pay, no_pay,
+                       gross_pay
+                FROM salary_rollup
+            ''')
+        print(f"built the text-keyed index and rollup in {time.perf_counter() - start:.1f}s")
+
+        last = db.conn.execute("SELECT MAX(salaried_month) FROM salary").fetchone()[0]
+        year = int(last[:4])
+        month_range = (f"{last[:7]}-01", f"{last[:7]}-31")
+        quarter_range = (f"{year}-01-01", f"{year}-03-31")
+        years_range = (f"{year - 2}-01-01", f"{year}-12-31")
+        employee_id = employees // 2
+
+        cases = [(f"all employees, {name}", RANGE_TOTALS, (), date_range)
+                 for name, date_range in (('1 month', month_range), ('1 quarter', quarter_range))]
+        cases.append(("one employee, 3 years", EMPLOYEE_RANGE_TOTALS, (employee_id,), years_range))
+
+        print(f"\n{'salary table range':<28} {'variant':<30} {'rows':>10} {'ms':>10} {'speed-up':>9}")
+        for name, statements, params, (first, last_day) in cases:
+            timings = {}
+            for variant, sql in statements.items():
+                bounds = period_bounds(first, last_day) if variant == 'integer period' else (first, last_day)
+                timings[variant] = best_of(args.repeat, lambda: db.conn.execute(sql, (*params, *bounds)).fetchone())
+            baseline = timings['text, normalized in the query'][0]
+            counts = {result[0] for _, result in timings.values()}
+            for variant, (seconds, result) in timings.items():
+                print(f"{name:<28} {variant:<30} {result[0]:>10,} {seconds * 1000:>10.2f} "
+                      f"{baseline / max(seconds, 1e-9):>8.1f}x")
+            if len(counts) != 1:
+                raise SystemExit(f"{name}: the variants found different rows {sorted(counts)}")
+
+        print(f"\n{'gross pay report':<28} {'rollup periods':<30} {'rows':>10} {'ms':>10}")
+        for name, (first, last_day) in (('1 month', month_range), ('1 quarter', quarter_range)):
+            text_time, text_rows = best_of(args.repeat, lambda: db.conn.execute(
+                TEXT_GROSS_PAY_REPORT, (first, last_day)).fetchall())
+            integer_time, integer_rows = best_of(args.repeat, lambda: db.conn.execute(
+                GROSS_PAY_REPORT, period_bounds(first, last_day)).fetchall())
+            print(f"{name:<28} {'text':<30} {len(text_rows):>10,} {text_time * 1000:>10.2f}")
+            print(f"{name:<28} {'integer':<30} {len(integer_rows):>10,} {integer_time * 1000:>10.2f}")
+            if text_rows != integer_rows:
+                raise SystemExit(f"gross pay report, {name}: the rollups differ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Repeated reports through the report cache (payroll_cache.ReportCache) against querying and exporting
+them again every time, and what a salary write costs the cache.
+
+"cold" queries and exports the report as the GUI did before the cache; "cached" is the same report
+asked for again at an unchanged data version; reports over report_export.CACHE_MAX_ROWS rows are
+streamed both times. With --max-mb below the report size the reports are spilled to disk and read
+back from there.
+
+    python -m benchmarks.bench_report_cache --rows 1M
+    python -m benchmarks.bench_report_cache --rows 1M --max-mb 1
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import report_export
+from benchmarks.common import fill_db, parse_sizes, temporary_db
+from payroll_cache import ReportCache
+
+
+def best_of(repeat, run):
+    best = result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='1M')
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--format', default='csv', choices=sorted(report_export.EXPORTERS))
+    parser.add_argument('--max-mb', type=float, default=128, help="memory of the cache")
+    args = parser.parse_args()
+
+    with temporary_db() as db, tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        employees, rows = fill_db(db, parse_sizes(args.rows)[0], args.months)
+        print(f"loaded {rows:,} salary rows ({employees:,} employees) in {time.perf_counter() - start:.1f}s")
+        cache = ReportCache(int(args.max_mb * 2**20), os.path.join(folder, 'spill'))
+
+        last = db.conn.execute("SELECT MAX(salaried_month) FROM salary").fetchone()[0]
+        year = int(last[:4])
+        reports = [
+            ('monthly', employees // 2, None, None),
+            ('summary', employees // 2, f"{year - 2}-01-01", f"{year}-12-31"),
+            ('gross', None, f"{last[:7]}-01", f"{last[:7]}-31"),
+            ('gross', None, f"{year}-01-01", f"{year}-12-31"),
+        ]
+
+        print(f"\n{'report':<40} {'rows':>9} {'cold ms':>10} {'cached ms':>10} "
+              f"{'cold export':>12} {'cached export':>14}")
+        for report_type, employee_id, start_date, end_date in reports:
+            label = f"{report_type} {employee_id or ''} {start_date or ''} {end_date or ''}".replace('  ', ' ')
+
+            def query_cold():
+                return list(report_export.open_report(db, report_type, employee_id, start_date, end_date)[0])
+
+            def query_cached():
+                return report_export.open_report(db, report_type, employee_id, start_date, end_date, cache)[0]
+
+            def export_cold():
+                report, name = report_export.open_report(db, report_type, employee_id, start_date, end_date)
+                return report_export.export_report(report, name, args.format, folder)
+
+            def export_cached():
+                report, name = report_export.open_report(db, report_type, employee_id, start_date, end_date, cache)
+                return report_export.export_report(report, name + '_cached', args.format, folder)
+
+            cold, rows = best_of(args.repeat, query_cold)
+            query_cached()
+            cached, report = best_of(args.repeat, query_cached)
+            if list(report) != rows:
+                raise SystemExit(f"{label}: the cached report differs from the query")
+            cold_export, _ = best_of(args.repeat, export_cold)
+            cached_export, _ = best_of(args.repeat, export_cached)
+            print(f"{label:<40} {len(rows):>9,} {cold * 1000:>10.2f} {cached * 1000:>10.2f} "
+                  f"{cold_export * 1000:>12.2f} {cached_export * 1000:>14.2f}")
+
+        # One salary write makes every cached report stale
+        db.conn.execute("UPDATE salary SET gross_pay = gross_pay + 1 WHERE id = 1")
+        db.conn.commit()
+        report_type, employee_id, start_date, end_date = reports[2]
+        start = time.perf_counter()
+        report_export.open_report(db, report_type, employee_id, start_date, end_date, cache)
+        print(f"\nfirst report after a salary write: {(time.perf_counter() - start) * 1000:.2f} ms")
+        print(f"cache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Memory held by a large gross pay report, by result form: the list of dicts the reports used to
+return, the record lists they return now, and the stream the exporters read.
+
+Peak Python memory is measured with tracemalloc while the report is built and held.
+
+    python -m benchmarks.bench_report_memory --rows 1M
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import dataset_db, parse_sizes
+from payroll_database import GROSS_PAY_REPORT, period_bounds
+
+RANGE = ('0000-01-01', '9999-12-31')
+BOUNDS = period_bounds(*RANGE)
+
+
+def list_of_dicts(db):
+    # The reports before record types: one dict per row, repeating the key strings
+    rows = db.conn.execute(GROSS_PAY_REPORT, BOUNDS).fetchall()
+    return [{'employee_id': row[0], 'salaried_month': row[1], 'no_pay': row[2], 'base_pay': row[3],
+             'gross_pay': row[4]} for row in rows]
+
+
+def records(db):
+    return db.get_salary_values_for_date_range(*RANGE)
+
+
+def plain_tuples(db):
+    return db.conn.execute(GROSS_PAY_REPORT, BOUNDS).fetchall()
+
+
+def stream(db):
+    # What the exporters get: only the current batch of rows is alive at any time
+    count = 0
+    for _ in db.stream_salary_values_for_date_range(*RANGE):
+        count += 1
+    return count
+
+
+def measure(db, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(db)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = result if isinstance(result, int) else len(result)
+    del result
+    return rows, elapsed, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='1M')
+    args = parser.parse_args()
+
+    with dataset_db(parse_sizes(args.rows)[0]) as db:
+        print(f"{'form':<16} {'rows':>10} {'seconds':>8} {'held':>10} {'peak':>10} {'bytes/row':>10}")
+        for name, build in (('list of dicts', list_of_dicts), ('records', records), ('plain tuples', plain_tuples),
+                            ('stream', stream)):
+            rows, elapsed, held, peak = measure(db, build)
+            print(f"{name:<16} {rows:>10,} {elapsed:>8.2f} {held / 2 ** 20:>8.1f}MB {peak / 2 ** 20:>8.1f}MB "
+                  f"{peak / max(rows, 1):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
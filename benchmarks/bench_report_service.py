@@ -0,0 +1,209 @@
+"""Load test of the report service (report_service.py) over localhost: concurrent keep-alive clients
+send a mix of report requests, and the latency percentiles and throughput are reported along with the
+service's query and coalescing counters.
+
+Without --url the service is started in a separate process (`payroll_cli.py serve`) on a synthetic
+database of --rows salary entries. A share of the requests (--hot) asks for the same report, like a
+dashboard polled by many clients; those are the requests coalescing can share.
+
+    python -m benchmarks.bench_report_service --rows 1M --concurrency 32 --requests 5000
+    python -m benchmarks.bench_report_service --url http://127.0.0.1:8765 --employees 50000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.common import fill_db, parse_sizes, temporary_db
+
+
+class Client:
+    # One keep-alive HTTP/1.1 connection
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        # Returns (status, body size)
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\n\r\n".encode())
+        await self.writer.drain()
+
+        head = (await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        status = int(head[0].split()[1])
+        headers = {name.lower(): value.strip()
+                   for name, _, value in (line.partition(':') for line in head[1:] if line)}
+        if headers.get('transfer-encoding') == 'chunked':
+            size = 0
+            while True:
+                length = int((await self.reader.readuntil(b'\r\n')).strip(), 16)
+                await self.reader.readexactly(length + 2)
+                size += length
+                if length == 0:
+                    break
+        else:
+            size = len(await self.reader.readexactly(int(headers.get('content-length', 0))))
+        if headers.get('connection') == 'close':
+            self.close()
+        return status, size
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def request_paths(count, employees, first_year, last_year, hot, csv_share, seed):
+    # The request mix: per-employee summaries and monthly reports, gross pay pages and CSV exports of
+    # random months, and the hot report
+    rng = random.Random(seed)
+    hot_path = f"/reports/gross?start={last_year}-12-01&end={last_year}-12-31&page_size=500"
+    for _ in range(count):
+        if rng.random() < hot:
+            yield 'hot report', hot_path
+            continue
+        year = rng.randint(first_year, last_year)
+        month = f"{year}-{rng.randint(1, 12):02d}"
+        kind = rng.random()
+        if kind < csv_share:
+            yield 'gross pay csv', f"/reports/gross?start={month}-01&end={month}-28&format=csv"
+        elif kind < 0.4:
+            yield 'summary', (f"/reports/summary?employee_id={rng.randint(1, employees)}"
+                              f"&start={year}-01-01&end={year}-12-31")
+        elif kind < 0.7:
+            yield 'monthly', f"/reports/monthly?employee_id={rng.randint(1, employees)}&page_size=100"
+        else:
+            yield 'gross pay page', (f"/reports/gross?start={month}-01&end={month}-28"
+                                     f"&page={rng.randint(1, 3)}&page_size=500")
+
+
+async def load(host, port, paths, concurrency):
+    # Returns [(kind, status, bytes, seconds)] and the elapsed time
+    results = []
+    paths = iter(paths)
+
+    async def worker():
+        client = Client(host, port)
+        try:
+            for kind, path in paths:
+                start = time.perf_counter()
+                try:
+                    status, size = await client.get(path)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    client.close()
+                    status, size = 0, 0
+                results.append((kind, status, size, time.perf_counter() - start))
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def report(results, elapsed):
+    print(f"{len(results):,} requests in {elapsed:.2f}s: {len(results) / elapsed:,.0f} req/s, "
+          f"{sum(size for _, _, size, _ in results) / elapsed / 1e6:.1f} MB/s")
+    print(f"{'requests':<16} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses")
+    kinds = sorted({kind for kind, *_ in results})
+    for kind in kinds + ['all']:
+        rows = [row for row in results if kind in ('all', row[0])]
+        latencies = [seconds * 1000 for *_, seconds in rows]
+        statuses = {}
+        for _, status, _, _ in rows:
+            statuses[status] = statuses.get(status, 0) + 1
+        counts = ', '.join(f"{status}: {count}" for status, count in sorted(statuses.items()))
+        print(f"{kind:<16} {len(rows):>7,} {percentile(latencies, 0.5):>9.2f} {percentile(latencies, 0.99):>9.2f} "
+              f"{max(latencies):>9.2f}  {counts}")
+
+
+async def service_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode())
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])
+
+
+def start_service(db_path, workers, cache_mb):
+    # The service in a process of its own, so the clients don't compete with it for the GIL
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen([sys.executable, '-u', os.path.join(root, 'payroll_cli.py'), '--db', db_path, 'serve',
+                                '--port', '0', '--workers', str(workers), '--cache-mb', str(cache_mb)],
+                               stdout=subprocess.PIPE, text=True)
+    # It prints its address once it is listening
+    line = process.stdout.readline()
+    urls = [word for word in line.split() if word.startswith('http://')]
+    if not urls:
+        process.kill()
+        raise SystemExit(f"the report service did not start: {line!r}")
+    address = urlsplit(urls[0])
+    return process, address.hostname, address.port
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='1M', help="salary entries of the synthetic database")
+    parser.add_argument('--months', type=int, default=60)
+    parser.add_argument('--url', help="load an already running service instead")
+    parser.add_argument('--employees', type=int, help="employee IDs to ask for with --url")
+    parser.add_argument('--years', default='2018,2022', help="first and last year to ask for with --url")
+    parser.add_argument('--workers', type=int, default=4, help="query threads of the started service")
+    parser.add_argument('--cache-mb', type=int, default=64, help="report cache of the started service (0: none)")
+    parser.add_argument('--concurrency', type=int, default=32, help="concurrent client connections")
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--hot', type=float, default=0.2, help="share of requests for the same report")
+    parser.add_argument('--csv-share', type=float, default=0.02, help="share of streamed CSV exports")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        address = urlsplit(args.url)
+        first_year, last_year = (int(year) for year in args.years.split(','))
+        paths = request_paths(args.requests, args.employees or 1000, first_year, last_year, args.hot,
+                              args.csv_share, args.seed)
+        results, elapsed = asyncio.run(load(address.hostname, address.port, paths, args.concurrency))
+        report(results, elapsed)
+        print(f"service counters: {asyncio.run(service_stats(address.hostname, address.port))}")
+        return
+
+    with temporary_db() as db:
+        start = time.perf_counter()
+        employees, rows = fill_db(db, parse_sizes(args.rows)[0], args.months)
+        first_month, last_month = db.conn.execute("SELECT MIN(salaried_month), MAX(salaried_month) "
+                                                  "FROM salary").fetchone()
+        print(f"loaded {rows:,} salary rows ({employees:,} employees) in {time.perf_counter() - start:.1f}s")
+        db.close()
+
+        process, host, port = start_service(db.pool.path, args.workers, args.cache_mb)
+        try:
+            paths = request_paths(args.requests, employees, int(first_month[:4]), int(last_month[:4]),
+                                  args.hot, args.csv_share, args.seed)
+            results, elapsed = asyncio.run(load(host, port, paths, args.concurrency))
+            report(results, elapsed)
+            stats = asyncio.run(service_stats(host, port))
+            print(f"service: {stats['queries']:,} queries for {stats['requests'] - 1:,} requests, "
+                  f"{stats['coalesced']:,} coalesced, {stats['rejected']:,} rejected, {stats['errors']:,} errors")
+            if 'cache' in stats:
+                print(f"cache: {stats['cache']}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
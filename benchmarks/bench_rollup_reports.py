@@ -0,0 +1,75 @@
+"""Report latency against the length of the salary history: grouping the salary table on every
+request versus reading the salary_rollup table.
+
+    python -m benchmarks.bench_rollup_reports --employees 5000 --years 1,5,10
+"""
+
+import argparse
+import time
+from datetime import date
+
+from benchmarks.common import temporary_db
+from payroll_database import OVERALL_SALARY_SUMMARY, GROSS_PAY_REPORT, period_bounds
+
+# How the reports were computed before salary_rollup existed
+RAW_SUMMARY = '''
+    SELECT salaried_month, TOTAL(base_pay), TOTAL(no_pay), TOTAL(gross_pay)
+    FROM salary
+    WHERE employee_id = ? AND salaried_month BETWEEN ? AND ?
+    GROUP BY salaried_month
+    ORDER BY salaried_month DESC
+'''
+
+RAW_GROSS_PAY = '''
+    SELECT employee_id, salaried_month, TOTAL(no_pay), TOTAL(base_pay), TOTAL(gross_pay)
+    FROM salary
+    WHERE salaried_month BETWEEN ? AND ?
+    GROUP BY salaried_month, employee_id
+    ORDER BY salaried_month DESC, employee_id
+'''
+
+
+def best_of(repeat, query):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', type=int, default=5000)
+    parser.add_argument('--years', default='1,5,10')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from synthetic_data import generate_dataset
+
+    print(f"{'history':<10} {'rows':>12} {'report':<24} {'raw':>10} {'rollup':>10}")
+    for years in (int(part) for part in args.years.split(',')):
+        months = years * 12
+        with temporary_db() as db:
+            # The reports ask for the last year (and the last month) of the history
+            first = date(2030 - years, 1, 1)
+            _, rows = generate_dataset(db, args.employees, months, first)
+            employee_id = args.employees // 2
+            # The rollup reports take integer period bounds
+            cases = {
+                'summary, last year': ((employee_id, '2029-01-01', '2029-12-31'), RAW_SUMMARY,
+                                       (employee_id, *period_bounds('2029-01-01', '2029-12-31')),
+                                       OVERALL_SALARY_SUMMARY),
+                'gross pay, last month': (('2029-12-01', '2029-12-31'), RAW_GROSS_PAY,
+                                          period_bounds('2029-12-01', '2029-12-31'), GROSS_PAY_REPORT),
+            }
+            for name, (raw_params, raw, rollup_params, rollup) in cases.items():
+                raw_time = best_of(args.repeat, lambda: db.conn.execute(raw, raw_params).fetchall())
+                rollup_time = best_of(args.repeat, lambda: db.conn.execute(rollup, rollup_params).fetchall())
+                print(f"{f'{years} year(s)':<10} {rows:>12,} {name:<24} {raw_time * 1000:>8.2f}ms "
+                      f"{rollup_time * 1000:>8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
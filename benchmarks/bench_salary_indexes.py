@@ -0,0 +1,84 @@
+"""Lookups on a large salary table before and after the index migration.
+
+    python -m benchmarks.bench_salary_indexes --rows 10M
+"""
+
+import argparse
+import time
+
+from benchmarks.common import fill_db, parse_sizes, temporary_db
+from payroll_database import unique_salary_entries
+
+# The reports read salary_rollup, so the salary table is queried directly here
+EMPLOYEE_HISTORY = '''
+    SELECT salaried_month, base_pay, no_pay, gross_pay FROM salary
+    WHERE employee_id = ? ORDER BY salaried_month DESC
+'''
+
+EMPLOYEE_RANGE = '''
+    SELECT salaried_month, base_pay, no_pay, gross_pay FROM salary
+    WHERE employee_id = ? AND salaried_month BETWEEN ? AND ? ORDER BY salaried_month DESC
+'''
+
+MONTH_RANGE = '''
+    SELECT employee_id, salaried_month, no_pay, base_pay, gross_pay FROM salary
+    WHERE salaried_month BETWEEN ? AND ? ORDER BY salaried_month DESC, employee_id
+'''
+
+
+def time_queries(db, employees, repeat):
+    employee_id = employees // 2
+    queries = {
+        'employee history': lambda: db.conn.execute(EMPLOYEE_HISTORY, (employee_id,)).fetchall(),
+        'employee, 3 years': lambda: db.conn.execute(
+            EMPLOYEE_RANGE, (employee_id, '2020-01-01', '2022-12-31')).fetchall(),
+        'all employees, 1 month': lambda: db.conn.execute(MONTH_RANGE, ('2023-06-01', '2023-06-30')).fetchall(),
+        'duplicate check': lambda: db.conn.execute(
+            "SELECT 1 FROM salary WHERE employee_id = ? AND salaried_month = ?",
+            (employee_id, '2023-06-28')).fetchone(),
+    }
+    timings = {}
+    for name, query in queries.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        timings[name] = (time.perf_counter() - start) / repeat
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', default='10M')
+    parser.add_argument('--months', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = parse_sizes(args.rows)[0]
+
+    with temporary_db() as db:
+        start = time.perf_counter()
+        employees, rows = fill_db(db, rows, args.months)
+        print(f"loaded {rows:,} salary rows in {time.perf_counter() - start:.1f}s")
+
+        # Roll the salary table back to the unindexed schema
+        db.conn.execute("DROP INDEX salary_employee_month")
+        db.conn.execute("DROP INDEX IF EXISTS salary_month")
+        db.conn.execute("DROP INDEX IF EXISTS salary_period")
+
+        before = time_queries(db, employees, args.repeat)
+
+        start = time.perf_counter()
+        with db.transaction():
+            unique_salary_entries(db.conn)
+        print(f"index migration took {time.perf_counter() - start:.1f}s")
+
+        after = time_queries(db, employees, args.repeat)
+
+    print(f"{'query':<28} {'before':>12} {'after':>12} {'speed-up':>10}")
+    for name in before:
+        print(f"{name:<28} {before[name] * 1000:>10.2f}ms {after[name] * 1000:>10.2f}ms "
+              f"{before[name] / max(after[name], 1e-9):>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""Build time of synthetic load-test databases.
+
+    python -m benchmarks.bench_synthetic_data --employees 50000 --months 120
+"""
+
+import argparse
+import time
+
+from benchmarks.common import temporary_db
+from synthetic_data import generate_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--employees', type=int, default=50000)
+    parser.add_argument('--months', type=int, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with temporary_db() as db:
+        start = time.perf_counter()
+        employees, salary_entries = generate_dataset(db, args.employees, args.months, seed=args.seed)
+        elapsed = time.perf_counter() - start
+
+    print(f"{employees:,} employees x {args.months} months = {salary_entries:,} salary entries "
+          f"in {elapsed:.1f}s ({salary_entries / elapsed:,.0f} rows/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Time and peak memory of the Gross Pay Report export, in-memory workbook against streaming.
+
+    python -m benchmarks.bench_xlsx_export --sizes 100k,5M
+
+Each export runs in a fresh child process so peak RSS figures do not leak between runs.
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.common import fill_db, parse_sizes
+from payroll_database import PayrollDB
+from report_export import export_xlsx
+
+
+def build_db(path, rows):
+    db = PayrollDB(path)
+    _, rows = fill_db(db, rows)
+    db.close()
+    return rows
+
+
+def legacy_export(db, file_path):
+    # The export path before streaming: list of dicts + in-memory workbook
+    from openpyxl import Workbook
+
+    report = [row._asdict() for row in db.get_salary_values_for_date_range('0000-01-01', '9999-12-31')]
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(list(report[0].keys()))
+    for row in report:
+        sheet.append(list(row.values()))
+    workbook.save(file_path)
+
+
+def streaming_export(db, file_path):
+    export_xlsx(db.stream_salary_values_for_date_range('0000-01-01', '9999-12-31'), file_path)
+
+
+def child(path, mode, results):
+    import openpyxl  # noqa: F401 -- keep the import out of the measured memory
+
+    db = PayrollDB(path)
+    file_path = os.path.join(os.path.dirname(path), f'{mode}.xlsx')
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    {'legacy': legacy_export, 'streaming': streaming_export}[mode](db, file_path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+    results.put((elapsed, peak * 1024, os.path.getsize(file_path)))
+
+
+def measure(path, mode):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=child, args=(path, mode, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='100k,5M')
+    parser.add_argument('--legacy-max', default='1M', help="skip the in-memory export above this many rows")
+    args = parser.parse_args()
+    legacy_max = parse_sizes(args.legacy_max)[0]
+
+    print(f"{'rows':>10} {'path':<10} {'time':>9} {'rows/s':>10} {'peak RSS growth':>16} {'file':>10}")
+    for rows in parse_sizes(args.sizes):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'bench_payroll.db')
+            rows = build_db(path, rows)
+            modes = ['streaming'] + (['legacy'] if rows <= legacy_max else [])
+            for mode in modes:
+                elapsed, peak, size = measure(path, mode)
+                print(f"{rows:>10,} {mode:<10} {elapsed:>8.2f}s {rows / elapsed:>10,.0f} "
+                      f"{peak / 2 ** 20:>13.1f} MB {size / 2 ** 20:>7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
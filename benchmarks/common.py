@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from payroll_database import PayrollDB
+
+
+@contextmanager
+def temporary_db():
+    # A throw-away database file, so benchmarks never touch ./grifindo_payroll.db
+    with tempfile.TemporaryDirectory() as folder:
+        db = PayrollDB(os.path.join(folder, 'bench_payroll.db'))
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def fill_db(db, rows, months=120, seed=0):
+    # Shared fixture of the benchmarks: synthetic employees with `months` months of salary history,
+    # about `rows` salary entries in total. Returns (employees, salary entries).
+    from synthetic_data import generate_dataset
+
+    return generate_dataset(db, max(rows // months, 1), months, seed=seed)
+
+
+@contextmanager
+def dataset_db(rows, months=120, seed=0):
+    with temporary_db() as db:
+        fill_db(db, rows, months, seed)
+        yield db
+
+
+@contextmanager
+def timer(results, name):
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def parse_sizes(text):
+    # "10k,100k,1M" -> [10000, 100000, 1000000]
+    multipliers = {'k': 1000, 'm': 1000000}
+    sizes = []
+    for part in text.split(','):
+        part = part.strip().lower()
+        if part[-1] in multipliers:
+            sizes.append(int(float(part[:-1]) * multipliers[part[-1]]))
+        else:
+            sizes.append(int(part))
+    return sizes
+
+
+def rate(count, seconds):
+    return f"{count / seconds:,.0f}/s" if seconds else "n/a"
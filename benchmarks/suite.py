@@ -0,0 +1,412 @@
+"""Benchmark suite of the main code paths, with JSON baselines and a regression gate.
+
+Every case runs the real code on a synthetic database (synthetic_data.py, fixed seed) at each scale,
+given as a number of employees with --months of salary history. Throughput is the best of --repeat
+timed samples of at least --min-time seconds each, after a warm-up run. Peak memory is the
+tracemalloc peak of one more run, so it counts the Python heap (including the rows SQLite hands to
+Python) and does not slow down the timed samples.
+
+    python -m benchmarks.suite run --scales 1k,10k --output baseline.json
+    python -m benchmarks.suite run --scales 1k,10k --output results.json --compare baseline.json
+    python -m benchmarks.suite compare baseline.json results.json --threshold 0.1
+
+compare (and run --compare) exits with status 1 when a case lost more than --threshold of its
+throughput or grew its peak memory by more than --memory-threshold. Nothing here needs a display:
+the employee list is measured through its model, without Tk widgets.
+"""
+
+import argparse
+import fnmatch
+import gc
+import json
+import math
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+import numpy as np
+
+import report_export
+from benchmarks.common import parse_sizes, temporary_db
+from payroll_engine import AttendanceTable, compute_payroll, run_payroll, unpaid_absence
+from payroll_rules import PayrollRules
+from synthetic_data import generate_dataset
+
+# Format of the result files
+SUITE_VERSION = 1
+
+# Calls made by the cases that commit once per call, whatever the scale
+SINGLE_CALLS = 200
+
+# Employees whose reports are generated by the per-employee report cases
+REPORT_EMPLOYEES = 100
+
+# Rows in view in the employee list, as in the Employee tab
+VISIBLE_ROWS = 12
+
+# Peak memory changes below this are never regressions (small peaks are noisy)
+MEMORY_FLOOR_BYTES = 1 * 2**20
+
+
+class Case:
+    # A benchmark case: prepare(context) returns the function timed, which returns the operations done
+
+    def __init__(self, name, unit, prepare):
+        self.name = name
+        self.unit = unit
+        self.prepare = prepare
+
+
+def employee_ids(context, count):
+    # The same spread of employee IDs for every run
+    return np.random.default_rng(1).integers(1, context['employees'] + 1, count).tolist()
+
+
+def insert_employees(context):
+    db = context['db']
+
+    def run():
+        for index in range(SINGLE_CALLS):
+            db.insert(f"Benchmark Employee {index}", 5000 + index, 15, 1000)
+        return SINGLE_CALLS
+    return run
+
+
+def insert_many_employees(context):
+    db, count = context['db'], context['employees']
+
+    def run():
+        return db.insert_many([f"Bulk Employee {index}", 5000, 15, 1000] for index in range(count))
+    return run
+
+
+def record_payroll(context):
+    # One salary entry at a time, as the Salary tab records it
+    db, ids = context['db'], employee_ids(context, SINGLE_CALLS)
+
+    def run():
+        for employee_id in ids:
+            db.record_payroll(employee_id, 2, 0, 5, 100.0, 6000.0, 4500.0, date(2031, 1, 28))
+        return len(ids)
+    return run
+
+
+def payroll_run(context):
+    db, count = context['db'], context['employees']
+    ids = np.arange(1, count + 1)
+    rng = np.random.default_rng(0)
+    attendance = AttendanceTable(ids, rng.integers(0, 4, count), rng.integers(0, 6, count),
+                                 rng.integers(0, 21, count))
+
+    def run():
+        run_payroll(db, attendance, date(2031, 2, 1), date(2031, 2, 28))
+        return count
+    return run
+
+
+def calculate_salary(context):
+    # SalaryComponent.calculate_salary without the widgets: the settings, the leave taken and the pay
+    db = context['db']
+    ids = employee_ids(context, SINGLE_CALLS)
+    rates = {row[0]: row for row in db.conn.execute(
+        "SELECT id, monthly_salary, overtime_rate, allowances FROM employees")}
+    month = context['last_month']
+
+    def run():
+        for employee_id in ids:
+            rules = PayrollRules.load(db)
+            leave_taken = db.leave_taken(month, employee_id)
+            _, monthly_salary, overtime_rate, allowances = rates[employee_id]
+            unpaid_days = int(unpaid_absence(3, leave_taken, rules.leave_limit))
+            compute_payroll(monthly_salary, allowances, overtime_rate, unpaid_days, 10, 30, rules.tax)
+        return len(ids)
+    return run
+
+
+def monthly_report(context):
+    db, ids = context['db'], employee_ids(context, REPORT_EMPLOYEES)
+
+    def run():
+        for employee_id in ids:
+            db.get_monthly_salary_report(employee_id)
+        return len(ids)
+    return run
+
+
+def summary_report(context):
+    db, ids = context['db'], employee_ids(context, REPORT_EMPLOYEES)
+    start, end = context['first_month'], context['last_month']
+
+    def run():
+        for employee_id in ids:
+            db.get_overall_salary_summary(employee_id, start, end)
+        return len(ids)
+    return run
+
+
+def gross_pay_report(context):
+    # Every salary entry of the last month
+    db, month = context['db'], context['last_month']
+
+    def run():
+        return len(db.get_salary_values_for_date_range(month[:8] + '01', month))
+    return run
+
+
+def export_report(export_format):
+    def prepare(context):
+        db, month, folder = context['db'], context['last_month'], context['folder']
+
+        def run():
+            report, name = report_export.open_report(db, 'gross', None, month[:8] + '01', month)
+            return report_export.export_report(report, name, export_format, folder)[1]
+        return run
+    return prepare
+
+
+def employee_list(context):
+    # Scrolling the Employee tab's list a window at a time, in name order
+    from employee_grid import EmployeePageModel
+
+    db, count = context['db'], context['employees']
+    windows = 200
+
+    def run():
+        model = EmployeePageModel(db)
+        model.sort_by('name')
+        step = max((count - VISIBLE_ROWS) // windows, 1)
+        for window in range(windows):
+            model.window(window * step, VISIBLE_ROWS)
+        return windows
+    return run
+
+
+CASES = [
+    Case('employees.insert', 'calls', insert_employees),
+    Case('employees.insert_many', 'rows', insert_many_employees),
+    Case('employees.list', 'windows', employee_list),
+    Case('payroll.record_payroll', 'calls', record_payroll),
+    Case('payroll.run', 'employees', payroll_run),
+    Case('payroll.calculate_salary', 'calls', calculate_salary),
+    Case('reports.monthly', 'reports', monthly_report),
+    Case('reports.summary', 'reports', summary_report),
+    Case('reports.gross', 'rows', gross_pay_report),
+    Case('export.csv', 'rows', export_report('csv')),
+    Case('export.xlsx', 'rows', export_report('xlsx')),
+]
+
+
+def missing_dependency(case):
+    # Why a case cannot run here, or None
+    modules = {'export.xlsx': 'openpyxl', 'employees.list': 'tkinter'}
+    if case.name in modules:
+        try:
+            __import__(modules[case.name])
+        except ImportError:
+            return f"{modules[case.name]} is not installed"
+    return None
+
+
+def measure(run, repeat, min_time):
+    # A timed sample repeats the case until it lasts min_time, as short samples are mostly noise
+    start = time.perf_counter()
+    run()
+    loops = max(1, math.ceil(min_time / max(time.perf_counter() - start, 1e-6)))
+    best = None
+    # Collections would land in some samples and not in others (timeit disables them too)
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            operations = 0
+            start = time.perf_counter()
+            for _ in range(loops):
+                operations += run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'operations': operations, 'seconds': best, 'throughput': operations / best if best else 0.0,
+            'peak_bytes': peak}
+
+
+def run_scale(employees, months, cases, repeat, min_time):
+    results = {}
+    with temporary_db() as db, tempfile.TemporaryDirectory() as folder:
+        generate_dataset(db, employees, months)
+        first_month, last_month = db.conn.execute("SELECT MIN(salaried_month), MAX(salaried_month) "
+                                                  "FROM salary").fetchone()
+        context = {'db': db, 'employees': employees, 'folder': folder, 'first_month': first_month,
+                   'last_month': last_month}
+        for case in cases:
+            reason = missing_dependency(case)
+            if reason is not None:
+                print(f"{employees:>10,} {case.name:<28} skipped: {reason}")
+                continue
+            last_employee = db.conn.execute("SELECT MAX(id) FROM employees").fetchone()[0]
+            result = dict(measure(case.prepare(context), repeat, min_time), unit=case.unit)
+            # Employees added by the case would be paid by the payroll run and listed by the list case
+            added = [row[0] for row in db.conn.execute("SELECT id FROM employees WHERE id > ?", (last_employee,))]
+            if added:
+                db.delete_many(added)
+            results[case.name] = result
+            print(f"{employees:>10,} {case.name:<28} {result['throughput']:>14,.1f} {case.unit + '/s':<13} "
+                  f"{result['peak_bytes'] / 2**20:>10.2f} MB")
+    return results
+
+
+def environment():
+    # Recorded with the results: throughput only compares between runs on the same kind of machine
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_suite(args):
+    cases = [case for case in CASES if not args.cases or any(fnmatch.fnmatch(case.name, pattern)
+                                                             for pattern in args.cases.split(','))]
+    if not cases:
+        raise SystemExit(f"no case matches {args.cases!r}; the cases are {', '.join(case.name for case in CASES)}")
+
+    print(f"{'employees':>10} {'case':<28} {'throughput':>14} {'':<13} {'peak':>13}")
+    results = {'suite_version': SUITE_VERSION, 'created': datetime.now().isoformat(timespec='seconds'),
+               'environment': environment(),
+               'settings': {'months': args.months, 'repeat': args.repeat, 'min_time': args.min_time},
+               'results': {}}
+    for employees in parse_sizes(args.scales):
+        results['results'][str(employees)] = run_scale(employees, args.months, cases, args.repeat, args.min_time)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        # A regression must show up again before it counts, so one noisy sample can't fail the gate
+        for _ in range(args.retries):
+            failed = {(scale, name) for scale, name, _, _, failures in
+                      changes(baseline, results, args.threshold, args.memory_threshold) if failures}
+            if not failed:
+                break
+            print(f"\nRunning {len(failed)} regressed case(s) again")
+            for scale in sorted({scale for scale, _ in failed}, key=int):
+                again = run_scale(int(scale), args.months, [case for case in cases if (scale, case.name) in failed],
+                                  args.repeat, args.min_time)
+                for name, result in again.items():
+                    best = results['results'][scale][name]
+                    best['throughput'] = max(best['throughput'], result['throughput'])
+                    best['seconds'] = min(best['seconds'], result['seconds'])
+                    best['peak_bytes'] = min(best['peak_bytes'], result['peak_bytes'])
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"\nWritten {args.output}")
+    if baseline is not None:
+        sys.exit(compare(baseline, results, args.threshold, args.memory_threshold))
+
+
+def changes(baseline, current, threshold, memory_threshold):
+    # (scale, case, throughput change, peak memory change, failures) of every case of the baseline; the
+    # changes are None for cases not in the current results
+    for scale, cases in baseline['results'].items():
+        for name, old in cases.items():
+            new = current['results'].get(scale, {}).get(name)
+            if new is None:
+                yield scale, name, None, None, []
+                continue
+            throughput = new['throughput'] / old['throughput'] - 1 if old['throughput'] else 0.0
+            memory = new['peak_bytes'] / old['peak_bytes'] - 1 if old['peak_bytes'] else 0.0
+            failures = []
+            if throughput < -threshold:
+                failures.append('throughput')
+            if memory > memory_threshold and new['peak_bytes'] - old['peak_bytes'] > MEMORY_FLOOR_BYTES:
+                failures.append('peak memory')
+            yield scale, name, throughput, memory, failures
+
+
+def compare(baseline, current, threshold, memory_threshold):
+    # Prints the changes of every case found in both; returns 1 when one of them regressed, else 0
+    if baseline.get('suite_version') != current.get('suite_version'):
+        print(f"warning: suite version {baseline.get('suite_version')} against {current.get('suite_version')}")
+    differences = {key: (value, current['environment'].get(key))
+                   for key, value in baseline['environment'].items() if current['environment'].get(key) != value}
+    for key, (old, new) in differences.items():
+        print(f"warning: {key} differs: {old} in the baseline, {new} now")
+
+    regressions = 0
+    print(f"\n{'employees':>10} {'case':<28} {'throughput':>11} {'peak memory':>12}")
+    for scale, name, throughput, memory, failures in changes(baseline, current, threshold, memory_threshold):
+        if throughput is None:
+            print(f"{int(scale):>10,} {name:<28} {'not run':>11}")
+            continue
+        print(f"{int(scale):>10,} {name:<28} {throughput:>+10.1%} {memory:>+11.1%}"
+              f"{'  REGRESSION: ' + ', '.join(failures) if failures else ''}")
+        regressions += len(failures)
+
+    if regressions:
+        print(f"\n{regressions} regression(s) beyond {threshold:.0%} throughput / {memory_threshold:.0%} memory")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+def compare_files(args):
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.results) as file:
+        current = json.load(file)
+    sys.exit(compare(baseline, current, args.threshold, args.memory_threshold))
+
+
+def add_thresholds(parser):
+    parser.add_argument('--threshold', type=float, default=0.25, help="throughput loss counted as a regression "
+                                                                     "(0.25: 25%%)")
+    parser.add_argument('--memory-threshold', type=float, default=0.2, help="peak memory growth counted as a "
+                                                                            "regression")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+
+    run = commands.add_parser('run', help="run the suite")
+    run.add_argument('--scales', default='1k,10k', help="employees per synthetic database, e.g. 1k,10k,100k")
+    run.add_argument('--months', type=int, default=12, help="months of salary history per employee")
+    run.add_argument('--repeat', type=int, default=5, help="timed samples per case (the best counts)")
+    run.add_argument('--min-time', type=float, default=0.3,
+                     help="seconds a timed sample lasts at least (the case is repeated within it)")
+    run.add_argument('--cases', help="only these cases, comma separated, wildcards allowed (e.g. 'reports.*')")
+    run.add_argument('--output', help="write the results to this JSON file (e.g. a new baseline)")
+    run.add_argument('--compare', help="compare the results with this baseline afterwards")
+    run.add_argument('--retries', type=int, default=2, help="with --compare, times a regressed case is run "
+                                                            "again before it counts")
+    add_thresholds(run)
+    run.set_defaults(handler=run_suite)
+
+    check = commands.add_parser('compare', help="compare results with a baseline")
+    check.add_argument('baseline')
+    check.add_argument('results')
+    add_thresholds(check)
+    check.set_defaults(handler=compare_files)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+# Makes pytest put the repository root on sys.path, so the tests import the application modules and
+# benchmarks the way the scripts do (python -m pytest from the root works either way)
@@ -0,0 +1,212 @@
+"""Virtualized employee list for the Employee tab.
+
+Only the rows in view (plus a page either side) are read from the database, with keyset pagination
+in the selected sort order, so scrolling and refreshing cost the same for a thousand employees as for
+a hundred thousand. Sorting is done by SQL on indexed columns, and edits patch the affected rows
+instead of reloading the list.
+"""
+
+from tkinter import *
+from tkinter import ttk
+
+from payroll_database import EMPLOYEE_SORT_COLUMNS
+
+HEADINGS = ('Employee ID', 'Name', 'Salary', 'Overtime Rate', 'Allowances')
+COLUMN_WIDTHS = (90, 180, 90, 100, 90)
+
+# Rows fetched beyond the visible ones on each side
+PAGE_SIZE = 50
+
+
+class EmployeePageModel:
+    # Rows of the employee list by position, backed by a small window of cached rows
+
+    columns = EMPLOYEE_SORT_COLUMNS
+
+    def __init__(self, payroll_db, sort='id', descending=False, page_size=PAGE_SIZE):
+        self.payroll_db = payroll_db
+        self.sort = sort
+        self.descending = descending
+        self.page_size = page_size
+        self.reset()
+
+    def reset(self):
+        # Drops the cached rows; the next window() reads from the database again
+        self.count = self.payroll_db.count_employees()
+        self._start = 0
+        self._rows = []
+
+    def sort_by(self, column, descending=False):
+        self.sort = column
+        self.descending = descending
+        self._start, self._rows = 0, []
+
+    def key(self, row):
+        return (row[0],) if self.sort == 'id' else (row[self.columns.index(self.sort)], row[0])
+
+    def _fetch(self, after=None, before=None, limit=PAGE_SIZE):
+        return self.payroll_db.fetch_page(self.sort, self.descending, after, before, limit)
+
+    def window(self, first, size):
+        # Rows at positions first .. first + size - 1 (fewer at the end of the list)
+        first = max(0, min(first, self.count - size))
+        end = min(first + size, self.count)
+        cached_end = self._start + len(self._rows)
+
+        if self._rows and self._start <= first and end <= cached_end:
+            pass
+        elif self._rows and self._start <= first <= cached_end + self.page_size:
+            # Scrolled down past the cached rows: continue after the last one
+            self._rows += self._fetch(after=self.key(self._rows[-1]), limit=end - cached_end + self.page_size)
+        elif self._rows and first < self._start <= end + self.page_size:
+            # Scrolled up: read backwards from the first cached row
+            rows = self._fetch(before=self.key(self._rows[0]), limit=self._start - first + self.page_size)
+            self._start -= len(rows)
+            self._rows = rows + self._rows
+        else:
+            # Jump: look up the key just before the window in the index, then page from there
+            start = max(first - self.page_size, 0)
+            after = self.payroll_db.employee_key_at(start - 1, self.sort, self.descending) if start else None
+            self._start = start
+            self._rows = self._fetch(after=after, limit=end - start + self.page_size)
+
+        # Keep at most a page of cached rows on either side of the window
+        drop = first - self.page_size - self._start
+        if drop > 0:
+            del self._rows[:drop]
+            self._start += drop
+        del self._rows[end + self.page_size - self._start:]
+
+        return self._rows[first - self._start:end - self._start]
+
+    def patch(self, employee_id):
+        # After an update: replaces the cached row. Returns the new row, or None when it is not cached
+        # or its sort key changed (then the cache is dropped, as its position may have moved).
+        for index, row in enumerate(self._rows):
+            if row[0] == employee_id:
+                new_row = self.payroll_db.search(employee_id)
+                if new_row is None or self.key(new_row) != self.key(row):
+                    self._start, self._rows = 0, []
+                    self.count = self.payroll_db.count_employees()
+                    return None
+                self._rows[index] = new_row
+                return new_row
+        return None
+
+    def position(self, row):
+        return self.payroll_db.employee_position(row, self.sort, self.descending)
+
+    def inserted(self):
+        # After a new employee: the positions after it shift, so only the cached rows are dropped
+        self.count += 1
+        self._start, self._rows = 0, []
+
+    def deleted(self, employee_id):
+        self.count = self.payroll_db.count_employees()
+        self._start, self._rows = 0, []
+
+
+class EmployeeGrid(Frame):
+    # Treeview showing a window of the model; the scrollbar works on positions in the whole list
+
+    def __init__(self, parent, model, visible_rows=12, on_select=None):
+        super().__init__(parent)
+        self.model = model
+        self.visible_rows = visible_rows
+        self.on_select = on_select
+        self.first = 0
+
+        self.tree = ttk.Treeview(self, columns=model.columns, show='headings', height=visible_rows,
+                                 selectmode='browse')
+        for column, heading, width in zip(model.columns, HEADINGS, COLUMN_WIDTHS):
+            self.tree.heading(column, text=heading, command=lambda column=column: self.sort_by(column))
+            self.tree.column(column, width=width, anchor=W)
+        self.tree.pack(side=LEFT, fill='both', expand=True)
+
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.scroll)
+        self.scrollbar.pack(side=RIGHT, fill='y')
+
+        self.tree.bind('<<TreeviewSelect>>', self.selected)
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.tree.bind('<Button-4>', lambda event: self.scroll('scroll', -1, 'units'))
+        self.tree.bind('<Button-5>', lambda event: self.scroll('scroll', 1, 'units'))
+        self.tree.bind('<Prior>', lambda event: self.scroll('scroll', -1, 'pages'))
+        self.tree.bind('<Next>', lambda event: self.scroll('scroll', 1, 'pages'))
+
+        self.render()
+
+    def render(self):
+        # Shows the rows at the current position, keeping the selected employee selected
+        selection = self.tree.selection()
+        self.first = max(0, min(self.first, self.model.count - self.visible_rows))
+        rows = self.model.window(self.first, self.visible_rows)
+
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', END, iid=row[0], values=row)
+        kept = [iid for iid in selection if self.tree.exists(iid)]
+        if kept:
+            self.tree.selection_set(kept)
+
+        count = max(self.model.count, 1)
+        self.scrollbar.set(self.first / count, min((self.first + self.visible_rows) / count, 1.0))
+
+    def scroll(self, action, amount, unit=None):
+        # Scrollbar command protocol: ('moveto', fraction) or ('scroll', n, 'units' | 'pages')
+        if action == 'moveto':
+            self.first = int(float(amount) * self.model.count)
+        elif unit == 'pages':
+            self.first += int(amount) * self.visible_rows
+        else:
+            self.first += int(amount)
+        self.first = max(0, min(self.first, self.model.count - self.visible_rows))
+        self.render()
+
+    def sort_by(self, column):
+        # Clicking the sorted column again reverses the order
+        descending = not self.model.descending if column == self.model.sort else False
+        self.model.sort_by(column, descending)
+        for name, heading in zip(self.model.columns, HEADINGS):
+            marker = (' ▼' if descending else ' ▲') if name == column else ''
+            self.tree.heading(name, text=heading + marker)
+        self.first = 0
+        self.render()
+
+    def selected(self, event):
+        if self.on_select:
+            self.on_select(event)
+
+    def selected_row(self):
+        selection = self.tree.selection()
+        if not selection:
+            return None
+        return tuple(self.tree.item(selection[0], 'values'))
+
+    def show_employee(self, row):
+        # Scrolls the employee into the middle of the view and selects it
+        self.first = self.model.position(row) - self.visible_rows // 2
+        self.render()
+        if self.tree.exists(row[0]):
+            self.tree.selection_set(row[0])
+            self.tree.see(row[0])
+
+    def refresh(self):
+        # Re-reads the count and the visible rows
+        self.model.reset()
+        self.render()
+
+    def row_updated(self, employee_id):
+        # Patches the one row in place when it is on screen and kept its position
+        row = self.model.patch(int(employee_id))
+        if row is None:
+            self.render()
+        elif self.tree.exists(row[0]):
+            self.tree.item(row[0], values=row)
+
+    def row_inserted(self):
+        self.model.inserted()
+        self.render()
+
+    def row_deleted(self, employee_id):
+        self.model.deleted(int(employee_id))
+        self.render()
@@ -0,0 +1,86 @@
+"""Type-ahead employee search box for the Employee and Salary tabs.
+
+Matches are looked up with PayrollDB.search_names shortly after the user stops typing and listed
+under the entry; picking one (click, Return or double-click) hands the employee row to on_pick.
+"""
+
+from tkinter import *
+from tkinter import ttk
+
+# Milliseconds without a key press before the search runs
+DEBOUNCE_MS = 120
+
+SUGGESTIONS = 8
+
+
+class EmployeeSearchBox(Frame):
+    def __init__(self, parent, get_db, on_pick, width=30):
+        super().__init__(parent)
+        self.get_db = get_db
+        self.on_pick = on_pick
+        self.rows = []
+        self._pending = None
+
+        self.text = StringVar()
+        self.entry = ttk.Entry(self, textvariable=self.text, width=width)
+        self.entry.pack(fill='x')
+
+        self.suggestions = Listbox(self, height=SUGGESTIONS, activestyle='dotbox')
+
+        self.text.trace_add('write', self.typed)
+        self.entry.bind('<Down>', self.focus_suggestions)
+        self.entry.bind('<Return>', lambda event: self.pick(0))
+        self.entry.bind('<Escape>', lambda event: self.hide())
+        self.suggestions.bind('<Return>', lambda event: self.pick_selected())
+        self.suggestions.bind('<Double-Button-1>', lambda event: self.pick_selected())
+        self.suggestions.bind('<ButtonRelease-1>', lambda event: self.pick_selected())
+        self.suggestions.bind('<Escape>', lambda event: self.hide())
+
+    def typed(self, *args):
+        # Runs the search once typing pauses, so fast typing does not queue a query per key
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        self._pending = self.after(DEBOUNCE_MS, self.search)
+
+    def search(self):
+        self._pending = None
+        self.rows = self.get_db().search_names(self.text.get(), SUGGESTIONS)
+        self.suggestions.delete(0, END)
+        for row in self.rows:
+            self.suggestions.insert(END, f"{row[0]}  {row[1]}")
+        if self.rows:
+            self.suggestions.configure(height=min(len(self.rows), SUGGESTIONS))
+            self.suggestions.pack(fill='x')
+        else:
+            self.hide()
+
+    def focus_suggestions(self, event):
+        if self.rows:
+            self.suggestions.focus_set()
+            self.suggestions.selection_clear(0, END)
+            self.suggestions.selection_set(0)
+            self.suggestions.activate(0)
+
+    def pick_selected(self):
+        selection = self.suggestions.curselection()
+        if selection:
+            self.pick(selection[0])
+
+    def pick(self, index):
+        if index >= len(self.rows):
+            return
+        row = self.rows[index]
+        self.clear()
+        self.on_pick(row)
+
+    def hide(self):
+        self.suggestions.pack_forget()
+
+    def clear(self):
+        # Emptying the entry schedules a search of its own, which is not needed
+        self.text.set("")
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+            self._pending = None
+        self.rows = []
+        self.hide()
@@ -1,230 +1,26 @@
-from random import randint
 import os
-from openpyxl import Workbook
+import sys
 from tkinter import *
 from tkinter import ttk, messagebox
 from datetime import *
-import sqlite3
-from tkcalendar import Calendar
 import calendar
+from payroll_database import DEFAULT_LEAVE_LIMIT, PayrollDB, get_payroll_db, seed_database
+import payroll_metrics
+import report_export
+from employee_grid import EmployeeGrid, EmployeePageModel
+from employee_search import EmployeeSearchBox
+from task_runner import TaskRunner, Task, QUEUED, RUNNING
 
+# Importing this module has no side effects: the database is opened on first use through
+# get_payroll_db(), sample data is only loaded with --seed (or `payroll_cli.py db seed`), and
+# tkcalendar, NumPy and openpyxl are imported by the features that need them.
 
-class DatabaseConnection:
-    def __init__(self, db):
-        self.conn = sqlite3.connect(db)
-        self.cur = self.conn.cursor()
-
-        # Create employee table
-        self.conn.execute('''
-        CREATE TABLE IF NOT EXISTS employees (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            monthly_salary INT,
-            overtime_rate INT,
-            allowances INT)
-        ''')
-
-        # Create salary table
-        self.conn.execute('''
-        CREATE TABLE IF NOT EXISTS salary (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            employee_id INTEGER,
-            absent INT,
-            holidays INT,
-            overtime_hours INT,
-            no_pay INT,
-            base_pay INT,
-            gross_pay INT,
-            salaried_month DATE,
-            FOREIGN KEY (employee_id) REFERENCES employees (id))
-        ''')
-
-        self.conn.commit()
-
-    def __del__(self):
-        self.conn.close()
-
-
-class PayrollDB(DatabaseConnection):
-
-    def fetch(self):
-        self.cur.execute("SELECT * FROM employees")
-        rows = self.cur.fetchall()
-        return rows
-
-    def insert(self, name, monthly_salary, overtime_rate, allowances):
-        self.cur.execute("INSERT INTO employees VALUES (NULL, ?, ?, ?, ?)",
-                         (name, monthly_salary, overtime_rate, allowances))
-        self.conn.commit()
-
-    def update(self, name, monthly_salary, overtime_rate, allowances, employee_id):
-        self.cur.execute(
-            "UPDATE employees SET name = ?, monthly_salary = ?, overtime_rate = ?, allowances = ? WHERE id = ?",
-            (name, monthly_salary, overtime_rate, allowances, employee_id))
-        self.conn.commit()
-
-    def delete(self, employee_id):
-        self.cur.execute("DELETE FROM employees WHERE id = ?", (employee_id,))
-        self.conn.commit()
-
-    def search(self, employee_id):
-        self.cur.execute("SELECT * FROM employees WHERE id = ?",
-                         (employee_id,))
-        row = self.cur.fetchone()
-        return row
-
-    def record_payroll(self, employee_id, absent, holiday, overtime_hours, no_pay, base_pay, gross_pay, salaried_month):
-        self.conn.execute('''
-            INSERT INTO salary (employee_id, absent, holidays, overtime_hours, no_pay, base_pay, 
-            gross_pay, salaried_month)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (employee_id, absent, holiday, overtime_hours, no_pay, base_pay, gross_pay, salaried_month))
-        self.conn.commit()
-
-    def get_monthly_salary_report(self, employee_id):
-        self.cur.execute('''
-        SELECT salaried_month, base_pay, no_pay, gross_pay
-        FROM salary
-        WHERE employee_id = ?
-        ORDER BY salaried_month DESC, employee_id
-        ''', (employee_id,))
-        rows = self.cur.fetchall()
-
-        # Converting the rows to a list of dictionaries
-        report = []
-        for row in rows:
-            report.append({
-                'salaried_month': row[0],
-                'base_pay': row[1],
-                'no_pay': row[2],
-                'gross_pay': row[3]
-            })
-
-        return report
-
-    def get_overall_salary_summary(self, employee_id, start_month, end_month):
-        self.cur.execute('''
-        SELECT salaried_month, SUM(base_pay), SUM(no_pay), SUM(gross_pay)
-        FROM salary
-        WHERE employee_id = ? AND salaried_month >= ? AND salaried_month <= ?
-        GROUP BY salaried_month
-        ORDER BY salaried_month DESC, employee_id
-        ''', (employee_id, start_month, end_month))
-        rows = self.cur.fetchall()
-
-        # Converting the rows to a list of dictionaries
-        report = []
-        for row in rows:
-            report.append({
-                'salaried_month': row[0],
-                'base_pay': row[1],
-                'no_pay': row[2],
-                'gross_pay': row[3]
-            })
-
-        return report
-
-    def get_salary_values_for_date_range(self, start_month, end_month):
-        self.cur.execute('''
-        SELECT employee_id, salaried_month, no_pay, base_pay, gross_pay
-        FROM salary
-        WHERE salaried_month >= ? AND salaried_month <= ?
-        ORDER BY salaried_month DESC, employee_id
-        ''', (start_month, end_month))
-        rows = self.cur.fetchall()
-
-        # Converting the rows to a list of dictionaries
-        report = []
-        for row in rows:
-            report.append({
-                'employee_id': row[0],
-                'salaried_month': row[1],
-                'no_pay': row[2],
-                'base_pay': row[3],
-                'gross_pay': row[4]
-            })
-
-        return report
-
-    def get_column_names(self,):
-        self.cur.execute("PRAGMA table_info(salary)")
-        columns = self.cur.fetchall()
-        return columns
-
-    def generate_salary_entries(self, entry_gen_start_date, entry_gen_end_date):
-        current_date = entry_gen_start_date
-
-        while current_date < entry_gen_end_date:
-            for i in range(50):
-                # Generate random data for each salary entry
-                employee_id = randint(1, 16)
-                absent = randint(0, 3)
-                holiday = randint(0, 5)
-                overtime_hours = randint(0, 20)
-                base_pay = randint(1500, 10000)
-                no_pay = randint(0, 750)
-                gross_pay = base_pay - no_pay
-
-                # Set the salaried_month to the 28th of the current month
-                salaried_month = current_date.replace(day=28).strftime('%Y-%m-%d')
-
-                # Check if an entry already exists for the employee_id and salaried_month
-                self.cur.execute('''
-                    SELECT employee_id, salaried_month FROM salary WHERE employee_id = ? AND salaried_month = ?
-                ''', (employee_id, salaried_month))
-
-                existing_entry = self.cur.fetchone()
-
-                if existing_entry:
-                    print(f"Entry already exists for employee_id: {employee_id} and salaried_month: {salaried_month}")
-                    continue
-
-                self.conn.execute('''
-                    INSERT INTO salary (employee_id, absent, holidays, overtime_hours, no_pay,
-                    base_pay, gross_pay, salaried_month)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (employee_id, absent, holiday, overtime_hours, no_pay, base_pay, gross_pay, salaried_month))
-
-            # Move to the next month
-            current_date = current_date.replace(day=1) + timedelta(days=32)
-
-        self.conn.commit()
-
-
-# Initializing the database
-payroll_db = PayrollDB('./grifindo_payroll.db')
-
-# Check if the employees table is empty
-payroll_db.cur.execute("SELECT COUNT(*) FROM employees")
-result = payroll_db.cur.fetchone()
-
-if result[0] == 0:
-    # Populating the Employee table
-    payroll_db.insert('John Doe', 5000, 15, 1000)
-    payroll_db.insert('Jane Smith', 4500, 12, 800)
-    payroll_db.insert('Michael Johnson', 6000, 20, 1500)
-    payroll_db.insert('Sarah Williams', 5500, 18, 1200)
-    payroll_db.insert('Robert Brown', 4000, 10, 600)
-    payroll_db.insert('Emily Davis', 4800, 14, 900)
-    payroll_db.insert('David Anderson', 5200, 16, 1100)
-    payroll_db.insert('Jennifer Wilson', 5100, 16, 1050)
-    payroll_db.insert('Daniel Thompson', 4700, 12, 850)
-    payroll_db.insert('Olivia Garcia', 5200, 15, 1050)
-    payroll_db.insert('Matthew Martinez', 6000, 20, 1500)
-    payroll_db.insert('Sophia Clark', 4500, 13, 800)
-    payroll_db.insert('James Rodriguez', 4900, 14, 950)
-    payroll_db.insert('Lily Lewis', 5100, 17, 1050)
-    payroll_db.insert('Benjamin Young', 5300, 17, 1150)
-
-# Populating the Salary table
-
-payroll_db.cur.execute("SELECT COUNT(*) FROM salary")
-result = payroll_db.cur.fetchone()
-
-if result[0] == 0:
-    start_date = datetime(2018, 1, 1)
-    end_date = datetime(2023, 6, 1)
-    payroll_db.generate_salary_entries(start_date, end_date)
+
+def __getattr__(name):
+    # Backwards compatible module attribute for the shared database
+    if name == 'payroll_db':
+        return get_payroll_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class MonthPicker:
@@ -240,6 +36,8 @@ class MonthPicker:
             label_value.grid(padx=10, pady=10)
             top.destroy()
 
+        from tkcalendar import Calendar
+
         top = Toplevel(self.parent)
         top.title(title)
 
@@ -294,22 +92,17 @@ class EmployeeComponent(Frame):
         self.db_output_label_info = Label(self.db_output_frame, text='Select an employee to update')
         self.db_output_label_info.pack(padx=10, pady=3, anchor=W)
 
-        self.db_output_label = Label(self.db_output_frame,
-                                     text='Employee ID | Name | Salary | Overtime Rate | Allowances')
-        self.db_output_label.pack(padx=10, pady=3)
-
-        self.db_output = Listbox(self.db_output_frame)
-        self.db_output.pack(side=LEFT, fill='both', expand=True, pady=10)
-
-        self.scrollbar = ttk.Scrollbar(self.db_output_frame, orient='vertical', command=self.db_output.yview)
-        self.scrollbar.pack(side=RIGHT, fill='y')
-
-        # Configure the Listbox to use the scrollbar
-        self.db_output.config(yscrollcommand=self.scrollbar.set)
-
-        self.db_output.bind('<<ListboxSelect>>', self.select_entry)
+        self.find_frame = Frame(self.db_output_frame)
+        self.find_frame.pack(padx=10, pady=3, fill='x')
+        self.find_label = Label(self.find_frame, text="Find (name or ID): ")
+        self.find_label.pack(side=LEFT, anchor=N)
+        self.find_box = EmployeeSearchBox(self.find_frame, get_payroll_db, on_pick=self.show_employee)
+        self.find_box.pack(side=LEFT, fill='x', expand=True)
 
-        self.populate_list()
+        # Only the visible employees are read from the DB; click a column heading to sort by it
+        self.db_output = EmployeeGrid(self.db_output_frame, EmployeePageModel(get_payroll_db()),
+                                      on_select=self.select_entry)
+        self.db_output.pack(fill='both', expand=True, pady=10)
 
         self.delete_frame = LabelFrame(self, text="Delete Employee")
         self.delete_frame.pack(padx=10, pady=10, fill='both')
@@ -324,13 +117,8 @@ class EmployeeComponent(Frame):
         self.delete_button.grid(row=0, column=2, padx=5, pady=5)
 
     def populate_list(self):
-        # All employee records will be fetched from the DB and displayed in the textbox
-
-        self.db_output.delete(0, END)
-        # Loop through records
-        for row in PayrollDB.fetch(payroll_db):
-            # Insert into list
-            self.db_output.insert(END, row)
+        # Re-reads the employee count and the visible rows of the list
+        self.db_output.refresh()
 
     def register_employee(self):
 
@@ -340,8 +128,8 @@ class EmployeeComponent(Frame):
             return
 
         else:
-            PayrollDB.insert(payroll_db, self.name_entry.get(), self.salary_entry.get(), self.overtime_entry.get(),
-                             self.allowances_entry.get())
+            PayrollDB.insert(get_payroll_db(), self.name_entry.get(), self.salary_entry.get(),
+                             self.overtime_entry.get(), self.allowances_entry.get())
             # Clear the entry fields after registration
             self.name_entry.delete(0, END)
             self.salary_entry.delete(0, END)
@@ -349,7 +137,7 @@ class EmployeeComponent(Frame):
             self.allowances_entry.delete(0, END)
 
             messagebox.showinfo('Success', 'Employee registered successfully!')
-            self.populate_list()
+            self.db_output.row_inserted()
             return
 
     def update_employee(self):
@@ -359,9 +147,14 @@ class EmployeeComponent(Frame):
             messagebox.showerror("Required Fields", 'Please fill all the fields, to update the employee!')
             return
 
+        elif not self.search_entry.get().strip().isdecimal():
+            messagebox.showerror("Required Fields", 'Please enter a valid ID to update the employee!')
+            return
+
         else:
-            PayrollDB.update(payroll_db, self.name_entry.get(), self.salary_entry.get(), self.overtime_entry.get(),
-                             self.allowances_entry.get(), self.search_entry.get())
+            employee_id = int(self.search_entry.get())
+            PayrollDB.update(get_payroll_db(), self.name_entry.get(), self.salary_entry.get(),
+                             self.overtime_entry.get(), self.allowances_entry.get(), employee_id)
             # Clear the entry fields after registration
             self.name_entry.delete(0, END)
             self.salary_entry.delete(0, END)
@@ -370,16 +163,14 @@ class EmployeeComponent(Frame):
             self.search_entry.delete(0, END)
 
             messagebox.showinfo('Success', 'Employee record updated successfully!')
-            self.populate_list()
+            self.db_output.row_updated(employee_id)
             return
 
     def select_entry(self, event):
         # This function also works as a search. As data from the selected entry will populate the entry boxes.
 
-        selection = self.db_output.curselection()
-        if selection:
-            index = selection[0]
-            selected_entry = self.db_output.get(index)
+        selected_entry = self.db_output.selected_row()
+        if selected_entry:
 
             self.search_entry.delete(0, END)
             self.search_entry.insert(END, selected_entry[0])
@@ -396,6 +187,10 @@ class EmployeeComponent(Frame):
             self.allowances_entry.delete(0, END)
             self.allowances_entry.insert(END, selected_entry[4])
 
+    def show_employee(self, row):
+        # Picked from the type-ahead search: scrolled to in the list, which fills the entry fields
+        self.db_output.show_employee(row)
+
     def clear_entry(self):
 
         self.search_entry.delete(0, END)
@@ -406,17 +201,18 @@ class EmployeeComponent(Frame):
 
     def delete_employee(self):
 
-        if self.search_entry.get() == '':
+        if not self.search_entry.get().strip().isdecimal():
             messagebox.showerror("Required Fields", 'Please enter a valid ID to delete the employee!')
             return
 
         else:
-            PayrollDB.delete(payroll_db, self.search_entry.get())
+            employee_id = int(self.search_entry.get())
+            PayrollDB.delete(get_payroll_db(), employee_id)
             # Clear the entry fields after registration
             self.search_entry.delete(0, END)
 
             messagebox.showinfo('Success', 'Employee deleted successfully!')
-            self.populate_list()
+            self.db_output.row_deleted(employee_id)
             return
 
 
@@ -457,13 +253,15 @@ class SettingsComponent(Frame):
         # Calculating the number of days for the current month
         self.salary_cycle_date_range = (self.last_day - self.first_day).days + 1
 
-        self.cycle_days_entry.insert(0, str(self.salary_cycle_date_range))
+        # The saved settings (see PayrollDB.payroll_settings); cycle days are the month's days unless set
+        settings = get_payroll_db().payroll_settings()
+        self.cycle_days_entry.insert(0, str(settings.cycle_days or self.salary_cycle_date_range))
         self.cycle_days_entry.grid(row=2, column=1, padx=5, pady=5)
 
         self.leave_limit_label = Label(self.settings_frame, text="Leave Limit (per year): ")
         self.leave_limit_label.grid(row=3, column=0, padx=5, pady=5, sticky=W)
         self.leave_limit_entry = Entry(self.settings_frame)
-        self.leave_limit_entry.insert(0, '30')
+        self.leave_limit_entry.insert(0, str(settings.leave_limit))
         self.leave_limit_entry.grid(row=3, column=1, padx=5, pady=5)
 
         self.update_button = ttk.Button(self.settings_frame, text="Confirm Salary Settings",
@@ -480,7 +278,7 @@ class SettingsComponent(Frame):
         self.cycle_days_entry.delete(0, END)
         self.leave_limit_entry.delete(0, END)
         self.cycle_days_entry.insert(0, str(self.salary_cycle_date_range))  # Setting the default value
-        self.leave_limit_entry.insert(0, '2')  # Setting the default value
+        self.leave_limit_entry.insert(0, str(DEFAULT_LEAVE_LIMIT))  # Setting the default value
 
         # Reset the grid layout
         self.cycle_days_entry.grid(row=2, column=1, padx=5, pady=5)
@@ -499,6 +297,16 @@ class SettingsComponent(Frame):
         cycle_days = self.cycle_days_entry.get()
         leave_limit = self.leave_limit_entry.get()
 
+        # Saved as a new settings version; the tax brackets are kept as they are
+        try:
+            db = get_payroll_db()
+            brackets = db.tax_brackets(db.payroll_settings().version)
+            db.save_payroll_settings(None if int(cycle_days) == self.salary_cycle_date_range else int(cycle_days),
+                                     int(leave_limit), brackets)
+        except ValueError as error:
+            messagebox.showerror("Invalid Settings", str(error))
+            return
+
         # Remove the entry fields
         self.cycle_days_entry.grid_remove()
         self.leave_limit_entry.grid_remove()
@@ -530,10 +338,12 @@ class SalaryComponent(SettingsComponent):
         self.employee_frame = LabelFrame(self, text="Employee Details")
         self.employee_frame.pack(padx=10, pady=10,fill='both')
 
-        self.search_label = Label(self.employee_frame, text="Employee ID: ")
-        self.search_label.grid(row=0, column=0, padx=5, pady=5, sticky=W)
-        self.search_entry = Entry(self.employee_frame)
-        self.search_entry.grid(row=0, column=1, padx=5, pady=5, sticky=W + E)
+        self.search_label = Label(self.employee_frame, text="Employee ID or Name: ")
+        self.search_label.grid(row=0, column=0, padx=5, pady=5, sticky=W + N)
+        # Typing lists matching employees; the Search button still looks up an exact ID
+        self.search_box = EmployeeSearchBox(self.employee_frame, get_payroll_db, on_pick=self.show_employee)
+        self.search_box.grid(row=0, column=1, padx=5, pady=5, sticky=W + E)
+        self.search_entry = self.search_box.entry
 
         self.search_button = ttk.Button(self.employee_frame, text="Search", command=self.search_employee,
                                         )
@@ -611,7 +421,8 @@ class SalaryComponent(SettingsComponent):
         self.calculate_button = ttk.Button(self.salary_frame, text="Calculate Salary", command=self.calculate_salary)
         self.calculate_button.grid(row=6, column=1, columnspan=2, padx=5, pady=5, sticky=W + E)
 
-        self.calculate_button = ttk.Button(self.salary_frame, text="Record Employee Payroll",command=self.record_payroll)
+        self.calculate_button = ttk.Button(self.salary_frame, text="Record Employee Payroll",
+                                           command=self.record_payroll)
         self.calculate_button.grid(row=7, columnspan=2, padx=10, pady=5, sticky=W + E)
 
     def select_start_date(self):
@@ -647,14 +458,10 @@ class SalaryComponent(SettingsComponent):
         employee_id = self.search_entry.get()
 
         if employee_id:
-            output = PayrollDB.search(payroll_db, employee_id)
+            output = PayrollDB.search(get_payroll_db(), employee_id)
 
             if output:
-                self.employee_id.set(output[0])
-                self.employee_name.set(output[1])
-                self.employee_salary.set(output[2])
-                self.employee_overtime.set(output[3])
-                self.employee_allowances.set(output[4])
+                self.show_employee(output)
             else:
                 messagebox.showerror("Employee Not Found", "Employee not found!")
         else:
@@ -662,6 +469,13 @@ class SalaryComponent(SettingsComponent):
 
         self.search_entry.delete(0, END)
 
+    def show_employee(self, output):
+        self.employee_id.set(output[0])
+        self.employee_name.set(output[1])
+        self.employee_salary.set(output[2])
+        self.employee_overtime.set(output[3])
+        self.employee_allowances.set(output[4])
+
     def calculate_salary(self):
         if self.absent_days_entry.get() == "" or self.holidays_entry.get() == "" or \
                 self.overtime_hours_entry.get() == "" or self.start_date_value.get() == "" or \
@@ -685,15 +499,20 @@ class SalaryComponent(SettingsComponent):
             else:
                 salary_cycle_date_range = int(self.salary_cycle_date_range)
 
-            # Calculate no-pay value
-            self.no_pay_value = (monthly_salary / salary_cycle_date_range) * no_of_absent_days
-
-            # Calculate base pay value
-            self.base_pay_value = monthly_salary + allowances + (overtime_rate * no_of_overtime_hours)
-
-            # Calculate gross pay
-            government_tax_rate = 0.25  # Example value, you may need to adjust it
-            self.gross_pay = self.base_pay_value - (self.no_pay_value + self.base_pay_value * government_tax_rate)
+            # Only the absent days beyond the yearly leave limit are unpaid, counting the leave taken in the
+            # earlier months of the year
+            from payroll_engine import compute_payroll, unpaid_absence
+            from payroll_rules import PayrollRules
+            rules = PayrollRules.load(get_payroll_db())
+            leave_taken = get_payroll_db().leave_taken(self.end_date_value.get() or date.today(),
+                                                       self.employee_id.get())
+            unpaid_days = int(unpaid_absence(no_of_absent_days, leave_taken, rules.leave_limit))
+
+            # Calculate no-pay, base pay and gross pay (shared with the batch payroll engine), taxed by the
+            # saved tax brackets
+            self.no_pay_value, self.base_pay_value, self.gross_pay = compute_payroll(
+                monthly_salary, allowances, overtime_rate, unpaid_days, no_of_overtime_hours,
+                salary_cycle_date_range, rules.tax)
 
             # Display the calculated values
             messagebox.showinfo("Salary Calculation", f"Base Pay: {self.base_pay_value}\nGross Pay: {self.gross_pay}")
@@ -705,16 +524,17 @@ class SalaryComponent(SettingsComponent):
         elif self.employee_id.get() == "":
             messagebox.showerror("Required Fields", "Search for an employee to calculate salary!")
         else:
-            salaried_month = date.today()
+            # The month of the salary cycle end date (or this month); recording it again replaces the entry
+            salaried_month = self.end_date_value.get() or date.today()
 
             # Access the class-level variables
             no_pay = self.no_pay_value
             base_pay = self.base_pay_value
             gross_pay = self.gross_pay
 
-            PayrollDB.record_payroll(payroll_db, self.employee_id.get(), self.absent_days_entry.get(),
-                                     self.holidays_entry.get(), self.overtime_hours_entry.get(), no_pay, base_pay,
-                                     gross_pay, salaried_month)
+            PayrollDB.record_payroll(get_payroll_db(), self.employee_id.get(), self.absent_days_entry.get(),
+                                     self.holidays_entry.get(), self.overtime_hours_entry.get(), no_pay,
+                                     base_pay, gross_pay, salaried_month)
 
             messagebox.showinfo('Success', 'Employee Payroll Recorded Successfully!')
 
@@ -784,13 +604,39 @@ class ReportGenerator(Frame):
         self.report_end_date_label_value = Label(self.employee_report_label_frame, textvariable=self.end_date_value)
         self.report_end_date_label_value.grid(row=2, column=1, padx=5, pady=5, sticky=W)
 
+        self.export_format_label = Label(self.employee_report_label_frame, text="Export Format: ")
+        self.export_format_label.grid(row=3, column=0, padx=10, pady=10, sticky=W)
+        self.export_format_var = StringVar(value='xlsx')
+        self.export_format_combobox = ttk.Combobox(self.employee_report_label_frame,
+                                                   textvariable=self.export_format_var,
+                                                   values=list(report_export.EXPORTERS), state='readonly', width=10)
+        self.export_format_combobox.grid(row=3, column=1, padx=10, pady=10)
 
         self.generate_report = ttk.Button(self.employee_report_label_frame, text="Generate Report",
                                           command=self.generate_report)
-        self.generate_report.grid(row=3, columnspan=2, padx=10, pady=10,)
+        self.generate_report.grid(row=4, columnspan=2, padx=10, pady=10,)
 
         self.reset_button = ttk.Button(self.employee_report_label_frame, text="Reset", command=self.reset_layout)
-        self.reset_button.grid(row=3, column=1, padx=10, pady=10, sticky=E)
+        self.reset_button.grid(row=4, column=1, padx=10, pady=10, sticky=E)
+
+        # Reports are queried and exported on background workers; queued and running jobs are listed here
+        self.task_runner = TaskRunner(self, workers=2, on_change=self.show_job)
+
+        self.jobs_frame = LabelFrame(self.employee_report_frame, text="Report Jobs")
+        self.jobs_frame.pack(padx=10, pady=10, fill='both')
+
+        self.jobs_tree = ttk.Treeview(self.jobs_frame, columns=('status',), height=4)
+        self.jobs_tree.heading('#0', text="Report")
+        self.jobs_tree.heading('status', text="Status")
+        self.jobs_tree.column('#0', width=300)
+        self.jobs_tree.column('status', width=140)
+        self.jobs_tree.grid(row=0, column=0, columnspan=2, padx=10, pady=5, sticky=W + E)
+
+        self.job_progress = ttk.Progressbar(self.jobs_frame, mode='indeterminate')
+        self.job_progress.grid(row=1, column=0, padx=10, pady=5, sticky=W + E)
+
+        self.cancel_button = ttk.Button(self.jobs_frame, text="Cancel", command=self.cancel_job)
+        self.cancel_button.grid(row=1, column=1, padx=10, pady=5, sticky=E)
 
     def reset_layout(self):
         self.employee_id_entry.delete(0, END)
@@ -858,61 +704,101 @@ class ReportGenerator(Frame):
         employee_id = self.employee_id_entry.get()
         start_date = self.start_date_value.get()
         end_date = self.end_date_value.get()
-        report_type = self.report_type_var.get()
+        report_type = {1: 'monthly', 2: 'summary', 3: 'gross'}.get(self.report_type_var.get())
+        if report_type is None:
+            return
 
-        if report_type == 1:  # Monthly Salary Report
-            report = payroll_db.get_monthly_salary_report(employee_id)
-            if report:
-                filename = f"emp_id_{employee_id}_monthly_salary_report.xlsx"
-                self.export_report(report, filename)
-            else:
-                messagebox.showinfo("No Data", "No monthly salary report data found.")
+        # The fields are read here, on the GUI thread; the job itself runs on a worker
+        task = Task(report_export.REPORT_TYPES[report_type], self.run_report_job,
+                    (report_type, employee_id, start_date, end_date, self.export_format_var.get()),
+                    on_done=self.report_done, on_error=self.report_failed, on_progress=self.report_progress)
+        self.task_runner.submit(task)
+        self.reset_layout()
 
-        elif report_type == 2:  # Overall Salary Summary
-            report = payroll_db.get_overall_salary_summary(employee_id, start_date, end_date)
-            if report:
-                filename = f"emp_id_{employee_id}_overall_salary_summary_{start_date}_to_{end_date}.xlsx"
-                self.export_report(report, filename)
-            else:
-                messagebox.showinfo("No Data", "No overall salary summary data found.")
+    def run_report_job(self, task, report_type, employee_id, start_date, end_date, export_format):
+        # Worker thread: query and export the report; returns None when there is no data
+        report, filename = report_export.open_report(get_payroll_db(), report_type, employee_id, start_date, end_date,
+                                                     report_export.get_report_cache())
+        task.check_cancelled()
+        if not report:
+            return None
+        return self.export_report(report, filename, export_format, task.progress)
+
+    def export_report(self, report, name, export_format=None, progress=None):
+        # Rows are streamed from the database cursor straight into the "Reports" folder,
+        # in the selected export format
+        if export_format is None:
+            export_format = self.export_format_var.get()
+        file_path, _ = report_export.export_report(report, name, export_format, progress=progress)
+        return file_path
+
+    def report_done(self, task, file_path):
+        if file_path is None:
+            messagebox.showinfo("No Data", f"No {task.name.lower()} data found.")
+            return
+        filename = os.path.basename(file_path)
+        messagebox.showinfo("Success", f"Report Generated and in the 'Reports' folder\n\nFile Name: {filename}")
 
-        elif report_type == 3:  # Gross Pay Report
-            report = payroll_db.get_salary_values_for_date_range(start_date, end_date)
-            if report:
-                filename = f"gross_pay_report_{start_date}_to_{end_date}.xlsx"
-                self.export_report(report, filename)
-            else:
-                messagebox.showinfo("No Data", "No gross pay report data found.")
+    def report_failed(self, task, error):
+        messagebox.showerror("Export Failed", str(error))
+
+    def report_progress(self, task, rows, total=None):
+        if self.jobs_tree.exists(task.id):
+            self.jobs_tree.set(task.id, 'status', f"{rows:,} rows exported")
+
+    def show_job(self, task):
+        # Keeps the job list and the progress bar in step with the task states
+        if task.state == QUEUED:
+            # Employee ID and dates of the job, after the report name
+            details = " ".join(str(arg) for arg in task.args[1:4] if arg)
+            self.jobs_tree.insert('', END, iid=task.id, text=f"{task.name} {details}", values=(QUEUED,))
+        elif task.state == RUNNING:
+            self.jobs_tree.set(task.id, 'status', RUNNING)
+        elif self.jobs_tree.exists(task.id):
+            self.jobs_tree.delete(task.id)
+
+        if self.task_runner.tasks:
+            self.job_progress.start()
+        else:
+            self.job_progress.stop()
 
-    def export_report(self, report, filename):
-        workbook = Workbook()
-        sheet = workbook.active
+    def cancel_job(self):
+        # Cancels the selected jobs, or every job when none is selected
+        selected = {int(iid) for iid in self.jobs_tree.selection()}
+        for task in self.task_runner.tasks:
+            if not selected or task.id in selected:
+                task.cancel()
+                if self.jobs_tree.exists(task.id):
+                    self.jobs_tree.set(task.id, 'status', "cancelling")
 
-        column_names = list(report[0].keys())
-        sheet.append(column_names)
+    def get_column_names(self, report):
+        if report:
+            return list(report.columns)
+        else:
+            return []
 
-        # Write the report data to the workbook
-        for row in report:
-            sheet.append(list(row.values()))
 
-        # Create the "Report" folder if it doesn't exist
-        folder_path = "Reports"
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
+class StatsPanel(Frame):
+    # Debug tab, shown when started with --stats: what payroll_metrics recorded so far
 
-        # Save the workbook to the "Report" folder with the specified filename
-        file_path = os.path.join(folder_path, filename)
-        workbook.save(file_path)
+    def __init__(self, parent):
+        super().__init__(parent)
 
-        messagebox.showinfo("Success", f"Report Generated and in the 'Reports' folder\n\nFile Name: {filename}")
-        self.reset_layout()
+        self.text = Text(self, width=110, height=30, font='TkFixedFont', wrap=NONE)
+        self.text.pack(padx=10, pady=10, fill='both', expand=True)
+        self.buttons_frame = Frame(self)
+        self.buttons_frame.pack(pady=5)
+        ttk.Button(self.buttons_frame, text="Refresh", command=self.refresh).grid(row=0, column=0, padx=5)
+        ttk.Button(self.buttons_frame, text="Reset", command=self.reset).grid(row=0, column=1, padx=5)
+        self.refresh()
 
-    def get_column_names(self, report):
-        if report:
-            column_names = list(report[0].keys())
-            return column_names
-        else:
-            return []
+    def refresh(self):
+        self.text.delete('1.0', END)
+        self.text.insert(END, payroll_metrics.metrics.report())
+
+    def reset(self):
+        payroll_metrics.metrics.reset()
+        self.refresh()
 
 
 class PayrollSystem(Tk):
@@ -930,8 +816,26 @@ class PayrollSystem(Tk):
         self.notebook.add(self.employee_component, text="Employee")
         self.notebook.add(self.salary_component, text="Salary")
         self.notebook.add(self.report_generator, text="Report")
+        if payroll_metrics.enabled:
+            self.stats_panel = StatsPanel(self.notebook)
+            self.notebook.add(self.stats_panel, text="Stats")
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def close(self):
+        # Running report jobs stop at their next progress check
+        self.report_generator.task_runner.shutdown()
+        self.destroy()
 
 
 if __name__ == "__main__":
+    if '--stats' in sys.argv[1:]:
+        # Time the database calls and exports, shown on a Stats tab
+        payroll_metrics.enable()
+
+    if '--seed' in sys.argv[1:]:
+        # Load the sample employees and salary history into an empty database
+        seed_database(get_payroll_db())
+
     payroll_system = PayrollSystem()
     payroll_system.mainloop()
@@ -0,0 +1,316 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    # Thread-safe mapping bounded to max_entries: the least recently used entry is evicted first, and
+    # entries older than ttl seconds (when given) are dropped on access. Counts hits, misses, evictions
+    # and expirations.
+
+    def __init__(self, max_entries=10000, ttl=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, expiry time or None)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a value loaded before a write is not stored after it
+        self._generation = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, key):
+        # Caller holds the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires = entry
+        if expires is not None and self.clock() >= expires:
+            del self._entries[key]
+            self.expirations += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value):
+        # Caller holds the lock
+        expires = None if self.ttl is None else self.clock() + self.ttl
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_load(self, key, load):
+        # Returns the cached value, or calls load() outside the lock and caches its result.
+        # None results are not cached.
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generation
+
+        value = load()
+        if value is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, value)
+        return value
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class CachedReport:
+    # A report held in memory: column names and rows, iterable any number of times (unlike ReportStream).
+    # exports records the files written from it (see report_export.export_report), so an unchanged
+    # report is not written again.
+
+    def __init__(self, columns, rows):
+        self.columns = columns
+        self.rows = rows
+        self.exports = {}
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def estimated_size(self):
+        # Bytes held by the rows, estimated from a sample of them
+        if not self.rows:
+            return sys.getsizeof(self.rows)
+        sample = self.rows[:100]
+        per_row = sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in sample) / len(sample)
+        return sys.getsizeof(self.rows) + int(per_row * len(self.rows))
+
+
+class ReportCache:
+    # Thread-safe cache of CachedReports bounded by their estimated size in bytes, least recently used
+    # evicted first. With a spill_folder, evicted reports are pickled there with their exports (up to
+    # spill_max_bytes, oldest files removed first) and read back on a memory miss, also by later processes;
+    # the folder must only be written by this cache.
+    # Every entry belongs to a data version (see PayrollDB.data_version): once a newer version is seen,
+    # the entries of older versions are dropped from memory and disk, so a report is never served from
+    # data that has changed since.
+
+    def __init__(self, max_bytes=64 * 2**20, spill_folder=None, spill_max_bytes=512 * 2**20):
+        self.max_bytes = max_bytes
+        self.spill_folder = spill_folder
+        self.spill_max_bytes = spill_max_bytes
+        self._entries = OrderedDict()  # key -> (report, size)
+        self._files = OrderedDict()    # spilled file name -> size, least recently used first
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = self.evictions = self.spills = self.stale = 0
+        if spill_folder is not None:
+            os.makedirs(spill_folder, exist_ok=True)
+            for name in sorted(os.listdir(spill_folder), key=lambda name: os.path.getmtime(
+                    os.path.join(spill_folder, name))):
+                if name.endswith('.pickle'):
+                    self._files[name] = os.path.getsize(os.path.join(spill_folder, name))
+
+    # hashlib and pickle are only imported with a spill folder, which keeps them out of the imports of
+    # the application
+
+    @staticmethod
+    def _version_tag(version):
+        import hashlib
+        return hashlib.sha1(repr(version).encode()).hexdigest()[:12]
+
+    def _file_name(self, key, version):
+        import hashlib
+        return f"{self._version_tag(version)}-{hashlib.sha1(repr(key).encode()).hexdigest()}.pickle"
+
+    def _see_version(self, version):
+        # Caller holds the lock. Returns the spilled files to delete when the version changed.
+        if version == self._version:
+            return []
+        self._version = version
+        self.stale += len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+        if self.spill_folder is None:
+            return []
+        tag = self._version_tag(version)
+        stale = [name for name in self._files if not name.startswith(tag)]
+        for name in stale:
+            del self._files[name]
+        return stale
+
+    def _store(self, key, report, size):
+        # Caller holds the lock. Returns the evicted (key, report) pairs, for spilling.
+        evicted = []
+        if size > self.max_bytes:
+            return [(key, report)]
+        if key in self._entries:
+            # Loaded twice at the same time
+            self._bytes -= self._entries[key][1]
+        self._entries[key] = (report, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, (old_report, old_size) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            self.evictions += 1
+            evicted.append((old_key, old_report))
+        return evicted
+
+    def _spill(self, version, evicted):
+        # Writes evicted reports to the spill folder, outside the lock
+        if self.spill_folder is None:
+            return
+        for key, report in evicted:
+            name = self._file_name(key, version)
+            with self._lock:
+                if name in self._files or version != self._version:
+                    continue
+            import pickle
+            path = os.path.join(self.spill_folder, name)
+            with open(path, 'wb') as file:
+                pickle.dump((report.columns, report.rows, report.exports), file, protocol=pickle.HIGHEST_PROTOCOL)
+            removed = []
+            with self._lock:
+                if version != self._version:
+                    # Newer data was seen while writing
+                    removed.append(name)
+                else:
+                    self._files[name] = os.path.getsize(path)
+                    self.spills += 1
+                while sum(self._files.values()) > self.spill_max_bytes:
+                    removed.append(self._files.popitem(last=False)[0])
+            self._remove_files(removed)
+
+    def _remove_files(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.spill_folder, name))
+            except FileNotFoundError:
+                pass
+
+    def _read_spilled(self, name):
+        import pickle
+        try:
+            with open(os.path.join(self.spill_folder, name), 'rb') as file:
+                columns, rows, exports = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        report = CachedReport(columns, rows)
+        report.exports = exports
+        return report
+
+    def get_or_load(self, key, version, load):
+        # The report cached for key at this data version, or load() (a CachedReport) cached. load() returns
+        # None for a result too large to cache, which is passed on to the caller.
+        with self._lock:
+            stale = self._see_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            name = None if self.spill_folder is None else self._file_name(key, version)
+            spilled = entry is None and name in self._files
+            if spilled:
+                self._files.move_to_end(name)
+        self._remove_files(stale)
+        if entry is not None:
+            return entry[0]
+
+        report = self._read_spilled(name) if spilled else None
+        with self._lock:
+            if report is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        if report is None:
+            report = load()
+            if report is None:
+                return None
+
+        with self._lock:
+            if version != self._version:
+                # Newer data was seen while loading: hand the report out, but don't keep it
+                return report
+            evicted = self._store(key, report, report.estimated_size())
+        self._spill(version, evicted)
+        return report
+
+    def save(self):
+        # Spills the reports held in memory too, so that a later process (e.g. the next CLI command)
+        # reads them back instead of querying again
+        with self._lock:
+            version = self._version
+            entries = [(key, report) for key, (report, size) in self._entries.items()]
+        self._spill(version, entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            names, self._files = list(self._files), OrderedDict()
+        if self.spill_folder is not None:
+            self._remove_files(names)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'spilled_entries': len(self._files),
+                'spilled_bytes': sum(self._files.values()),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'spills': self.spills,
+                'stale_dropped': self.stale,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,441 @@
+"""Command-line interface of the Grifindo Toys Payroll System.
+
+Runs payroll, reports and database maintenance without starting the Tk GUI, e.g.
+
+    python payroll_cli.py employees import staff.csv
+    python payroll_cli.py payroll run --start 2024-01-01 --end 2024-01-31 --attendance january.csv
+    python payroll_cli.py report gross --start 2024-01-01 --end 2024-12-31 --format csv
+    python payroll_cli.py db info
+    python payroll_cli.py serve --port 8765
+    python payroll_cli.py stats --profile run.prof payroll run --start 2024-01-01 --end 2024-01-31
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+import time
+from contextlib import ExitStack
+from datetime import date
+
+from payroll_database import DEFAULT_DB_PATH, SCHEMA_VERSION, PayrollDB, period_label, seed_database
+import payroll_metrics
+import report_export
+
+EMPLOYEE_COLUMNS = ('name', 'monthly_salary', 'overtime_rate', 'allowances')
+TIMESHEET_COLUMNS = ('employee_id', 'date', 'absent', 'holidays', 'overtime_hours')
+
+
+def parse_date(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {text!r}, expected YYYY-MM-DD") from None
+
+
+def positive_int(text):
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"invalid count {text!r}, expected a whole number of 1 or more")
+    return value
+
+
+def import_employees(args):
+    # Streams the CSV rows straight into insert_many
+    with open(args.file, newline='') as file:
+        reader = csv.DictReader(file)
+        missing = set(EMPLOYEE_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{args.file}: missing column(s) {', '.join(sorted(missing))}")
+
+        db = PayrollDB(args.db)
+        count = db.insert_many(([row[name] for name in EMPLOYEE_COLUMNS] for row in reader), args.commit_every)
+    print(f"Imported {count} employee(s)")
+
+
+def search_employees(args):
+    db = PayrollDB(args.db)
+    for row in db.search_names(args.text, args.limit):
+        print("\t".join(str(value) for value in row))
+
+
+def run_payroll(args):
+    # NumPy is only needed by this command
+    from payroll_engine import AttendanceTable, run_payroll
+
+    db = PayrollDB(args.db)
+    if args.attendance:
+        attendance = AttendanceTable.from_csv(args.attendance)
+    elif args.timesheets:
+        attendance = AttendanceTable.from_timesheets(db, args.start.isoformat(), args.end.isoformat())
+    else:
+        attendance = AttendanceTable.from_rows([])
+
+    result = run_payroll(db, attendance, args.start, args.end, args.salaried_month, commit_every=args.commit_every,
+                         workers=args.workers, resume=args.resume)
+    print(f"Recorded payroll for {len(result)} employee(s), salaried month {result.salaried_month}, "
+          f"total gross pay {result.gross_pay.sum():,.2f}")
+
+
+def import_timesheets(args):
+    with open(args.file, newline='') as file:
+        reader = csv.DictReader(file)
+        missing = set(TIMESHEET_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"{args.file}: missing column(s) {', '.join(sorted(missing))}")
+
+        db = PayrollDB(args.db)
+        count = db.import_timesheets(([row[name] for name in TIMESHEET_COLUMNS] for row in reader), args.commit_every)
+    print(f"Imported {count} timesheet line(s)")
+
+
+def show_leave(args):
+    db = PayrollDB(args.db)
+    leave_limit = db.payroll_settings().leave_limit
+    row = db.conn.execute("SELECT absent_days FROM leave_balances WHERE year = ? AND employee_id = ?",
+                          (str(args.year), args.employee_id)).fetchone()
+    taken = row[0] if row else 0
+    print(f"Employee {args.employee_id}, {args.year}: {taken} of {leave_limit} leave day(s) taken, "
+          f"{max(leave_limit - taken, 0)} left")
+
+
+def list_payroll_runs(args):
+    db = PayrollDB(args.db)
+    print(f"{'run':>5}  {'month':<10}  {'period':<23}  {'status':<10}  {'written':>15}  {'checkpoint':>10}  "
+          f"{'settings':>8}  finished")
+    for run in db.payroll_runs(args.limit):
+        print(f"{run.id:>5}  {run.salaried_month:<10}  {run.start_date} - {run.end_date}  {run.status:<10}  "
+              f"{f'{run.rows_written}/{run.employees}':>15}  {run.last_employee_id or '':>10}  "
+              f"{run.settings_version or '':>8}  {run.finished_at or ''}")
+
+
+def recompute_payroll(args):
+    # Rewrites the salary entries made stale by employee rate changes and attendance corrections
+    from payroll_engine import recompute_changes
+
+    db = PayrollDB(args.db)
+    pending = db.pending_changes()
+    since = args.since.isoformat() if args.since else None
+    changes = recompute_changes(db, since, args.cycle_days, dry_run=args.dry_run)
+    for change in changes:
+        print(f"employee {change.employee_id}, {change.salaried_month}: gross pay {change.old_gross_pay:,.2f} -> "
+              f"{change.gross_pay:,.2f}")
+    verb = "Would rewrite" if args.dry_run else "Rewrote"
+    print(f"{verb} {len(changes)} salary entries for {pending} logged change(s)")
+
+
+def parse_bracket(text):
+    # "LOWER:RATE", e.g. "5000:0.3"
+    try:
+        lower_bound, rate = text.split(':')
+        return float(lower_bound), float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid tax bracket {text!r}, expected LOWER:RATE") from None
+
+
+def show_settings(args):
+    db = PayrollDB(args.db)
+    settings = db.payroll_settings(args.version)
+    if settings is None:
+        raise ValueError(f"no payroll settings version {args.version}")
+    print(f"Version:     {settings.version} (saved {settings.created_at})")
+    print(f"Cycle days:  {settings.cycle_days or 'days of the salary cycle'}")
+    print(f"Leave limit: {settings.leave_limit} day(s) per year")
+    print("Tax brackets:")
+    for lower_bound, rate in db.tax_brackets(settings.version):
+        print(f"  from {lower_bound:>12,.2f}  {rate:.2%}")
+
+
+def save_settings(args):
+    # Unchanged settings are carried over from the current version
+    db = PayrollDB(args.db)
+    current = db.payroll_settings()
+    cycle_days = None if args.month_days else args.cycle_days or current.cycle_days
+    leave_limit = current.leave_limit if args.leave_limit is None else args.leave_limit
+    version = db.save_payroll_settings(cycle_days, leave_limit, args.bracket or db.tax_brackets(current.version))
+    print(f"Saved payroll settings version {version}")
+
+
+def settings_history(args):
+    db = PayrollDB(args.db)
+    for settings in db.settings_history():
+        brackets = ", ".join(f"{rate:.0%} from {lower_bound:,.0f}" for lower_bound, rate in
+                             db.tax_brackets(settings.version))
+        print(f"{settings.version:>4}  {settings.created_at}  cycle days {settings.cycle_days or '-'}, "
+              f"leave limit {settings.leave_limit}, tax {brackets}")
+
+
+def generate_report(args):
+    if args.type in ('monthly', 'summary') and args.employee_id is None:
+        raise ValueError(f"the {report_export.REPORT_TYPES[args.type]} needs --employee-id")
+    if args.type in ('summary', 'gross') and (args.start is None or args.end is None):
+        raise ValueError(f"the {report_export.REPORT_TYPES[args.type]} needs --start and --end")
+
+    start_date = args.start.isoformat() if args.start else None
+    end_date = args.end.isoformat() if args.end else None
+
+    # Through the report cache, saved to its folder so that asking again for an unchanged report reads
+    # it back (and skips the export when its file is unchanged too)
+    db = PayrollDB(args.db)
+    cache = report_export.get_report_cache()
+    report, name = report_export.open_report(db, args.type, args.employee_id, start_date, end_date, cache)
+    if not report:
+        print(f"No {report_export.REPORT_TYPES[args.type].lower()} data found.")
+        return
+
+    file_path, count = report_export.export_report(report, name, args.format, args.output)
+    cache.save()
+    print(f"Wrote {count} row(s) to {file_path}")
+
+
+def serve_reports(args):
+    # Imported here so the other commands don't load asyncio
+    from payroll_cache import ReportCache
+    from report_service import run_report_service
+
+    cache = ReportCache(args.cache_mb * 2**20) if args.cache_mb else None
+    run_report_service(PayrollDB(args.db), args.host, args.port, args.workers, cache)
+
+
+def database_info(args):
+    db = PayrollDB(args.db)
+    print(f"Database:        {args.db}")
+    print(f"Schema version:  {db.schema_version()} (latest {SCHEMA_VERSION})")
+    for table in ('employees', 'salary', 'salary_rollup', 'payroll_changes', 'payroll_runs', 'timesheets',
+                  'leave_balances'):
+        count = db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"{table + ':':<17}{count} row(s)")
+
+
+def migrate_database(args):
+    # Opening the database applies any pending migration
+    db = PayrollDB(args.db)
+    print(f"Schema version {db.schema_version()}")
+
+
+def seed_sample_data(args):
+    employees, salary_entries = seed_database(PayrollDB(args.db))
+    print(f"Added {employees} sample employee(s) and {salary_entries} salary entries")
+
+
+def generate_data(args):
+    # NumPy is only needed by this command
+    from synthetic_data import generate_dataset
+
+    overrides = {name: value for name, value in (('absence_mean', args.absence_mean),
+                                                 ('overtime_share', args.overtime_share),
+                                                 ('overtime_mean', args.overtime_mean)) if value is not None}
+    start = time.perf_counter()
+    employees, salary_entries = generate_dataset(PayrollDB(args.db), args.employees, args.months,
+                                                 args.start.replace(day=1), args.seed, **overrides)
+    print(f"Generated {employees} employee(s) and {salary_entries} salary entries "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+def check_database(args):
+    db = PayrollDB(args.db)
+    problems = [row[0] for row in db.conn.execute("PRAGMA integrity_check")]
+    print("\n".join(problems))
+    if problems != ['ok']:
+        sys.exit(1)
+
+
+def check_rollup(args):
+    # Verifies salary_rollup against the salary table, or rebuilds it from scratch
+    db = PayrollDB(args.db)
+    if args.rebuild:
+        start = time.perf_counter()
+        count = db.rebuild_rollup()
+        print(f"Rebuilt {count} rollup row(s) in {time.perf_counter() - start:.1f}s")
+        return
+
+    differences = db.verify_rollup()
+    for employee_id, period, expected, stored in differences[:20]:
+        print(f"employee {employee_id}, {period_label(period)}: expected {expected}, stored {stored}")
+    if differences:
+        sys.exit(f"{len(differences)} rollup row(s) differ from the salary table; run 'db rollup --rebuild'")
+    print("Rollup matches the salary table")
+
+
+def optimize_database(args):
+    db = PayrollDB(args.db)
+    db.conn.execute("ANALYZE")
+    db.conn.execute("VACUUM")
+    print("Database analyzed and vacuumed")
+
+
+def run_with_stats(args):
+    # Runs another command with the instrumentation on, then prints what it recorded to stderr
+    if not args.command_args:
+        raise ValueError("stats needs a command to run, e.g. 'stats payroll run --start ... --end ...'")
+    command = build_parser().parse_args(['--db', args.db, *args.command_args])
+    if command.handler is run_with_stats:
+        raise ValueError("stats cannot run itself")
+
+    payroll_metrics.enable(args.trace_memory)
+    sampler = None
+    try:
+        with ExitStack() as stack:
+            if args.profile:
+                stack.enter_context(payroll_metrics.profile(args.profile))
+            if args.flamegraph:
+                sampler = stack.enter_context(payroll_metrics.StackSampler(args.sample_interval / 1000))
+            command.handler(command)
+    finally:
+        print(payroll_metrics.metrics.report(args.top), file=sys.stderr)
+        if args.json:
+            payroll_metrics.metrics.write_json(args.json)
+        if sampler is not None:
+            sampler.write(args.flamegraph)
+        for path in (args.profile, args.json, args.flamegraph):
+            if path:
+                print(f"Written {path}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='payroll_cli', description="Grifindo Toys Payroll System")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help=f"database file (default {DEFAULT_DB_PATH})")
+    commands = parser.add_subparsers(dest='command', metavar='command', required=True)
+
+    employees = commands.add_parser('employees', help="employee records")
+    employee_commands = employees.add_subparsers(dest='action', metavar='action', required=True)
+    employee_import = employee_commands.add_parser(
+        'import', help="import employees from a CSV file with the columns " + ", ".join(EMPLOYEE_COLUMNS))
+    employee_import.add_argument('file')
+    employee_import.add_argument('--commit-every', type=positive_int, help="commit after every N rows")
+    employee_import.set_defaults(handler=import_employees)
+    employee_search = employee_commands.add_parser('search', help="find employees by name prefix(es) or ID prefix")
+    employee_search.add_argument('text')
+    employee_search.add_argument('--limit', type=int, default=10)
+    employee_search.set_defaults(handler=search_employees)
+
+    payroll = commands.add_parser('payroll', help="payroll runs")
+    payroll_commands = payroll.add_subparsers(dest='action', metavar='action', required=True)
+    payroll_run = payroll_commands.add_parser('run', help="compute and record a pay period for every employee")
+    payroll_run.add_argument('--start', type=parse_date, required=True, help="salary cycle start date")
+    payroll_run.add_argument('--end', type=parse_date, required=True, help="salary cycle end date")
+    payroll_run.add_argument('--salaried-month', type=parse_date, help="month recorded on the salary rows "
+                                                                       "(default: the month of the end date)")
+    attendance = payroll_run.add_mutually_exclusive_group()
+    attendance.add_argument('--attendance', help="CSV file with the columns employee_id, absent, holidays, "
+                                                 "overtime_hours (employees not listed get zeros)")
+    attendance.add_argument('--timesheets', action='store_true', help="use the imported timesheets of the salary "
+                                                                      "cycle")
+    payroll_run.add_argument('--commit-every', type=positive_int, help="commit after every N rows")
+    payroll_run.add_argument('--workers', type=int, help="compute on N processes, each taking employee ID ranges "
+                                                         "(default: in this process)")
+    payroll_run.add_argument('--resume', action='store_true', help="carry on an interrupted run of the month from "
+                                                                  "its last commit (use with --commit-every)")
+    payroll_run.set_defaults(handler=run_payroll)
+    payroll_runs = payroll_commands.add_parser('runs', help="list the latest payroll runs")
+    payroll_runs.add_argument('--limit', type=int, default=20)
+    payroll_runs.set_defaults(handler=list_payroll_runs)
+    payroll_recompute = payroll_commands.add_parser('recompute', help="recompute the salary entries affected by "
+                                                                      "rate changes and attendance corrections")
+    payroll_recompute.add_argument('--since', type=parse_date, help="for changed rates, recompute the entries from "
+                                                                    "this date on (default: the latest entry)")
+    payroll_recompute.add_argument('--cycle-days', type=int, help="salary cycle days (default: the days of each "
+                                                                  "entry's month)")
+    payroll_recompute.add_argument('--dry-run', action='store_true', help="list the changes without writing them")
+    payroll_recompute.set_defaults(handler=recompute_payroll)
+
+    attendance = commands.add_parser('attendance', help="timesheets and leave")
+    attendance_commands = attendance.add_subparsers(dest='action', metavar='action', required=True)
+    attendance_import = attendance_commands.add_parser(
+        'import', help="import daily timesheet lines from a CSV file with the columns " + ", ".join(TIMESHEET_COLUMNS))
+    attendance_import.add_argument('file')
+    attendance_import.add_argument('--commit-every', type=positive_int, help="commit after every N rows")
+    attendance_import.set_defaults(handler=import_timesheets)
+    attendance_leave = attendance_commands.add_parser('leave', help="leave taken by an employee in a year")
+    attendance_leave.add_argument('employee_id', type=int)
+    attendance_leave.add_argument('--year', type=int, default=date.today().year)
+    attendance_leave.set_defaults(handler=show_leave)
+
+    settings = commands.add_parser('settings', help="payroll settings and tax brackets")
+    settings_commands = settings.add_subparsers(dest='action', metavar='action', required=True)
+    settings_show = settings_commands.add_parser('show', help="show the current settings")
+    settings_show.add_argument('--version', type=int, help="show this version instead")
+    settings_show.set_defaults(handler=show_settings)
+    settings_set = settings_commands.add_parser('set', help="save a new settings version; options not given are "
+                                                            "kept")
+    cycle_days = settings_set.add_mutually_exclusive_group()
+    cycle_days.add_argument('--cycle-days', type=int, help="fixed salary cycle days")
+    cycle_days.add_argument('--month-days', action='store_true', help="use the days of each salary cycle")
+    settings_set.add_argument('--leave-limit', type=int, help="leave days per year")
+    settings_set.add_argument('--bracket', type=parse_bracket, action='append',
+                              help="tax bracket LOWER:RATE, e.g. 0:0.1 (repeat for each bracket; replaces them all)")
+    settings_set.set_defaults(handler=save_settings)
+    settings_commands.add_parser('history', help="list every settings version").set_defaults(
+        handler=settings_history)
+
+    report = commands.add_parser('report', help="generate a report into the Reports folder")
+    report.add_argument('type', choices=list(report_export.REPORT_TYPES))
+    report.add_argument('--employee-id', type=int)
+    report.add_argument('--start', type=parse_date)
+    report.add_argument('--end', type=parse_date)
+    report.add_argument('--format', choices=list(report_export.EXPORTERS), default='xlsx')
+    report.add_argument('--output', default=report_export.REPORTS_FOLDER, help="output folder")
+    report.set_defaults(handler=generate_report)
+
+    serve = commands.add_parser('serve', help="serve the reports as JSON and CSV over a local HTTP API")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--workers', type=int, default=4, help="report queries run at the same time")
+    serve.add_argument('--cache-mb', type=int, default=64, help="memory for cached report results (0: no cache)")
+    serve.set_defaults(handler=serve_reports)
+
+    stats = commands.add_parser('stats', help="run a command with timing of the database calls, SQL statements "
+                                              "and exports, and print them afterwards")
+    stats.add_argument('--top', type=int, default=15, help="methods and statements listed (slowest first)")
+    stats.add_argument('--json', help="also write everything recorded to this JSON file")
+    stats.add_argument('--trace-memory', action='store_true', help="also track the peak of the Python heap "
+                                                                   "(slows the command down)")
+    stats.add_argument('--profile', help="write a cProfile of the command to this file (pstats format)")
+    stats.add_argument('--flamegraph', help="sample the call stacks and write them to this file as collapsed "
+                                            "stacks for flamegraph.pl or speedscope")
+    stats.add_argument('--sample-interval', type=float, default=5, help="milliseconds between stack samples")
+    stats.add_argument('command_args', nargs=argparse.REMAINDER, metavar='command ...',
+                       help="the command to run and its arguments")
+    stats.set_defaults(handler=run_with_stats)
+
+    database = commands.add_parser('db', help="database maintenance")
+    database_commands = database.add_subparsers(dest='action', metavar='action', required=True)
+    database_commands.add_parser('info', help="schema version and row counts").set_defaults(handler=database_info)
+    database_commands.add_parser('migrate', help="apply pending schema migrations").set_defaults(
+        handler=migrate_database)
+    database_commands.add_parser('seed', help="load sample employees and salary history into an empty "
+                                               "database").set_defaults(handler=seed_sample_data)
+    database_generate = database_commands.add_parser('generate', help="add synthetic employees and salary "
+                                                                      "history for load testing")
+    database_generate.add_argument('--employees', type=int, default=1000)
+    database_generate.add_argument('--months', type=int, default=12)
+    database_generate.add_argument('--start', type=parse_date, default=date(2018, 1, 1), help="first month")
+    database_generate.add_argument('--seed', type=int, default=0)
+    database_generate.add_argument('--absence-mean', type=float, help="mean absent days per month")
+    database_generate.add_argument('--overtime-share', type=float, help="share of months with overtime")
+    database_generate.add_argument('--overtime-mean', type=float, help="mean overtime hours in those months")
+    database_generate.set_defaults(handler=generate_data)
+    database_commands.add_parser('check', help="run an integrity check").set_defaults(handler=check_database)
+    database_rollup = database_commands.add_parser('rollup', help="verify the monthly rollup used by the "
+                                                                  "reports against the salary table")
+    database_rollup.add_argument('--rebuild', action='store_true', help="recompute the rollup instead")
+    database_rollup.set_defaults(handler=check_rollup)
+    database_commands.add_parser('optimize', help="refresh planner statistics and vacuum").set_defaults(
+        handler=optimize_database)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except (ValueError, OSError, RuntimeError, sqlite3.Error) as error:
+        sys.exit(f"error: {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1225 @@
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from itertools import islice
+import sqlite3
+import threading
+
+from payroll_cache import LRUCache
+import payroll_metrics
+from payroll_records import Employee, GrossPay, PayrollRun, PayrollSettings, SalaryMonth, record_factory
+
+DEFAULT_DB_PATH = './grifindo_payroll.db'
+
+# Employee rows (and the rates of all employees, see payroll_engine.EmployeeRates) kept in memory by
+# PayrollDB. Writes through PayrollDB invalidate them; the time to live bounds how long a change made
+# by another process can go unnoticed.
+EMPLOYEE_CACHE_SIZE = 10000
+EMPLOYEE_CACHE_TTL = 60.0
+
+# Cache key of the employee rates
+EMPLOYEE_RATES_KEY = ('rates',)
+
+# Seconds a connection waits for another connection's write lock before failing with "database is locked"
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+# Sample employees loaded by seed_database()
+SAMPLE_EMPLOYEES = [
+    ('John Doe', 5000, 15, 1000),
+    ('Jane Smith', 4500, 12, 800),
+    ('Michael Johnson', 6000, 20, 1500),
+    ('Sarah Williams', 5500, 18, 1200),
+    ('Robert Brown', 4000, 10, 600),
+    ('Emily Davis', 4800, 14, 900),
+    ('David Anderson', 5200, 16, 1100),
+    ('Jennifer Wilson', 5100, 16, 1050),
+    ('Daniel Thompson', 4700, 12, 850),
+    ('Olivia Garcia', 5200, 15, 1050),
+    ('Matthew Martinez', 6000, 20, 1500),
+    ('Sophia Clark', 4500, 13, 800),
+    ('James Rodriguez', 4900, 14, 950),
+    ('Lily Lewis', 5100, 17, 1050),
+    ('Benjamin Young', 5300, 17, 1150),
+]
+
+INSERT_EMPLOYEE = "INSERT INTO employees VALUES (NULL, ?, ?, ?, ?)"
+
+UPDATE_EMPLOYEE = \
+    "UPDATE employees SET name = ?, monthly_salary = ?, overtime_rate = ?, allowances = ? WHERE id = ?"
+
+DELETE_EMPLOYEE = "DELETE FROM employees WHERE id = ?"
+
+INSERT_SALARY = '''
+    INSERT INTO salary (employee_id, absent, holidays, overtime_hours, no_pay, base_pay,
+    gross_pay, salaried_month)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Salary entries are unique by employee and month, and the month is stored as its 28th day (see
+# salaried_month_key), so recording a month again updates its entry instead of adding a second one
+UPSERT_SALARY = '''
+    INSERT INTO salary (employee_id, absent, holidays, overtime_hours, no_pay, base_pay,
+    gross_pay, salaried_month)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (employee_id, salaried_month) DO UPDATE SET
+        absent = excluded.absent,
+        holidays = excluded.holidays,
+        overtime_hours = excluded.overtime_hours,
+        no_pay = excluded.no_pay,
+        base_pay = excluded.base_pay,
+        gross_pay = excluded.gross_pay
+'''
+
+INSERT_SALARY_OR_IGNORE = '''
+    INSERT OR IGNORE INTO salary (employee_id, absent, holidays, overtime_hours, no_pay, base_pay,
+    gross_pay, salaried_month)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Day of the month stored in salary.salaried_month: one every month has
+SALARIED_MONTH_DAY = 28
+
+# Payroll settings stored as version 1 (see payroll_settings_tables): the flat 25% tax of the original
+# salary calculation as a single bracket, and the default leave limit of the Settings tab
+DEFAULT_TAX_BRACKETS = ((0, 0.25),)
+DEFAULT_LEAVE_LIMIT = 30
+
+# Payroll run ledger (see payroll_run_ledger)
+START_PAYROLL_RUN = '''
+    INSERT INTO payroll_runs (salaried_month, start_date, end_date, status, employees, settings_version, started_at)
+    VALUES (?, ?, ?, 'running', ?, ?, datetime('now'))
+'''
+
+ADVANCE_PAYROLL_RUN = \
+    "UPDATE payroll_runs SET rows_written = rows_written + ?, last_employee_id = ? WHERE id = ?"
+
+# Integer period key YYYYMM of a 'YYYY-MM-DD' SQL expression (see salary.period and period_key)
+PERIOD_KEY_SQL = "(CAST(substr({0}, 1, 4) AS INTEGER) * 100 + CAST(substr({0}, 6, 2) AS INTEGER))"
+
+# The 'YYYY-MM' label of a period key, as the reports show it
+PERIOD_LABEL_SQL = "printf('%04d-%02d', period / 100, period % 100)"
+
+# The reports read the per-employee, per-month totals of salary_rollup (see salary_rollup_table), so
+# their cost depends on the rows in the requested range only, not on the length of the history.
+# Ranges are given as integer period bounds (see period_bounds), so they are index seeks.
+
+MONTHLY_SALARY_REPORT = f'''
+    SELECT {PERIOD_LABEL_SQL} AS salaried_month, base_pay, no_pay, gross_pay
+    FROM salary_rollup
+    WHERE employee_id = ?
+    ORDER BY period DESC
+'''
+
+OVERALL_SALARY_SUMMARY = f'''
+    SELECT {PERIOD_LABEL_SQL} AS salaried_month, base_pay, no_pay, gross_pay
+    FROM salary_rollup
+    WHERE employee_id = ? AND period BETWEEN ? AND ?
+    ORDER BY period DESC
+'''
+
+GROSS_PAY_REPORT = f'''
+    SELECT employee_id, {PERIOD_LABEL_SQL} AS salaried_month, no_pay, base_pay, gross_pay
+    FROM salary_rollup
+    WHERE period BETWEEN ? AND ?
+    ORDER BY period DESC, employee_id
+'''
+
+# Columns the employee list can be sorted by; ties are broken by id
+EMPLOYEE_SORT_COLUMNS = ('id', 'name', 'monthly_salary', 'overtime_rate', 'allowances')
+
+# Name search: the first matches of the full-text index (in id order) are sorted by name. Bounding the
+# candidates keeps one- and two-letter queries fast; longer queries rarely reach the bound.
+SEARCH_CANDIDATES = 1000
+
+EMPLOYEE_NAME_SEARCH = f'''
+    SELECT * FROM employees
+    WHERE id IN (SELECT rowid FROM employees_fts WHERE employees_fts MATCH ? LIMIT {SEARCH_CANDIDATES})
+    ORDER BY name, id
+    LIMIT ?
+'''
+
+# Totals of the salary table grouped like salary_rollup, used to rebuild and verify it
+SALARY_ROLLUP_SOURCE = '''
+    SELECT employee_id, period, COUNT(*) AS entries,
+    TOTAL(base_pay) AS base_pay, TOTAL(no_pay) AS no_pay, TOTAL(gross_pay) AS gross_pay
+    FROM salary
+    GROUP BY employee_id, period
+'''
+
+# Adds the salary entries with an id above the parameter to salary_rollup (after a bulk load). Rows are
+# folded in one by one in id order, which is cheaper than grouping them first.
+SALARY_ROLLUP_MERGE = '''
+    INSERT INTO salary_rollup (employee_id, period, entries, base_pay, no_pay, gross_pay)
+    SELECT employee_id, period, 1, COALESCE(base_pay, 0), COALESCE(no_pay, 0), COALESCE(gross_pay, 0)
+    FROM salary
+    WHERE id > ?
+    ON CONFLICT (employee_id, period) DO UPDATE SET
+        entries = entries + 1,
+        base_pay = base_pay + excluded.base_pay,
+        no_pay = no_pay + excluded.no_pay,
+        gross_pay = gross_pay + excluded.gross_pay
+'''
+
+
+# Absent days an employee took in the year of a salary month before that month (see leave_ledger): the
+# year's balance less the entries of that month and later in the year, which are usually none or the
+# month itself. Formatted with the SQL expressions of the employee id and the salaried month.
+LEAVE_TAKEN_BEFORE = '''
+    COALESCE((SELECT absent_days FROM leave_balances
+              WHERE year = substr({month}, 1, 4) AND employee_id = {employee}), 0)
+    - (SELECT COALESCE(SUM(later.absent), 0) FROM salary AS later WHERE later.employee_id = {employee}
+       AND later.salaried_month >= {month} AND later.salaried_month <= substr({month}, 1, 4) || '-12-31')
+'''
+
+# The same for every employee with leave taken in the year, ordered by employee id
+LEAVE_TAKEN = '''
+    SELECT employee_id, SUM(days) FROM (
+        SELECT employee_id, absent_days AS days FROM leave_balances WHERE year = substr(:month, 1, 4)
+        UNION ALL
+        SELECT employee_id, -absent FROM salary
+        WHERE period BETWEEN :period AND :period / 100 * 100 + 12)
+    GROUP BY employee_id
+    HAVING SUM(days) != 0
+    ORDER BY employee_id
+'''
+
+# Adds the salary entries with an id above the parameter to leave_balances (after a bulk load)
+LEAVE_BALANCE_MERGE = '''
+    INSERT INTO leave_balances (year, employee_id, absent_days)
+    SELECT substr(salaried_month, 1, 4), employee_id, COALESCE(absent, 0)
+    FROM salary
+    WHERE id > ?
+    ON CONFLICT (year, employee_id) DO UPDATE SET absent_days = absent_days + excluded.absent_days
+'''
+
+# See data_version_counters
+BUMP_SALARY_VERSION = "UPDATE data_versions SET version = version + 1 WHERE name = 'salary'"
+
+# Timesheet lines, one per employee and day; importing a day again replaces it
+UPSERT_TIMESHEET = '''
+    INSERT INTO timesheets (employee_id, work_date, absent, holidays, overtime_hours)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (employee_id, work_date) DO UPDATE SET
+        absent = excluded.absent,
+        holidays = excluded.holidays,
+        overtime_hours = excluded.overtime_hours
+'''
+
+# Attendance totals of a salary cycle from the timesheets, in the column order of payroll_engine.AttendanceTable
+TIMESHEET_TOTALS = '''
+    SELECT employee_id, SUM(absent), SUM(holidays), SUM(overtime_hours)
+    FROM timesheets
+    WHERE work_date BETWEEN ? AND ?
+    GROUP BY employee_id
+    ORDER BY employee_id
+'''
+
+# Salary entries made stale by the logged changes (see payroll_change_log): the entries whose attendance
+# was corrected and the later entries of that year (their leave taken changed with it), and for
+# employees whose rates changed, their entries from :since on, or their latest entry when :since is NULL.
+# Only changes up to :last_change are taken. CROSS JOIN keeps the log as the outer loop, so the cost
+# follows the number of changes rather than the size of the salary table. Each entry comes with its
+# employee's rates and the leave taken before its month.
+CHANGED_SALARY_ENTRIES = f'''
+    WITH changed AS (
+        SELECT DISTINCT salary.id
+        FROM payroll_changes AS logged CROSS JOIN salary ON salary.employee_id = logged.employee_id
+        WHERE logged.id <= :last_change AND (
+            salary.salaried_month >= logged.salaried_month AND
+            salary.salaried_month <= substr(logged.salaried_month, 1, 4) || '-12-31' OR
+            logged.salaried_month IS NULL AND salary.salaried_month >= COALESCE(:since,
+                (SELECT MAX(salaried_month) FROM salary WHERE employee_id = logged.employee_id))))
+    SELECT salary.employee_id, salary.salaried_month, salary.absent, salary.overtime_hours, salary.no_pay,
+           salary.base_pay, salary.gross_pay, employees.monthly_salary, employees.overtime_rate, employees.allowances,
+           {LEAVE_TAKEN_BEFORE.format(employee='salary.employee_id', month='salary.salaried_month')}
+    FROM changed CROSS JOIN salary ON salary.id = changed.id CROSS JOIN employees ON employees.id = salary.employee_id
+    ORDER BY salary.employee_id, salary.salaried_month
+'''
+
+UPDATE_SALARY_PAY = \
+    "UPDATE salary SET no_pay = ?, base_pay = ?, gross_pay = ? WHERE employee_id = ? AND salaried_month = ?"
+
+
+def unique_salary_entries(conn):
+    # Older databases may hold the same employee and month more than once; keep the latest entry
+    conn.execute('''
+        DELETE FROM salary WHERE id NOT IN (
+            SELECT MAX(id) FROM salary GROUP BY employee_id, salaried_month)
+    ''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS salary_employee_month ON salary (employee_id, salaried_month)")
+    conn.execute("CREATE INDEX IF NOT EXISTS salary_month ON salary (salaried_month)")
+
+
+def salary_rollup_table(conn):
+    # Per-employee, per-month totals of the salary table, kept current by triggers on every write
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS salary_rollup (
+            employee_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            entries INT NOT NULL,
+            base_pay REAL NOT NULL,
+            no_pay REAL NOT NULL,
+            gross_pay REAL NOT NULL,
+            PRIMARY KEY (employee_id, period)) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS salary_rollup_period ON salary_rollup (period DESC, employee_id)")
+    salary_rollup_triggers(conn, "substr({row}.salaried_month, 1, 7)")
+
+    conn.execute("DELETE FROM salary_rollup")
+    conn.execute('''
+        INSERT INTO salary_rollup
+        SELECT employee_id, substr(salaried_month, 1, 7), COUNT(*), TOTAL(base_pay), TOTAL(no_pay), TOTAL(gross_pay)
+        FROM salary
+        GROUP BY employee_id, substr(salaried_month, 1, 7)
+    ''')
+
+
+def salary_rollup_triggers(conn, period):
+    # The triggers keeping salary_rollup current; period is the SQL of a salary row's rollup period,
+    # formatted with row=NEW or OLD
+    add_entry = f'''
+        INSERT INTO salary_rollup (employee_id, period, entries, base_pay, no_pay, gross_pay)
+        VALUES (NEW.employee_id, {period.format(row='NEW')}, 1, COALESCE(NEW.base_pay, 0),
+                COALESCE(NEW.no_pay, 0), COALESCE(NEW.gross_pay, 0))
+        ON CONFLICT (employee_id, period) DO UPDATE SET
+            entries = entries + 1,
+            base_pay = base_pay + excluded.base_pay,
+            no_pay = no_pay + excluded.no_pay,
+            gross_pay = gross_pay + excluded.gross_pay;
+    '''
+    remove_entry = f'''
+        UPDATE salary_rollup SET
+            entries = entries - 1,
+            base_pay = base_pay - COALESCE(OLD.base_pay, 0),
+            no_pay = no_pay - COALESCE(OLD.no_pay, 0),
+            gross_pay = gross_pay - COALESCE(OLD.gross_pay, 0)
+        WHERE employee_id = OLD.employee_id AND period = {period.format(row='OLD')};
+        DELETE FROM salary_rollup
+        WHERE employee_id = OLD.employee_id AND period = {period.format(row='OLD')} AND entries = 0;
+    '''
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS salary_rollup_insert AFTER INSERT ON salary BEGIN {add_entry} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS salary_rollup_delete AFTER DELETE ON salary BEGIN {remove_entry} END")
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS salary_rollup_update
+        AFTER UPDATE OF employee_id, salaried_month, base_pay, no_pay, gross_pay ON salary
+        BEGIN {remove_entry} {add_entry} END
+    ''')
+
+
+def employee_sort_indexes(conn):
+    # One index per sortable column, so every sort order of the employee list is read in index order
+    for column in EMPLOYEE_SORT_COLUMNS[1:]:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS employees_{column} ON employees ({column}, id)")
+
+
+def employee_name_search(conn):
+    # Full-text index over employee names for the type-ahead search, kept in sync by triggers.
+    # SQLite builds without FTS5 skip it; search_names() then scans the names instead.
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS employees_fts USING fts5(
+                name, content='employees', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')
+        ''')
+    except sqlite3.OperationalError:
+        return
+
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS employees_fts_insert AFTER INSERT ON employees BEGIN
+            INSERT INTO employees_fts (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS employees_fts_delete AFTER DELETE ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS employees_fts_update AFTER UPDATE OF name ON employees BEGIN
+            INSERT INTO employees_fts (employees_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            INSERT INTO employees_fts (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    ''')
+    conn.execute("INSERT INTO employees_fts (employees_fts) VALUES ('rebuild')")
+
+
+def payroll_change_log(conn):
+    # Log of the writes that make recorded salary entries stale, filled by triggers and consumed by
+    # payroll_engine.recompute_changes: changed rates of an employee (salaried_month is NULL) and
+    # corrected attendance of a salary entry. Name-only edits and pay rewrites are not logged.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_changes (
+            id INTEGER PRIMARY KEY,
+            employee_id INTEGER NOT NULL,
+            salaried_month TEXT)
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS payroll_changes_rates
+        AFTER UPDATE OF monthly_salary, overtime_rate, allowances ON employees
+        WHEN OLD.monthly_salary IS NOT NEW.monthly_salary OR OLD.overtime_rate IS NOT NEW.overtime_rate
+             OR OLD.allowances IS NOT NEW.allowances
+        BEGIN
+            INSERT INTO payroll_changes (employee_id, salaried_month) VALUES (NEW.id, NULL);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS payroll_changes_attendance
+        AFTER UPDATE OF absent, holidays, overtime_hours ON salary
+        WHEN OLD.absent IS NOT NEW.absent OR OLD.holidays IS NOT NEW.holidays
+             OR OLD.overtime_hours IS NOT NEW.overtime_hours
+        BEGIN
+            INSERT INTO payroll_changes (employee_id, salaried_month) VALUES (NEW.employee_id, NEW.salaried_month);
+        END
+    ''')
+
+
+def canonical_salaried_months(conn):
+    # Salary entries recorded from the GUI carry the day they were recorded on; move every entry to the
+    # 28th of its month, keeping the latest entry where an employee has several in a month
+    conn.execute('''
+        DELETE FROM salary WHERE id NOT IN (
+            SELECT MAX(id) FROM salary GROUP BY employee_id, substr(salaried_month, 1, 7))
+    ''')
+    conn.execute(f'''
+        UPDATE salary SET salaried_month = substr(salaried_month, 1, 7) || '-{SALARIED_MONTH_DAY}'
+        WHERE salaried_month IS NOT substr(salaried_month, 1, 7) || '-{SALARIED_MONTH_DAY}'
+    ''')
+
+
+def payroll_run_ledger(conn):
+    # One row per payroll run: its pay period, status ('running', 'completed', 'failed' or 'superseded')
+    # and progress. last_employee_id is the checkpoint: every employee up to it has been written, in
+    # the same transactions as the salary entries, so an interrupted run can resume after it.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_runs (
+            id INTEGER PRIMARY KEY,
+            salaried_month TEXT NOT NULL,
+            start_date TEXT,
+            end_date TEXT,
+            status TEXT NOT NULL,
+            employees INT NOT NULL DEFAULT 0,
+            rows_written INT NOT NULL DEFAULT 0,
+            last_employee_id INTEGER,
+            started_at TEXT,
+            finished_at TEXT)
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS payroll_runs_month ON payroll_runs (salaried_month, id)")
+
+
+def payroll_settings_tables(conn):
+    # Versioned payroll settings: saving adds a version and never changes an old one, so every payroll
+    # run can name the settings it used. cycle_days NULL means the days of the salary cycle. Each
+    # version has its tax brackets: `rate` applies to the taxable pay above `lower_bound`.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payroll_settings (
+            version INTEGER PRIMARY KEY,
+            cycle_days INT,
+            leave_limit INT NOT NULL,
+            created_at TEXT)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tax_brackets (
+            version INTEGER NOT NULL REFERENCES payroll_settings (version),
+            lower_bound REAL NOT NULL,
+            rate REAL NOT NULL,
+            PRIMARY KEY (version, lower_bound)) WITHOUT ROWID
+    ''')
+    conn.execute("ALTER TABLE payroll_runs ADD COLUMN settings_version INTEGER")
+    if conn.execute("SELECT COUNT(*) FROM payroll_settings").fetchone()[0] == 0:
+        conn.execute("INSERT INTO payroll_settings VALUES (1, NULL, ?, datetime('now'))", (DEFAULT_LEAVE_LIMIT,))
+        conn.executemany("INSERT INTO tax_brackets VALUES (1, ?, ?)", DEFAULT_TAX_BRACKETS)
+
+
+def leave_ledger(conn):
+    # The attendance ledger: timesheets holds the attendance imported from timesheet files, one line per
+    # employee and day (see PayrollDB.import_timesheets). leave_balances holds the absent days of every
+    # employee and year as recorded on the salary entries, kept current by triggers, so the leave an
+    # employee has taken this year is a lookup rather than a scan of their salary history.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS timesheets (
+            employee_id INTEGER NOT NULL,
+            work_date TEXT NOT NULL,
+            absent INT NOT NULL DEFAULT 0,
+            holidays INT NOT NULL DEFAULT 0,
+            overtime_hours INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (employee_id, work_date)) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS timesheets_date ON timesheets (work_date)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS leave_balances (
+            year TEXT NOT NULL,
+            employee_id INTEGER NOT NULL,
+            absent_days INT NOT NULL,
+            PRIMARY KEY (year, employee_id)) WITHOUT ROWID
+    ''')
+
+    add_entry = '''
+        INSERT INTO leave_balances (year, employee_id, absent_days)
+        VALUES (substr(NEW.salaried_month, 1, 4), NEW.employee_id, COALESCE(NEW.absent, 0))
+        ON CONFLICT (year, employee_id) DO UPDATE SET absent_days = absent_days + excluded.absent_days;
+    '''
+    remove_entry = '''
+        UPDATE leave_balances SET absent_days = absent_days - COALESCE(OLD.absent, 0)
+        WHERE year = substr(OLD.salaried_month, 1, 4) AND employee_id = OLD.employee_id;
+    '''
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS leave_balances_insert AFTER INSERT ON salary BEGIN {add_entry} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS leave_balances_delete AFTER DELETE ON salary BEGIN {remove_entry} END")
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS leave_balances_update
+        AFTER UPDATE OF employee_id, salaried_month, absent ON salary
+        BEGIN {remove_entry} {add_entry} END
+    ''')
+
+    conn.execute("DELETE FROM leave_balances")
+    conn.execute('''
+        INSERT INTO leave_balances (year, employee_id, absent_days)
+        SELECT substr(salaried_month, 1, 4), employee_id, TOTAL(absent)
+        FROM salary
+        GROUP BY substr(salaried_month, 1, 4), employee_id
+    ''')
+
+
+def integer_period_keys(conn):
+    # salary.period: the month of salaried_month as the integer YYYYMM, a virtual column computed from
+    # it (so no writer has to set it) with an index for month ranges. salary_rollup is rebuilt with
+    # integer periods, so report ranges compare integers instead of month strings.
+    conn.execute(f"ALTER TABLE salary ADD COLUMN period INTEGER "
+                 f"GENERATED ALWAYS AS ({PERIOD_KEY_SQL.format('salaried_month')}) VIRTUAL")
+    conn.execute("DROP INDEX IF EXISTS salary_month")
+    conn.execute("CREATE INDEX IF NOT EXISTS salary_period ON salary (period, employee_id)")
+
+    for trigger in ('salary_rollup_insert', 'salary_rollup_delete', 'salary_rollup_update'):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE salary_rollup")
+    conn.execute('''
+        CREATE TABLE salary_rollup (
+            employee_id INTEGER NOT NULL,
+            period INTEGER NOT NULL,
+            entries INT NOT NULL,
+            base_pay REAL NOT NULL,
+            no_pay REAL NOT NULL,
+            gross_pay REAL NOT NULL,
+            PRIMARY KEY (employee_id, period)) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX salary_rollup_period ON salary_rollup (period DESC, employee_id)")
+    salary_rollup_triggers(conn, "{row}.period")
+    conn.execute(f"INSERT INTO salary_rollup {SALARY_ROLLUP_SOURCE}")
+
+
+def data_version_counters(conn):
+    # A counter per table bumped by every write to it, for caches of data derived from the table (see
+    # payroll_cache.ReportCache). The token is random per database, so counters of two database files
+    # never compare equal.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            token TEXT NOT NULL) WITHOUT ROWID
+    ''')
+    conn.execute("INSERT OR IGNORE INTO data_versions VALUES ('salary', 0, lower(hex(randomblob(8))))")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS salary_version_{event.lower()} AFTER {event} ON salary "
+                     f"BEGIN {BUMP_SALARY_VERSION}; END")
+
+
+# Schema migrations, applied in order. The schema version is stored in PRAGMA user_version,
+# so migration N is applied to databases whose user_version is below N.
+MIGRATIONS = [
+    unique_salary_entries,
+    salary_rollup_table,
+    employee_sort_indexes,
+    employee_name_search,
+    payroll_change_log,
+    canonical_salaried_months,
+    payroll_run_ledger,
+    payroll_settings_tables,
+    leave_ledger,
+    integer_period_keys,
+    data_version_counters,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+class ReportStream:
+    # Column names and lazily fetched rows of a report query. Only the current batch of rows
+    # is held in memory, so a stream can be iterated once.
+
+    def __init__(self, cursor, batch_size=1000):
+        self.columns = [column[0] for column in cursor.description]
+        self.cursor = cursor
+        self.batch_size = batch_size
+        # Fetching the first row up front lets callers check for an empty report
+        self._first = cursor.fetchone()
+
+    def __bool__(self):
+        return self._first is not None
+
+    def __iter__(self):
+        if self._first is None:
+            return
+        first, self._first = self._first, None
+        yield first
+
+        while True:
+            rows = self.cursor.fetchmany(self.batch_size)
+            if not rows:
+                return
+            yield from rows
+
+
+class ConnectionPool:
+    # Connections to one database file. sqlite3 objects must only be used by one thread at a time, so
+    # every thread gets a connection of its own; the connections of finished threads and of finished
+    # tasks (see connection()) are kept for reuse. In WAL journal mode readers keep reading the last
+    # committed data while a payroll run is writing, instead of waiting for it.
+
+    def __init__(self, path, busy_timeout=DEFAULT_BUSY_TIMEOUT, journal_mode='WAL', max_idle=8):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.journal_mode = journal_mode
+        self.max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle = []
+        self._threads = {}  # thread -> its connection
+        self._local = threading.local()
+
+    def _connect(self):
+        # check_same_thread is off because a connection may be handed to another thread once it is idle.
+        # While payroll_metrics is enabled the connection times its statements.
+        factory = payroll_metrics.connection_factory() or sqlite3.Connection
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False, factory=factory)
+        if self.journal_mode:
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def thread_connection(self):
+        # The connection of the calling thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            with self._lock:
+                finished = [thread for thread in self._threads if not thread.is_alive()]
+                finished = [self._threads.pop(thread) for thread in finished]
+            for idle in finished:
+                self.release(idle)
+            conn = self._local.conn = self.acquire()
+            with self._lock:
+                self._threads[threading.current_thread()] = conn
+        return conn
+
+    @contextmanager
+    def connection(self):
+        # A connection of its own for one task, e.g. a report streamed while the thread's own
+        # connection is writing
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._lock:
+            connections = self._idle + list(self._threads.values())
+            self._idle, self._threads = [], {}
+        self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+
+class DatabaseConnection:
+    def __init__(self, db, busy_timeout=DEFAULT_BUSY_TIMEOUT, journal_mode='WAL'):
+        self.pool = ConnectionPool(db, busy_timeout, journal_mode)
+        self._local = threading.local()
+
+        # Create employee table
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            monthly_salary INT,
+            overtime_rate INT,
+            allowances INT)
+        ''')
+
+        # Create salary table
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS salary (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            employee_id INTEGER,
+            absent INT,
+            holidays INT,
+            overtime_hours INT,
+            no_pay INT,
+            base_pay INT,
+            gross_pay INT,
+            salaried_month DATE,
+            FOREIGN KEY (employee_id) REFERENCES employees (id))
+        ''')
+
+        self.conn.commit()
+
+        # Upgrade older database files in place
+        self.migrate()
+
+    @property
+    def conn(self):
+        # Connection of the calling thread, so a PayrollDB can be shared between threads
+        return self.pool.thread_connection()
+
+    @property
+    def cur(self):
+        # Cursor on the calling thread's connection
+        cursor = getattr(self._local, 'cursor', None)
+        conn = self.conn
+        if cursor is None or cursor.connection is not conn:
+            cursor = self._local.cursor = conn.cursor()
+        return cursor
+
+    def connection(self):
+        # Context manager checking out a separate connection for one task
+        return self.pool.connection()
+
+    def schema_version(self):
+        return self.conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        # Applies every pending migration, each one in its own transaction
+        version = self.schema_version()
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            with self.transaction():
+                migration(self.conn)
+                self.conn.execute(f"PRAGMA user_version = {number}")
+        return version, self.schema_version()
+
+    @contextmanager
+    def transaction(self):
+        # Explicit transaction: committed when the block succeeds, rolled back on any error.
+        # Nested use joins the outer transaction.
+        if self.conn.in_transaction:
+            yield self.conn
+            return
+
+        self.conn.execute("BEGIN")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.rollback()
+            raise
+        else:
+            self.conn.commit()
+
+    @contextmanager
+    def bulk_load(self, table):
+        # For insert-only bulk loads: drops the indexes and triggers of a table and recreates them at the
+        # end of the block, in the same transaction. Building an index once from sorted data is much
+        # faster than updating it row by row. Whatever the triggers maintain must be caught up by the caller.
+        with self.transaction():
+            objects = self.conn.execute(
+                "SELECT type, name, sql FROM sqlite_master "
+                "WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL", (table,)).fetchall()
+            for object_type, name, _ in objects:
+                self.conn.execute(f'DROP {object_type.upper()} "{name}"')
+            yield
+            for _, _, sql in objects:
+                self.conn.execute(sql)
+
+    def close(self):
+        self.pool.close()
+
+    def __del__(self):
+        pool = getattr(self, 'pool', None)
+        if pool is not None:
+            pool.close()
+
+
+class PayrollDB(DatabaseConnection):
+    # Commit policy of the bulk writers: commit after every N rows, or once at the end when None.
+    # Can be changed per instance or overridden per call.
+    commit_every = None
+
+    def __init__(self, db, busy_timeout=DEFAULT_BUSY_TIMEOUT, journal_mode='WAL', cache_size=EMPLOYEE_CACHE_SIZE,
+                 cache_ttl=EMPLOYEE_CACHE_TTL):
+        # cache_size=0 turns the employee cache off
+        self.employee_cache = LRUCache(cache_size, cache_ttl) if cache_size else None
+        super().__init__(db, busy_timeout, journal_mode)
+
+    def employees_changed(self, employee_ids=()):
+        # Drops the cached rows of the given employees and the cached rates; call after writing to employees
+        if self.employee_cache is not None:
+            self.employee_cache.invalidate(EMPLOYEE_RATES_KEY,
+                                           *(('employee', int(employee_id)) for employee_id in employee_ids))
+
+    def records(self, record_type, sql, params=()):
+        # The rows of a query as a list of records, converted as they are fetched
+        return list(map(record_factory(record_type), self.conn.execute(sql, params)))
+
+    def fetch(self):
+        return self.records(Employee, "SELECT * FROM employees")
+
+    def insert(self, name, monthly_salary, overtime_rate, allowances):
+        self.cur.execute(INSERT_EMPLOYEE, (name, monthly_salary, overtime_rate, allowances))
+        self.conn.commit()
+        self.employees_changed()
+
+    def update(self, name, monthly_salary, overtime_rate, allowances, employee_id):
+        self.cur.execute(UPDATE_EMPLOYEE, (name, monthly_salary, overtime_rate, allowances, employee_id))
+        self.conn.commit()
+        self.employees_changed([employee_id])
+
+    def delete(self, employee_id):
+        self.cur.execute(DELETE_EMPLOYEE, (employee_id,))
+        self.conn.commit()
+        self.employees_changed([employee_id])
+
+    def count_employees(self):
+        return self.conn.execute("SELECT COUNT(*) FROM employees").fetchone()[0]
+
+    def fetch_page(self, sort='id', descending=False, after=None, before=None, limit=50):
+        # One page of employees in sort order (ties broken by id), by keyset pagination: the page starts
+        # after the `after` key or ends before the `before` key, where a key is (sort value, id), or (id,)
+        # when sorting by id. Rows are returned in display order either way.
+        if sort not in EMPLOYEE_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort employees by {sort!r}")
+
+        key = "id" if sort == 'id' else f"({sort}, id)"
+        forward = before is None
+        bound = after if forward else before
+        # Pages ending before a key are read backwards from it, then flipped into display order
+        ascending = forward != descending
+        direction = "ASC" if ascending else "DESC"
+
+        where, params = "", ()
+        if bound is not None:
+            where = f"WHERE {key} {'>' if ascending else '<'} {'?' if sort == 'id' else '(?, ?)'}"
+            params = tuple(bound)
+
+        order = f"id {direction}" if sort == 'id' else f"{sort} {direction}, id {direction}"
+        rows = self.records(Employee, f"SELECT * FROM employees {where} ORDER BY {order} LIMIT ?",
+                            params + (limit,))
+        if not forward:
+            rows.reverse()
+        return rows
+
+    def employee_key_at(self, position, sort='id', descending=False):
+        # Keyset key of the employee at a position of the sorted list, for jumping to that position.
+        # Only the index is read.
+        if sort not in EMPLOYEE_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort employees by {sort!r}")
+        direction = "DESC" if descending else "ASC"
+        columns, order = ("id", f"id {direction}") if sort == 'id' else \
+            (f"{sort}, id", f"{sort} {direction}, id {direction}")
+        return self.conn.execute(f"SELECT {columns} FROM employees ORDER BY {order} LIMIT 1 OFFSET ?",
+                                 (position,)).fetchone()
+
+    def employee_position(self, row, sort='id', descending=False):
+        # Position of an employee row in the sorted list (the number of rows before it)
+        if sort not in EMPLOYEE_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort employees by {sort!r}")
+        if sort == 'id':
+            where, params = "id", (row[0],)
+        else:
+            where, params = f"({sort}, id)", (row[EMPLOYEE_SORT_COLUMNS.index(sort)], row[0])
+        placeholders = "?" if sort == 'id' else "(?, ?)"
+        return self.conn.execute(f"SELECT COUNT(*) FROM employees WHERE {where} {'>' if descending else '<'} "
+                                 f"{placeholders}", params).fetchone()[0]
+
+    def search(self, employee_id):
+        # Read through the employee cache
+        if self.employee_cache is None:
+            return self.search_uncached(employee_id)
+        try:
+            key = int(employee_id)
+        except (TypeError, ValueError):
+            return self.search_uncached(employee_id)
+        return self.employee_cache.get_or_load(('employee', key), lambda: self.search_uncached(key))
+
+    def search_uncached(self, employee_id):
+        rows = self.records(Employee, "SELECT * FROM employees WHERE id = ?", (employee_id,))
+        return rows[0] if rows else None
+
+    def search_names(self, text, limit=10):
+        # Type-ahead lookup. Digits match the employee IDs starting with them; anything else matches the
+        # names whose words start with the typed words ("jo sm" finds "John Smith"). Returns employee rows.
+        text = text.strip()
+        if not text:
+            return []
+        if text.isdigit():
+            return self.search_id_prefix(text, limit)
+
+        words = text.split()
+        if self.has_name_index():
+            query = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            return self.records(Employee, EMPLOYEE_NAME_SEARCH, (query, limit))
+
+        # Without FTS5: scan the names
+        where = " AND ".join("(' ' || name) LIKE ?" for _ in words)
+        patterns = tuple("% " + word.replace('%', '').replace('_', '') + "%" for word in words)
+        return self.records(Employee, f"SELECT * FROM employees WHERE {where} ORDER BY name, id LIMIT ?",
+                            patterns + (limit,))
+
+    def search_id_prefix(self, prefix, limit=10):
+        # IDs starting with the digits form one range per length (12, 120-129, 1200-1299, ...),
+        # each read from the primary key
+        if prefix.startswith('0'):
+            return []
+        max_id = self.conn.execute("SELECT MAX(id) FROM employees").fetchone()[0] or 0
+        rows = []
+        low = high = int(prefix)
+        while low <= max_id and len(rows) < limit:
+            rows += self.records(Employee, "SELECT * FROM employees WHERE id BETWEEN ? AND ? ORDER BY id LIMIT ?",
+                                 (low, high, limit - len(rows)))
+            low, high = low * 10, high * 10 + 9
+        return rows
+
+    def has_name_index(self):
+        if getattr(self, '_has_name_index', None) is None:
+            self._has_name_index = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'employees_fts'").fetchone() is not None
+        return self._has_name_index
+
+    def record_payroll(self, employee_id, absent, holiday, overtime_hours, no_pay, base_pay, gross_pay, salaried_month):
+        # Any day of the month may be given; recording the month again replaces its entry
+        self.conn.execute(UPSERT_SALARY, (employee_id, absent, holiday, overtime_hours, no_pay, base_pay, gross_pay,
+                                          salaried_month_key(salaried_month)))
+        self.conn.commit()
+
+    def execute_many(self, sql, rows, commit_every=None):
+        # Streams rows (any iterable or generator) through executemany inside explicit transactions.
+        # Returns the number of rows written.
+        if commit_every is None:
+            commit_every = self.commit_every
+        if commit_every is not None and commit_every < 1:
+            raise ValueError(f"Cannot commit every {commit_every} rows, expected 1 or more")
+
+        rows = iter(rows)
+        written = 0
+
+        if commit_every is None:
+            with self.transaction():
+                written = self.conn.executemany(sql, rows).rowcount
+            return written
+
+        while True:
+            chunk = list(islice(rows, commit_every))
+            if not chunk:
+                return written
+            with self.transaction():
+                written += self.conn.executemany(sql, chunk).rowcount
+
+    def insert_many(self, rows, commit_every=None):
+        # rows: (name, monthly_salary, overtime_rate, allowances)
+        try:
+            return self.execute_many(INSERT_EMPLOYEE, rows, commit_every)
+        finally:
+            self.employees_changed()
+
+    def update_many(self, rows, commit_every=None):
+        # rows: (name, monthly_salary, overtime_rate, allowances, employee_id)
+        # The IDs are collected as the rows stream past, to invalidate exactly those employees
+        changed = []
+        rows = (changed.append(row[-1]) or row for row in rows)
+        try:
+            return self.execute_many(UPDATE_EMPLOYEE, rows, commit_every)
+        finally:
+            self.employees_changed(changed)
+
+    def delete_many(self, employee_ids, commit_every=None):
+        changed = []
+        rows = (changed.append(employee_id) or (employee_id,) for employee_id in employee_ids)
+        try:
+            return self.execute_many(DELETE_EMPLOYEE, rows, commit_every)
+        finally:
+            self.employees_changed(changed)
+
+    def record_payroll_many(self, rows, commit_every=None):
+        # rows: (employee_id, absent, holiday, overtime_hours, no_pay, base_pay, gross_pay, salaried_month)
+        # salaried_month must already be a salaried_month_key; existing entries are replaced
+        return self.execute_many(UPSERT_SALARY, rows, commit_every)
+
+    def start_payroll_run(self, salaried_month, start_date, end_date, settings_version=None):
+        # Adds a 'running' run to the ledger and returns its id. Earlier unfinished runs of the month
+        # can no longer be resumed.
+        with self.transaction():
+            self.conn.execute("UPDATE payroll_runs SET status = 'superseded', finished_at = datetime('now') "
+                              "WHERE salaried_month = ? AND status IN ('running', 'failed')", (salaried_month,))
+            return self.conn.execute(START_PAYROLL_RUN, (salaried_month, str(start_date), str(end_date),
+                                                         self.count_employees(), settings_version)).lastrowid
+
+    def unfinished_payroll_run(self, salaried_month):
+        # The latest run of the month that was interrupted or failed, or None
+        runs = self.records(PayrollRun, "SELECT * FROM payroll_runs WHERE salaried_month = ? AND status IN "
+                                        "('running', 'failed') ORDER BY id DESC LIMIT 1", (salaried_month,))
+        return runs[0] if runs else None
+
+    def record_payroll_chunk(self, run_id, rows, last_employee_id):
+        # Writes salary rows of a run and moves its checkpoint to last_employee_id, in one transaction
+        with self.transaction():
+            written = self.conn.executemany(UPSERT_SALARY, rows).rowcount
+            self.conn.execute(ADVANCE_PAYROLL_RUN, (written, last_employee_id, run_id))
+        return written
+
+    def set_payroll_run_status(self, run_id, status):
+        # Any status but 'running' marks the run finished
+        with self.transaction():
+            self.conn.execute("UPDATE payroll_runs SET status = ?, finished_at = CASE ? WHEN 'running' THEN NULL "
+                              "ELSE datetime('now') END WHERE id = ?", (status, status, run_id))
+
+    def payroll_runs(self, limit=20):
+        # The latest runs first
+        return self.records(PayrollRun, "SELECT * FROM payroll_runs ORDER BY id DESC LIMIT ?", (limit,))
+
+    def payroll_settings(self, version=None):
+        # The given version of the payroll settings, or the current (latest) one; None if there is no such
+        # version
+        if version is None:
+            version = self.conn.execute("SELECT MAX(version) FROM payroll_settings").fetchone()[0]
+        settings = self.records(PayrollSettings, "SELECT * FROM payroll_settings WHERE version = ?", (version,))
+        return settings[0] if settings else None
+
+    def tax_brackets(self, version):
+        # (lower_bound, rate) of a settings version, lowest bracket first
+        return self.conn.execute("SELECT lower_bound, rate FROM tax_brackets WHERE version = ? ORDER BY lower_bound",
+                                 (version,)).fetchall()
+
+    def settings_history(self):
+        return self.records(PayrollSettings, "SELECT * FROM payroll_settings ORDER BY version DESC")
+
+    def save_payroll_settings(self, cycle_days, leave_limit, brackets):
+        # Stores a new settings version and returns its number. cycle_days None uses the days of each
+        # salary cycle; brackets are (lower_bound, rate), the first starting at 0.
+        brackets = sorted((float(lower_bound), float(rate)) for lower_bound, rate in brackets)
+        if not brackets or brackets[0][0] != 0:
+            raise ValueError("The first tax bracket must start at 0")
+        if len({lower_bound for lower_bound, _ in brackets}) != len(brackets):
+            raise ValueError("Tax brackets must start at different amounts")
+        if not all(0 <= rate <= 1 for _, rate in brackets):
+            raise ValueError("Tax rates must be between 0 and 1")
+        if cycle_days is not None and int(cycle_days) <= 0:
+            raise ValueError("Salary cycle days must be positive")
+        if int(leave_limit) < 0:
+            raise ValueError("The leave limit cannot be negative")
+
+        with self.transaction():
+            version = self.conn.execute(
+                "INSERT INTO payroll_settings (cycle_days, leave_limit, created_at) VALUES (?, ?, datetime('now'))",
+                (None if cycle_days is None else int(cycle_days), int(leave_limit))).lastrowid
+            self.conn.executemany("INSERT INTO tax_brackets VALUES (?, ?, ?)",
+                                  ((version, lower_bound, rate) for lower_bound, rate in brackets))
+        return version
+
+    def leave_taken(self, salaried_month, employee_id=None):
+        # Absent days taken in the year of salaried_month before that month: for one employee, or as
+        # (employee_id, days) rows of every employee with leave taken, ordered by employee id
+        salaried_month = salaried_month_key(salaried_month)
+        if employee_id is None:
+            return self.conn.execute(LEAVE_TAKEN, {'month': salaried_month,
+                                                   'period': period_key(salaried_month)}).fetchall()
+        return self.conn.execute(f"SELECT {LEAVE_TAKEN_BEFORE.format(employee=':employee', month=':month')}",
+                                 {'employee': employee_id, 'month': salaried_month}).fetchone()[0]
+
+    def import_timesheets(self, rows, commit_every=None):
+        # rows: (employee_id, work_date, absent, holidays, overtime_hours); lines of unknown employees are
+        # refused before anything is written. Returns the number of lines written.
+        known = {row[0] for row in self.conn.execute("SELECT id FROM employees")}
+
+        def checked(rows):
+            for number, (employee_id, work_date, absent, holidays, overtime_hours) in enumerate(rows, start=1):
+                employee_id = int(employee_id)
+                if employee_id not in known:
+                    raise ValueError(f"timesheet line {number}: unknown employee ID {employee_id}")
+                work_date = str(work_date)
+                try:
+                    datetime.strptime(work_date, '%Y-%m-%d')
+                except ValueError:
+                    raise ValueError(f"timesheet line {number}: invalid date {work_date!r}") from None
+                yield employee_id, work_date, int(absent or 0), int(holidays or 0), int(overtime_hours or 0)
+
+        return self.execute_many(UPSERT_TIMESHEET, checked(rows), commit_every)
+
+    def timesheet_totals(self, start_date, end_date):
+        # (employee_id, absent, holidays, overtime_hours) summed over the days from start_date to end_date
+        return self.conn.execute(TIMESHEET_TOTALS, (str(start_date), str(end_date))).fetchall()
+
+    def last_change(self):
+        # Id of the latest logged change, or None when nothing is pending
+        return self.conn.execute("SELECT MAX(id) FROM payroll_changes").fetchone()[0]
+
+    def pending_changes(self):
+        return self.conn.execute("SELECT COUNT(*) FROM payroll_changes").fetchone()[0]
+
+    def changed_salary_entries(self, last_change, since=None):
+        # (employee_id, salaried_month, absent, overtime_hours, no_pay, base_pay, gross_pay, monthly_salary,
+        #  overtime_rate, allowances, leave_taken) of the entries to recompute, see CHANGED_SALARY_ENTRIES
+        return self.conn.execute(CHANGED_SALARY_ENTRIES, {'last_change': last_change, 'since': since}).fetchall()
+
+    def update_salary_pay(self, rows, commit_every=None):
+        # rows: (no_pay, base_pay, gross_pay, employee_id, salaried_month)
+        return self.execute_many(UPDATE_SALARY_PAY, rows, commit_every)
+
+    def clear_changes(self, last_change):
+        self.conn.execute("DELETE FROM payroll_changes WHERE id <= ?", (last_change,))
+
+    # The reports as lists of records (see payroll_records); record._asdict() gives the dict form
+
+    def get_monthly_salary_report(self, employee_id):
+        return self.records(SalaryMonth, MONTHLY_SALARY_REPORT, (employee_id,))
+
+    def get_overall_salary_summary(self, employee_id, start_month, end_month):
+        return self.records(SalaryMonth, OVERALL_SALARY_SUMMARY,
+                            (employee_id, *period_bounds(start_month, end_month)))
+
+    def get_salary_values_for_date_range(self, start_month, end_month):
+        return self.records(GrossPay, GROSS_PAY_REPORT, period_bounds(start_month, end_month))
+
+    @contextmanager
+    def salary_bulk_load(self):
+        # Insert-only bulk load into salary: the indexes and the triggers are suspended while loading,
+        # then salary_rollup and leave_balances are caught up from the new rows in one pass each and the
+        # salary data version is bumped once
+        with self.transaction():
+            last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM salary").fetchone()[0]
+            with self.bulk_load('salary'):
+                yield
+                # Before the indexes come back, so the new rows are read straight from the table
+                self.conn.execute(SALARY_ROLLUP_MERGE, (last_id,))
+                self.conn.execute(LEAVE_BALANCE_MERGE, (last_id,))
+                self.conn.execute(BUMP_SALARY_VERSION)
+
+    def data_version(self, table='salary'):
+        # (token, counter) of the table's writes; any write since gives a different value
+        return tuple(self.conn.execute("SELECT token, version FROM data_versions WHERE name = ?", (table,)).fetchone())
+
+    def rebuild_rollup(self):
+        # Recomputes salary_rollup from the salary table; returns the number of rollup rows
+        with self.transaction():
+            self.conn.execute("DELETE FROM salary_rollup")
+            return self.conn.execute(f"INSERT INTO salary_rollup {SALARY_ROLLUP_SOURCE}").rowcount
+
+    def verify_rollup(self, tolerance=0.005):
+        # Compares salary_rollup with the salary table. Returns the (employee_id, period) pairs that
+        # differ, with the expected and the stored (entries, gross_pay); None means missing.
+        differences = []
+        rows = self.conn.execute(f'''
+            WITH source AS ({SALARY_ROLLUP_SOURCE})
+            SELECT source.employee_id, source.period, source.entries, source.base_pay, source.no_pay,
+                   source.gross_pay, rollup.entries, rollup.base_pay, rollup.no_pay, rollup.gross_pay
+            FROM source LEFT JOIN salary_rollup AS rollup
+            ON rollup.employee_id = source.employee_id AND rollup.period = source.period
+            UNION ALL
+            SELECT rollup.employee_id, rollup.period, NULL, NULL, NULL, NULL,
+                   rollup.entries, rollup.base_pay, rollup.no_pay, rollup.gross_pay
+            FROM salary_rollup AS rollup
+            WHERE NOT EXISTS (SELECT 1 FROM salary WHERE period = rollup.period AND employee_id = rollup.employee_id)
+        ''')
+        for row in rows:
+            expected, stored = row[2:6], row[6:10]
+            if None in expected or None in stored or expected[0] != stored[0] or \
+                    any(abs(a - b) > tolerance for a, b in zip(expected[1:], stored[1:])):
+                differences.append((row[0], row[1],
+                                    None if expected[0] is None else (expected[0], expected[3]),
+                                    None if stored[0] is None else (stored[0], stored[3])))
+        return differences
+
+    # Streaming variants of the reports above: rows are fetched from their own cursor while being consumed
+
+    def stream_monthly_salary_report(self, employee_id):
+        return ReportStream(self.conn.execute(MONTHLY_SALARY_REPORT, (employee_id,)))
+
+    def stream_overall_salary_summary(self, employee_id, start_month, end_month):
+        return ReportStream(self.conn.execute(OVERALL_SALARY_SUMMARY,
+                                              (employee_id, *period_bounds(start_month, end_month))))
+
+    def stream_salary_values_for_date_range(self, start_month, end_month):
+        return ReportStream(self.conn.execute(GROSS_PAY_REPORT, period_bounds(start_month, end_month)))
+
+    def get_column_names(self,):
+        self.cur.execute("PRAGMA table_info(salary)")
+        columns = self.cur.fetchall()
+        return columns
+
+    def generate_salary_entries(self, entry_gen_start_date, entry_gen_end_date):
+        # Random salary entries for every employee and every month from the start date up to (not
+        # including) the end date. Months already recorded for an employee are skipped.
+        from synthetic_data import generate_salary_history
+        import numpy as np
+
+        months = 0
+        current_date = entry_gen_start_date.replace(day=1)
+        while current_date < entry_gen_end_date:
+            months += 1
+            # Move to the next month
+            current_date = (current_date + timedelta(days=32)).replace(day=1)
+
+        return generate_salary_history(self, entry_gen_start_date, months, np.random.default_rng(),
+                                       skip_existing=True)
+
+
+def salaried_month_key(day):
+    # The salaried_month stored for the month of a date, datetime or 'YYYY-MM-DD' string: 'YYYY-MM-28'
+    return f"{str(day)[:7]}-{SALARIED_MONTH_DAY}"
+
+
+def period_key(day):
+    # The integer period key YYYYMM of a date, datetime, 'YYYY-MM[-DD]' string or period key
+    if isinstance(day, int):
+        return day
+    text = str(day)
+    if len(text) < 7 or text[4] != '-' or not (text[:4] + text[5:7]).isdigit():
+        raise ValueError(f"invalid month {text!r}, expected YYYY-MM-DD")
+    return int(text[:4]) * 100 + int(text[5:7])
+
+
+def period_bounds(start, end):
+    # Integer period bounds of the months from start to end, both included: a date range widened to
+    # whole months, ready for `period BETWEEN ? AND ?`
+    return period_key(start), period_key(end)
+
+
+def period_label(period):
+    # 'YYYY-MM' of a period key
+    return f"{period // 100:04d}-{period % 100:02d}"
+
+
+_payroll_db = None
+_payroll_db_lock = threading.Lock()
+
+
+def get_payroll_db(db=DEFAULT_DB_PATH):
+    # The shared database of the application, connected (and migrated) on first use.
+    # The path only matters for the first call. Safe to use from any thread.
+    global _payroll_db
+    if _payroll_db is None:
+        with _payroll_db_lock:
+            if _payroll_db is None:
+                _payroll_db = PayrollDB(db)
+    return _payroll_db
+
+
+def seed_database(payroll_db):
+    # Loads the sample employees and salary entries from 2018-01 to 2023-05 into empty tables.
+    # Returns the number of employees and salary entries added.
+    employees = salary_entries = 0
+
+    payroll_db.cur.execute("SELECT COUNT(*) FROM employees")
+    if payroll_db.cur.fetchone()[0] == 0:
+        employees = payroll_db.insert_many(SAMPLE_EMPLOYEES)
+
+    payroll_db.cur.execute("SELECT COUNT(*) FROM salary")
+    if payroll_db.cur.fetchone()[0] == 0:
+        salary_entries = payroll_db.generate_salary_entries(datetime(2018, 1, 1), datetime(2023, 6, 1))
+
+    return employees, salary_entries
@@ -0,0 +1,420 @@
+import csv
+import multiprocessing
+from contextlib import nullcontext
+from pathlib import Path
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from payroll_database import EMPLOYEE_RATES_KEY, salaried_month_key
+from payroll_records import PayrollChange
+from payroll_rules import PayrollRules
+
+# Flat rate of the original salary calculation, and the single tax bracket of the default settings
+GOVERNMENT_TAX_RATE = 0.25
+
+
+def compute_payroll(monthly_salary, allowances, overtime_rate, absent, overtime_hours, salary_cycle_days,
+                    tax_rate=GOVERNMENT_TAX_RATE):
+    # Works on plain numbers (one employee) as well as on NumPy columns (every employee at once).
+    # tax_rate is a flat rate or a function of the base pay, such as a payroll_rules.TaxSchedule.
+    no_pay = (monthly_salary / salary_cycle_days) * absent
+    base_pay = monthly_salary + allowances + (overtime_rate * overtime_hours)
+    tax = tax_rate(base_pay) if callable(tax_rate) else base_pay * tax_rate
+    gross_pay = base_pay - (no_pay + tax)
+    return no_pay, base_pay, gross_pay
+
+
+def unpaid_absence(absent, leave_taken, leave_limit):
+    # Absent days of a period beyond the yearly leave limit, given the days already taken this year;
+    # works on numbers and NumPy columns alike
+    return np.maximum(leave_taken + absent - leave_limit, 0) - np.maximum(leave_taken - leave_limit, 0)
+
+
+def cycle_days(start_date, end_date):
+    # Number of days in the salary cycle, both ends included (as in SettingsComponent)
+    return (end_date - start_date).days + 1
+
+
+class AttendanceTable:
+    # Absences, holidays and overtime hours of a pay period, stored column by column
+
+    columns = ('employee_id', 'absent', 'holidays', 'overtime_hours')
+
+    def __init__(self, employee_id, absent, holidays, overtime_hours):
+        self.employee_id = np.asarray(employee_id, dtype=np.int64)
+        self.absent = np.asarray(absent, dtype=np.int64)
+        self.holidays = np.asarray(holidays, dtype=np.int64)
+        self.overtime_hours = np.asarray(overtime_hours, dtype=np.int64)
+
+        sizes = {len(self.employee_id), len(self.absent), len(self.holidays), len(self.overtime_hours)}
+        if len(sizes) != 1:
+            raise ValueError("All attendance columns must have the same length")
+
+    @classmethod
+    def from_rows(cls, rows):
+        # rows: iterable of (employee_id, absent, holidays, overtime_hours)
+        data = np.array(list(rows), dtype=np.int64).reshape(-1, len(cls.columns))
+        return cls(*data.T)
+
+    @classmethod
+    def from_timesheets(cls, payroll_db, start_date, end_date):
+        # Totals of the imported timesheet lines from start_date to end_date (see PayrollDB.import_timesheets)
+        return cls.from_rows(payroll_db.timesheet_totals(start_date, end_date))
+
+    @classmethod
+    def from_csv(cls, file_path):
+        # CSV file with a header row naming the attendance columns, in any order
+        with open(file_path, newline='') as file:
+            reader = csv.DictReader(file)
+            missing = set(cls.columns) - set(reader.fieldnames or ())
+            if missing:
+                raise ValueError(f"{file_path}: missing column(s) {', '.join(sorted(missing))}")
+            return cls.from_rows([row[name] for name in cls.columns] for row in reader)
+
+    def __len__(self):
+        return len(self.employee_id)
+
+    def select(self, keep):
+        # The rows where the boolean array `keep` is set
+        return AttendanceTable(self.employee_id[keep], self.absent[keep], self.holidays[keep],
+                               self.overtime_hours[keep])
+
+
+class LeaveTaken:
+    # Leave already taken this year by employees (those not listed have taken none), and the yearly
+    # leave limit that makes further absences unpaid
+
+    def __init__(self, employee_id, days, leave_limit):
+        self.employee_id = np.asarray(employee_id, dtype=np.int64)
+        self.days = np.asarray(days, dtype=np.int64)
+        self.leave_limit = leave_limit
+
+    @classmethod
+    def load(cls, payroll_db, salaried_month, leave_limit):
+        # Read from the leave balances (see PayrollDB.leave_taken)
+        data = np.array(payroll_db.leave_taken(salaried_month), dtype=np.int64).reshape(-1, 2)
+        return cls(data[:, 0], data[:, 1], leave_limit)
+
+    def __len__(self):
+        return len(self.employee_id)
+
+    def select(self, keep):
+        return LeaveTaken(self.employee_id[keep], self.days[keep], self.leave_limit)
+
+    def unpaid(self, employee_id, absent):
+        # Unpaid days of the given absences; employee_id is sorted
+        taken = np.zeros(len(employee_id), dtype=np.int64)
+        index = np.searchsorted(employee_id, self.employee_id)
+        known = index < len(employee_id)
+        known[known] = employee_id[index[known]] == self.employee_id[known]
+        taken[index[known]] = self.days[known]
+        return unpaid_absence(absent, taken, self.leave_limit)
+
+
+class EmployeeRates:
+    # Salary figures of every employee, ordered by employee id
+
+    def __init__(self, employee_id, monthly_salary, overtime_rate, allowances):
+        self.employee_id = employee_id
+        self.monthly_salary = monthly_salary
+        self.overtime_rate = overtime_rate
+        self.allowances = allowances
+
+    @classmethod
+    def load(cls, payroll_db):
+        # Served from the employee cache of the database when it has one. The cached arrays are shared,
+        # so they are made read-only.
+        cache = getattr(payroll_db, 'employee_cache', None)
+        if cache is None:
+            return cls.read(payroll_db)
+        return cache.get_or_load(EMPLOYEE_RATES_KEY, lambda: cls.read(payroll_db).freeze())
+
+    @classmethod
+    def read(cls, payroll_db, first_id=None, last_id=None):
+        return cls.read_connection(payroll_db.conn, first_id, last_id)
+
+    @classmethod
+    def read_connection(cls, conn, first_id=None, last_id=None):
+        # All employees, or those with an id from first_id to last_id
+        if first_id is None:
+            cur = conn.execute("SELECT id, monthly_salary, overtime_rate, allowances FROM employees ORDER BY id")
+        else:
+            cur = conn.execute("SELECT id, monthly_salary, overtime_rate, allowances FROM employees "
+                               "WHERE id BETWEEN ? AND ? ORDER BY id", (first_id, last_id))
+        data = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 4)
+        return cls(data[:, 0].astype(np.int64), data[:, 1], data[:, 2], data[:, 3])
+
+    def freeze(self):
+        for column in (self.employee_id, self.monthly_salary, self.overtime_rate, self.allowances):
+            column.flags.writeable = False
+        return self
+
+    def __len__(self):
+        return len(self.employee_id)
+
+    def select(self, keep):
+        # The employees where the boolean array `keep` is set
+        return EmployeeRates(self.employee_id[keep], self.monthly_salary[keep], self.overtime_rate[keep],
+                             self.allowances[keep])
+
+
+class PayrollResult:
+    # Computed salary columns for one pay period, one entry per employee
+
+    columns = ('employee_id', 'absent', 'holidays', 'overtime_hours', 'no_pay', 'base_pay', 'gross_pay')
+
+    def __init__(self, salaried_month, **columns):
+        self.salaried_month = salaried_month
+        for name in self.columns:
+            setattr(self, name, columns[name])
+
+    def __len__(self):
+        return len(self.employee_id)
+
+    @classmethod
+    def concat(cls, salaried_month, results):
+        return cls(salaried_month, **{name: np.concatenate([getattr(result, name) for result in results])
+                                      if results else np.empty(0) for name in cls.columns})
+
+    def part(self, start, stop):
+        return PayrollResult(self.salaried_month, **{name: getattr(self, name)[start:stop] for name in self.columns})
+
+    def rows(self):
+        # Rows in the column order of the salary table, as plain Python values
+        values = [getattr(self, name).tolist() for name in self.columns]
+        for row in zip(*values):
+            yield row + (self.salaried_month,)
+
+
+def align_attendance(rates, attendance):
+    # Spread the attendance table over all employees; missing employees get zeros
+    absent = np.zeros(len(rates), dtype=np.int64)
+    holidays = np.zeros(len(rates), dtype=np.int64)
+    overtime_hours = np.zeros(len(rates), dtype=np.int64)
+
+    if len(attendance):
+        if len(np.unique(attendance.employee_id)) != len(attendance):
+            raise ValueError("Attendance table lists an employee more than once")
+
+        index = np.searchsorted(rates.employee_id, attendance.employee_id)
+        known = index < len(rates)
+        known[known] = rates.employee_id[index[known]] == attendance.employee_id[known]
+        if not np.all(known):
+            missing = attendance.employee_id[~known][:10].tolist()
+            raise ValueError(f"Attendance given for unknown employee IDs: {missing}")
+
+        absent[index] = attendance.absent
+        holidays[index] = attendance.holidays
+        overtime_hours[index] = attendance.overtime_hours
+
+    return absent, holidays, overtime_hours
+
+
+def compute_period(rates, attendance, salary_cycle_days, salaried_month, tax_rate=GOVERNMENT_TAX_RATE, leave=None):
+    # Without `leave` (a LeaveTaken) every absent day is unpaid
+    absent, holidays, overtime_hours = align_attendance(rates, attendance)
+    unpaid = absent if leave is None else leave.unpaid(rates.employee_id, absent)
+
+    no_pay, base_pay, gross_pay = compute_payroll(rates.monthly_salary, rates.allowances, rates.overtime_rate,
+                                                  unpaid, overtime_hours, salary_cycle_days, tax_rate)
+
+    return PayrollResult(salaried_month, employee_id=rates.employee_id, absent=absent, holidays=holidays,
+                         overtime_hours=overtime_hours, no_pay=no_pay, base_pay=base_pay, gross_pay=gross_pay)
+
+
+def write_period(payroll_db, result, commit_every=None, run_id=None):
+    # A single transaction for the whole pay period unless a commit policy is given. With a run id, every
+    # commit also moves the checkpoint of the run in the ledger.
+    if run_id is None:
+        return payroll_db.record_payroll_many(result.rows(), commit_every)
+
+    if commit_every is None:
+        commit_every = payroll_db.commit_every
+    if commit_every is not None and commit_every < 1:
+        raise ValueError(f"Cannot commit every {commit_every} rows, expected 1 or more")
+    size = max(len(result), 1) if commit_every is None else commit_every
+    written = 0
+    for start in range(0, len(result), size):
+        chunk = result.part(start, start + size)
+        written += payroll_db.record_payroll_chunk(run_id, chunk.rows(), int(chunk.employee_id[-1]))
+    return written
+
+
+def shard_ranges(payroll_db, shards):
+    # Splits the employees into `shards` contiguous id ranges of about the same number of employees
+    count = payroll_db.count_employees()
+    shards = max(min(shards, count), 1)
+    starts = [payroll_db.employee_key_at(count * shard // shards)[0] for shard in range(shards)] if count else []
+    last_id = payroll_db.conn.execute("SELECT MAX(id) FROM employees").fetchone()[0]
+    return [(first, (starts[index + 1] - 1) if index + 1 < len(starts) else last_id)
+            for index, first in enumerate(starts)]
+
+
+def compute_shard(db_path, first_id, last_id, attendance, salary_cycle_days, salaried_month, tax_rate, leave=None):
+    # Runs in a worker process: reads the rates of one id range on a connection of its own, read only
+    # as_uri() escapes the characters that mean something in a URI, such as ? # and %
+    conn = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        rates = EmployeeRates.read_connection(conn, first_id, last_id)
+    finally:
+        conn.close()
+    return compute_period(rates, attendance, salary_cycle_days, salaried_month, tax_rate, leave)
+
+
+def compute_period_parallel(payroll_db, attendance, salary_cycle_days, salaried_month, tax_rate=GOVERNMENT_TAX_RATE,
+                            workers=2, shards_per_worker=4, after_id=None, leave=None):
+    # Computes the pay period on a pool of `workers` processes, one employee id range per task, for the
+    # employees after after_id when given. Yields the shard results in employee id order, whatever order
+    # the workers finish in.
+    ranges = shard_ranges(payroll_db, workers * shards_per_worker)
+    if after_id is not None:
+        ranges = [(max(first_id, after_id + 1), last_id) for first_id, last_id in ranges if last_id > after_id]
+    if not ranges:
+        return
+
+    if len(attendance):
+        if len(np.unique(attendance.employee_id)) != len(attendance):
+            raise ValueError("Attendance table lists an employee more than once")
+        outside = (attendance.employee_id < ranges[0][0]) | (attendance.employee_id > ranges[-1][1])
+        if np.any(outside):
+            missing = attendance.employee_id[outside][:10].tolist()
+            raise ValueError(f"Attendance given for unknown employee IDs: {missing}")
+
+    def shard_attendance(first_id, last_id):
+        return attendance.select((attendance.employee_id >= first_id) & (attendance.employee_id <= last_id))
+
+    def shard_leave(first_id, last_id):
+        if leave is None:
+            return None
+        return leave.select((leave.employee_id >= first_id) & (leave.employee_id <= last_id))
+
+    # Workers are started fresh rather than forked, so they never share the parent's SQLite handles
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(compute_shard, payroll_db.pool.path, first_id, last_id,
+                                   shard_attendance(first_id, last_id), salary_cycle_days, salaried_month, tax_rate,
+                                   shard_leave(first_id, last_id))
+                   for first_id, last_id in ranges]
+        for future in futures:
+            yield future.result()
+
+
+def run_payroll(payroll_db, attendance, start_date, end_date, salaried_month=None, tax_rate=None,
+                commit_every=None, workers=None, resume=False):
+    # Computes and records the pay period for every employee without going through the GUI, as a run in
+    # the payroll_runs ledger. Entries are upserted, so running a month again replaces its entries.
+    # The cycle days, the tax and the leave limit come from the current payroll settings (a resumed run
+    # keeps the settings it started with); tax_rate overrides the tax. Absences beyond the leave limit,
+    # counting the leave taken earlier in the year, are unpaid.
+    # With workers > 1 the computation is spread over that many processes, and this process writes the
+    # shards as they arrive, in employee id order.
+    # With resume, an interrupted or failed run of the month carries on after its checkpoint (the last
+    # committed employee, so a commit policy is what makes a run resumable); otherwise a new run starts.
+    if start_date > end_date:
+        raise ValueError("End date must be greater than start date")
+
+    salaried_month = salaried_month_key(end_date if salaried_month is None else salaried_month)
+
+    run = payroll_db.unfinished_payroll_run(salaried_month) if resume else None
+    if run is None:
+        rules = PayrollRules.load(payroll_db)
+        run_id, after_id = payroll_db.start_payroll_run(salaried_month, start_date, end_date, rules.version), None
+    else:
+        if (run.start_date, run.end_date) != (str(start_date), str(end_date)):
+            raise ValueError(f"The unfinished run {run.id} of {salaried_month} covers {run.start_date} to "
+                             f"{run.end_date}, not {start_date} to {end_date}")
+        rules = PayrollRules.load(payroll_db, run.settings_version)
+        run_id, after_id = run.id, run.last_employee_id
+        payroll_db.set_payroll_run_status(run_id, 'running')
+
+    salary_cycle_days = rules.cycle_days or cycle_days(start_date, end_date)
+    if tax_rate is None:
+        tax_rate = rules.tax
+    leave = LeaveTaken.load(payroll_db, salaried_month, rules.leave_limit)
+    if after_id is not None:
+        # Only the employees the run has not written yet
+        attendance = attendance.select(attendance.employee_id > after_id)
+
+    try:
+        if not workers or workers <= 1:
+            rates = EmployeeRates.load(payroll_db)
+            if after_id is not None:
+                rates = rates.select(rates.employee_id > after_id)
+            result = compute_period(rates, attendance, salary_cycle_days, salaried_month, tax_rate, leave)
+            write_period(payroll_db, result, commit_every, run_id)
+        else:
+            # Without a commit policy the whole period is one transaction, as in the single-process run
+            shards = []
+            with payroll_db.transaction() if commit_every is None else nullcontext():
+                for shard in compute_period_parallel(payroll_db, attendance, salary_cycle_days, salaried_month,
+                                                     tax_rate, workers, after_id=after_id, leave=leave):
+                    write_period(payroll_db, shard, commit_every, run_id)
+                    shards.append(shard)
+            result = PayrollResult.concat(salaried_month, shards)
+    except BaseException:
+        payroll_db.set_payroll_run_status(run_id, 'failed')
+        raise
+    payroll_db.set_payroll_run_status(run_id, 'completed')
+    return result
+
+
+def month_days(salaried_months):
+    # Number of days in the calendar month of each 'YYYY-MM-DD' date
+    months = np.array([month[:7] for month in salaried_months], dtype='datetime64[M]')
+    return ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+
+
+def recompute_changes(payroll_db, since=None, salary_cycle_days=None, tax_rate=None, dry_run=False, tolerance=0.005):
+    # Recomputes the salary entries made stale by the logged changes (see payroll_change_log) instead of
+    # re-running whole pay periods: the entries with corrected attendance, and for employees whose rates
+    # changed, their latest entry or every entry from `since` ('YYYY-MM-DD') on. A corrected attendance
+    # also changes the leave taken before the later entries of that year, so those are recomputed too.
+    # The cycle days, the tax and the leave limit default to the current payroll settings; without
+    # configured cycle days, each entry's cycle is its calendar month.
+    # Only the entries whose pay changes are rewritten; they are returned as PayrollChange records.
+    # The log is cleared in the same transaction, unless dry_run is set (nothing is written then).
+    rules = PayrollRules.load(payroll_db)
+    if salary_cycle_days is None:
+        salary_cycle_days = rules.cycle_days
+    if tax_rate is None:
+        tax_rate = rules.tax
+
+    with payroll_db.transaction():
+        last_change = payroll_db.last_change()
+        if last_change is None:
+            return []
+
+        rows = payroll_db.changed_salary_entries(last_change, since)
+        changes = []
+        if rows:
+            employee_id, salaried_month, *figures = zip(*rows)
+            absent, overtime_hours, old_no_pay, old_base_pay, old_gross_pay, monthly_salary, overtime_rate, \
+                allowances, leave_taken = (np.array(column, dtype=np.float64) for column in figures)
+            # NULL (NaN) inputs count as 0, so a missing figure cannot make the pay NaN
+            absent, overtime_hours, monthly_salary, overtime_rate, allowances, leave_taken = map(
+                np.nan_to_num, (absent, overtime_hours, monthly_salary, overtime_rate, allowances, leave_taken))
+            days = month_days(salaried_month) if salary_cycle_days is None else salary_cycle_days
+            unpaid = unpaid_absence(absent, leave_taken, rules.leave_limit)
+
+            no_pay, base_pay, gross_pay = compute_payroll(monthly_salary, allowances, overtime_rate, unpaid,
+                                                          overtime_hours, days, tax_rate)
+            invalid = ~(np.isfinite(no_pay) & np.isfinite(base_pay) & np.isfinite(gross_pay))
+            if invalid.any():
+                index = np.flatnonzero(invalid)[0]
+                raise ValueError(f"Cannot recompute the salary of employee {employee_id[index]} for "
+                                 f"{salaried_month[index]}: the pay is not a finite number")
+
+            # NULL (NaN) figures in the old entry count as changed
+            changed = ~(np.isclose(no_pay, old_no_pay, rtol=0, atol=tolerance) &
+                        np.isclose(base_pay, old_base_pay, rtol=0, atol=tolerance) &
+                        np.isclose(gross_pay, old_gross_pay, rtol=0, atol=tolerance))
+            changes = [PayrollChange(employee_id[i], salaried_month[i], no_pay[i].item(), base_pay[i].item(),
+                                     gross_pay[i].item(), old_gross_pay[i].item()) for i in np.flatnonzero(changed)]
+
+        if not dry_run:
+            payroll_db.update_salary_pay((change.no_pay, change.base_pay, change.gross_pay, change.employee_id,
+                                          change.salaried_month) for change in changes)
+            payroll_db.clear_changes(last_change)
+    return changes
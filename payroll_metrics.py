@@ -0,0 +1,373 @@
+"""Opt-in instrumentation of the database layer and the report exports.
+
+enable() wraps the public PayrollDB methods with timers feeding latency histograms, and connections
+opened afterwards time every SQL statement and count the rows it returned or changed. Exports record
+their bytes per second, and the report includes the memory high-water mark of the process (and of the
+Python heap with trace_memory). Until enable() is called nothing is wrapped, so the only cost left on
+the hot paths is a check of the `enabled` flag.
+
+    python payroll_cli.py stats --profile run.prof payroll run --start 2024-01-01 --end 2024-01-31
+"""
+
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import FunctionType
+
+enabled = False
+
+# Histogram buckets: bucket i counts durations below 2**i microseconds
+HISTOGRAM_BUCKETS = 32
+
+# SQL text shown per statement in the report
+SQL_WIDTH = 90
+
+
+class Histogram:
+    # Durations in power-of-two buckets of microseconds; percentiles are bucket upper bounds
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, share):
+        rank = share * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** bucket / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class Metrics:
+    # What the instrumented code records; thread-safe
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.methods = {}     # 'PayrollDB.search' -> Histogram
+            self.statements = {}  # normalized SQL -> [Histogram of execute(), rows, seconds fetching]
+            self.exports = {}     # export format -> [files, rows, bytes, seconds]
+            self._sql_keys = {}   # SQL as executed -> normalized SQL
+
+    def add_call(self, name, seconds):
+        with self._lock:
+            histogram = self.methods.get(name)
+            if histogram is None:
+                histogram = self.methods[name] = Histogram()
+            histogram.add(seconds)
+
+    def add_statement(self, sql, seconds, rows):
+        with self._lock:
+            key = self._sql_keys.get(sql)
+            if key is None:
+                key = self._sql_keys[sql] = ' '.join(sql.split())
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = [Histogram(), 0, 0.0]
+            entry[0].add(seconds)
+            entry[1] += rows
+
+    def add_rows(self, sql, seconds, rows):
+        # Rows fetched after the statement ran, and the time spent fetching them
+        with self._lock:
+            entry = self.statements.get(self._sql_keys.get(sql))
+            if entry is not None:
+                entry[1] += rows
+                entry[2] += seconds
+
+    def add_export(self, export_format, rows, size, seconds):
+        with self._lock:
+            entry = self.exports.setdefault(export_format, [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += rows
+            entry[2] += size
+            entry[3] += seconds
+
+    def snapshot(self):
+        # Everything recorded so far, as JSON-serializable data
+        with self._lock:
+            return {
+                'methods': {name: histogram.summary() for name, histogram in self.methods.items()},
+                'sql': [dict(histogram.summary(), sql=sql, rows=rows, fetch_ms=fetch * 1000,
+                             total_ms=(histogram.total + fetch) * 1000)
+                        for sql, (histogram, rows, fetch) in self.statements.items()],
+                'exports': {export_format: {'files': files, 'rows': rows, 'bytes': size, 'seconds': seconds,
+                                            'bytes_per_second': size / seconds if seconds else 0.0}
+                            for export_format, (files, rows, size, seconds) in self.exports.items()},
+                'memory': memory_high_water(),
+            }
+
+    def report(self, top=15):
+        # The snapshot as text: the slowest methods and statements by total time
+        snapshot = self.snapshot()
+        lines = [f"{'method':<40} {'calls':>8} {'total ms':>10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} "
+                 f"{'max ms':>9}"]
+        methods = sorted(snapshot['methods'].items(), key=lambda item: -item[1]['total_ms'])
+        for name, stats in methods[:top]:
+            lines.append(f"{name:<40} {stats['count']:>8,} {stats['total_ms']:>10.1f} {stats['mean_ms']:>9.3f} "
+                         f"{stats['p50_ms']:>9.3f} {stats['p99_ms']:>9.3f} {stats['max_ms']:>9.3f}")
+
+        lines.append('')
+        # Execution and fetching are timed apart: a SELECT's execute() only steps to its first row
+        lines.append(f"{'sql':<{SQL_WIDTH}} {'calls':>8} {'rows':>10} {'total ms':>10} {'fetch ms':>9} "
+                     f"{'p99 ms':>9} {'max ms':>9}")
+        for stats in sorted(snapshot['sql'], key=lambda stats: -stats['total_ms'])[:top]:
+            sql = stats['sql'] if len(stats['sql']) <= SQL_WIDTH else stats['sql'][:SQL_WIDTH - 3] + '...'
+            lines.append(f"{sql:<{SQL_WIDTH}} {stats['count']:>8,} {stats['rows']:>10,} {stats['total_ms']:>10.1f} "
+                         f"{stats['fetch_ms']:>9.1f} {stats['p99_ms']:>9.3f} {stats['max_ms']:>9.3f}")
+
+        if snapshot['exports']:
+            lines.append('')
+            lines.append(f"{'export':<10} {'files':>6} {'rows':>10} {'MB':>9} {'seconds':>9} {'MB/s':>8}")
+            for export_format, stats in snapshot['exports'].items():
+                lines.append(f"{export_format:<10} {stats['files']:>6,} {stats['rows']:>10,} "
+                             f"{stats['bytes'] / 1e6:>9.2f} {stats['seconds']:>9.2f} "
+                             f"{stats['bytes_per_second'] / 1e6:>8.2f}")
+
+        memory = snapshot['memory']
+        lines.append('')
+        lines.append("memory high-water: process " + megabytes(memory['peak_rss_bytes']) + ", Python heap "
+                     + megabytes(memory['python_heap_peak_bytes'], "not traced"))
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        import json
+
+        with open(path, 'w') as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+
+metrics = Metrics()
+
+
+def megabytes(size, missing="n/a"):
+    return missing if size is None else f"{size / 2**20:,.1f} MB"
+
+
+def memory_high_water():
+    # Peak resident memory of the process, and the peak of the Python heap while tracemalloc traces it
+    # (None when not available)
+    peak_rss = None
+    try:
+        import resource
+    except ImportError:
+        pass
+    else:
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        peak_rss = peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+    traced_peak = None
+    if 'tracemalloc' in sys.modules and sys.modules['tracemalloc'].is_tracing():
+        traced_peak = sys.modules['tracemalloc'].get_traced_memory()[1]
+    return {'peak_rss_bytes': peak_rss, 'python_heap_peak_bytes': traced_peak}
+
+
+# SQL timing. The connection pool opens TracedConnections while instrumentation is enabled.
+
+def _traced_classes():
+    import sqlite3
+
+    class TracedCursor(sqlite3.Cursor):
+        # Times execute() and the fetches after it, and counts the rows changed or returned
+        _sql = None
+
+        def execute(self, sql, parameters=()):
+            start = time.perf_counter()
+            try:
+                return super().execute(sql, parameters)
+            finally:
+                self._sql = sql
+                metrics.add_statement(sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+        def executemany(self, sql, seq_of_parameters):
+            start = time.perf_counter()
+            try:
+                return super().executemany(sql, seq_of_parameters)
+            finally:
+                self._sql = None
+                metrics.add_statement(sql, time.perf_counter() - start, max(self.rowcount, 0))
+
+        def fetchone(self):
+            start = time.perf_counter()
+            row = super().fetchone()
+            metrics.add_rows(self._sql, time.perf_counter() - start, row is not None)
+            return row
+
+        def fetchmany(self, size=None):
+            start = time.perf_counter()
+            rows = super().fetchmany(self.arraysize if size is None else size)
+            metrics.add_rows(self._sql, time.perf_counter() - start, len(rows))
+            return rows
+
+        def fetchall(self):
+            start = time.perf_counter()
+            rows = super().fetchall()
+            metrics.add_rows(self._sql, time.perf_counter() - start, len(rows))
+            return rows
+
+        def __next__(self):
+            start = time.perf_counter()
+            row = super().__next__()
+            metrics.add_rows(self._sql, time.perf_counter() - start, 1)
+            return row
+
+    class TracedConnection(sqlite3.Connection):
+
+        def cursor(self, factory=TracedCursor):
+            return super().cursor(factory)
+
+        def execute(self, sql, parameters=()):
+            return self.cursor().execute(sql, parameters)
+
+        def executemany(self, sql, seq_of_parameters):
+            return self.cursor().executemany(sql, seq_of_parameters)
+
+    return TracedConnection
+
+
+_connection_factory = None
+
+
+def connection_factory():
+    # The sqlite3.connect factory for new connections: TracedConnection while enabled, else None
+    return _connection_factory if enabled else None
+
+
+# Method timing
+
+_originals = {}
+
+
+def _timed(name, function):
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            metrics.add_call(name, time.perf_counter() - start)
+
+    timed.__name__ = function.__name__
+    timed.__doc__ = function.__doc__
+    timed.__wrapped__ = function
+    return timed
+
+
+def instrument(cls):
+    # Wraps the public methods of cls and of its bases with timers. Context managers (their methods
+    # carry __wrapped__) are left alone, as timing them would only time the creation of the manager.
+    for klass in cls.__mro__[:-1]:
+        for name, function in list(vars(klass).items()):
+            if name.startswith('_') or not isinstance(function, FunctionType) or hasattr(function, '__wrapped__'):
+                continue
+            _originals.setdefault(klass, {})[name] = function
+            setattr(klass, name, _timed(f"{cls.__name__}.{name}", function))
+
+
+def uninstrument():
+    for klass, functions in _originals.items():
+        for name, function in functions.items():
+            setattr(klass, name, function)
+    _originals.clear()
+
+
+def enable(trace_memory=False):
+    # Starts recording: PayrollDB methods are timed, and connections opened from now on time their SQL.
+    # trace_memory also follows the Python heap with tracemalloc, which slows everything down.
+    global enabled, _connection_factory
+    if enabled:
+        return
+    from payroll_database import PayrollDB
+
+    _connection_factory = _traced_classes()
+    instrument(PayrollDB)
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+    uninstrument()
+    if 'tracemalloc' in sys.modules:
+        sys.modules['tracemalloc'].stop()
+
+
+@contextmanager
+def profile(path):
+    # cProfile of the block, dumped to path in pstats format (python -m pstats, snakeviz,
+    # flameprof or gprof2dot turn it into a call graph or a flame graph)
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+class StackSampler:
+    # Samples the stack of one thread at a fixed interval and writes the counts as collapsed stacks
+    # ("outer;inner;innermost count" per line), the input of flamegraph.pl and speedscope. Unlike
+    # cProfile it keeps whole call stacks and barely slows the sampled thread down.
+
+    def __init__(self, interval=0.005, thread=None):
+        self.interval = interval
+        self.thread_id = (thread or threading.current_thread()).ident
+        self.counts = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def __enter__(self):
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._sampler.join()
+
+    def write(self, path):
+        with open(path, 'w') as file:
+            for stack, count in sorted(self.counts.items()):
+                file.write(f"{stack} {count}\n")
@@ -0,0 +1,30 @@
+"""Record types returned by the database layer and the payroll engine.
+
+They are named tuples: no per-instance __dict__ (the same saving as __slots__), the memory of a plain
+tuple, and the exporters take them as they are. Fields can be read by name (row.gross_pay) or by
+position, and row._asdict() gives the dict form the reports used to return.
+"""
+
+from collections import namedtuple
+from functools import partial
+
+Employee = namedtuple('Employee', 'id name monthly_salary overtime_rate allowances')
+
+# Row of the monthly salary report and the overall salary summary
+SalaryMonth = namedtuple('SalaryMonth', 'salaried_month base_pay no_pay gross_pay')
+
+# Row of the gross pay report
+GrossPay = namedtuple('GrossPay', 'employee_id salaried_month no_pay base_pay gross_pay')
+
+# Salary entry rewritten by an incremental recompute, with its gross pay before
+PayrollChange = namedtuple('PayrollChange', 'employee_id salaried_month no_pay base_pay gross_pay old_gross_pay')
+
+PayrollRun = namedtuple('PayrollRun', 'id salaried_month start_date end_date status employees rows_written '
+                                      'last_employee_id started_at finished_at settings_version')
+
+PayrollSettings = namedtuple('PayrollSettings', 'version cycle_days leave_limit created_at')
+
+
+def record_factory(record_type):
+    # Turns a row tuple into a record without a Python-level call per row
+    return partial(tuple.__new__, record_type)
@@ -0,0 +1,52 @@
+"""Payroll rules: the persisted payroll settings and tax brackets, compiled once per run.
+
+A TaxSchedule turns the brackets into a lookup table, so the tax of every employee is found with one
+binary search over the bracket bounds instead of Python branching per employee. It is passed as the
+tax_rate of payroll_engine.compute_payroll.
+"""
+
+import numpy as np
+
+from payroll_database import DEFAULT_LEAVE_LIMIT, DEFAULT_TAX_BRACKETS
+
+
+class TaxSchedule:
+    # Progressive tax over brackets of (lower_bound, rate): the rate of a bracket applies to the part of
+    # the taxable pay above its lower bound and below the next one. Called with a number or a NumPy
+    # array; picklable, so it can be sent to the payroll worker processes.
+
+    def __init__(self, brackets=DEFAULT_TAX_BRACKETS):
+        brackets = sorted(brackets)
+        self.lower_bounds = np.array([lower_bound for lower_bound, _ in brackets], dtype=np.float64)
+        self.rates = np.array([rate for _, rate in brackets], dtype=np.float64)
+        # Tax owed on the pay below each lower bound
+        self.base_tax = np.concatenate(([0.0], np.cumsum(np.diff(self.lower_bounds) * self.rates[:-1])))
+        self.flat_rate = self.rates[0].item() if len(brackets) == 1 and self.lower_bounds[0] == 0 else None
+
+    def __call__(self, taxable):
+        if self.flat_rate is not None:
+            return taxable * self.flat_rate
+        bracket = np.maximum(np.searchsorted(self.lower_bounds, taxable, side='right') - 1, 0)
+        return self.base_tax[bracket] + (taxable - self.lower_bounds[bracket]) * self.rates[bracket]
+
+    def brackets(self):
+        return list(zip(self.lower_bounds.tolist(), self.rates.tolist()))
+
+
+class PayrollRules:
+    # One version of the payroll settings, with its tax brackets compiled
+
+    def __init__(self, version=None, cycle_days=None, leave_limit=DEFAULT_LEAVE_LIMIT, brackets=DEFAULT_TAX_BRACKETS):
+        self.version = version
+        self.cycle_days = cycle_days
+        self.leave_limit = leave_limit
+        self.tax = TaxSchedule(brackets)
+
+    @classmethod
+    def load(cls, payroll_db, version=None):
+        # The current settings, or the given version
+        settings = payroll_db.payroll_settings(version)
+        if settings is None:
+            raise ValueError(f"No payroll settings version {version}")
+        return cls(settings.version, settings.cycle_days, settings.leave_limit,
+                   payroll_db.tax_brackets(settings.version))
@@ -0,0 +1,306 @@
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+
+import payroll_metrics
+
+REPORTS_FOLDER = "Reports"
+
+# Rows per worksheet in Excel, header row included
+EXCEL_MAX_ROWS = 1048576
+
+# Rows per Parquet row group
+PARQUET_BATCH_ROWS = 65536
+
+# Rows exported between two progress callbacks
+PROGRESS_ROWS = 10000
+
+# Whole-number columns kept as integers in columnar files; other numbers are stored as doubles
+# because the salary figures mix integers and fractions
+INTEGER_COLUMNS = ('employee_id',)
+
+# Reports with more rows than this are never cached, but streamed
+CACHE_MAX_ROWS = 20000
+
+# Memory for the report results cached by the application (GUI and CLI), and the folder they are
+# spilled to when evicted or saved
+REPORT_CACHE_BYTES = 128 * 2**20
+REPORT_CACHE_FOLDER = os.path.join(REPORTS_FOLDER, '.cache')
+
+# Report types, as named on the command line
+REPORT_TYPES = {
+    'monthly': "Monthly Salary Report",
+    'summary': "Overall Salary Summary",
+    'gross': "Gross Pay Report",
+}
+
+
+def report_query(report_type, employee_id=None, start_date=None, end_date=None):
+    # The SQL and parameters of a report, with the date range as integer period bounds. Raises
+    # ValueError when a parameter the report needs is missing or invalid.
+    from payroll_database import GROSS_PAY_REPORT, MONTHLY_SALARY_REPORT, OVERALL_SALARY_SUMMARY, period_bounds
+
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type {report_type!r}, expected one of {', '.join(REPORT_TYPES)}")
+    name = REPORT_TYPES[report_type]
+    if report_type in ('monthly', 'summary') and employee_id is None:
+        raise ValueError(f"the {name} needs an employee ID")
+    if report_type in ('summary', 'gross') and (start_date is None or end_date is None):
+        raise ValueError(f"the {name} needs a start and an end date")
+    employee_id = None if employee_id is None else int(employee_id)
+
+    if report_type == 'monthly':
+        return MONTHLY_SALARY_REPORT, (employee_id,)
+    if report_type == 'summary':
+        return OVERALL_SALARY_SUMMARY, (employee_id, *period_bounds(start_date, end_date))
+    return GROSS_PAY_REPORT, period_bounds(start_date, end_date)
+
+
+def cached_report(cache, payroll_db, report_type, employee_id=None, start_date=None, end_date=None,
+                  max_rows=CACHE_MAX_ROWS):
+    # The report as a CachedReport from a payroll_cache.ReportCache, queried only when the cache has
+    # nothing for these parameters at the current salary data version. None when it has more than
+    # max_rows rows: such reports are streamed instead.
+    sql, params = report_query(report_type, employee_id, start_date, end_date)
+    return cached_query(cache, payroll_db, report_type, sql, params, max_rows)
+
+
+def cached_query(cache, payroll_db, report_type, sql, params, max_rows=CACHE_MAX_ROWS):
+    # cached_report for the SQL and parameters from report_query. At most max_rows + 1 rows are read
+    # before giving up on a large result.
+    from payroll_cache import CachedReport
+
+    def load():
+        cursor = payroll_db.conn.execute(sql, params)
+        rows = cursor.fetchmany(max_rows + 1)
+        if len(rows) > max_rows:
+            return None
+        return CachedReport([column[0] for column in cursor.description], rows)
+
+    return cache.get_or_load((report_type, params), payroll_db.data_version(), load)
+
+
+_report_cache = None
+_report_cache_lock = threading.Lock()
+
+
+def get_report_cache():
+    # The report cache of the application, created on first use. Safe to use from any thread.
+    global _report_cache
+    if _report_cache is None:
+        from payroll_cache import ReportCache
+
+        with _report_cache_lock:
+            if _report_cache is None:
+                _report_cache = ReportCache(REPORT_CACHE_BYTES, REPORT_CACHE_FOLDER)
+    return _report_cache
+
+
+def open_report(payroll_db, report_type, employee_id=None, start_date=None, end_date=None, cache=None):
+    # Returns the report stream and its file name (without extension). With a cache, a report of up to
+    # CACHE_MAX_ROWS rows comes as a CachedReport; larger ones are streamed all the same.
+    name = report_name(report_type, employee_id, start_date, end_date)
+    if cache is not None:
+        report = cached_report(cache, payroll_db, report_type, employee_id, start_date, end_date)
+        if report is not None:
+            return report, name
+
+    if report_type == 'monthly':
+        return payroll_db.stream_monthly_salary_report(employee_id), name
+
+    if report_type == 'summary':
+        return payroll_db.stream_overall_salary_summary(employee_id, start_date, end_date), name
+
+    if report_type == 'gross':
+        return payroll_db.stream_salary_values_for_date_range(start_date, end_date), name
+
+    raise ValueError(f"Unknown report type {report_type!r}, expected one of {', '.join(REPORT_TYPES)}")
+
+
+def report_name(report_type, employee_id=None, start_date=None, end_date=None):
+    # File name of a report, without extension
+    if report_type == 'monthly':
+        return f"emp_id_{employee_id}_monthly_salary_report"
+    if report_type == 'summary':
+        return f"emp_id_{employee_id}_overall_salary_summary_{start_date}_to_{end_date}"
+    return f"gross_pay_report_{start_date}_to_{end_date}"
+
+
+def report_path(filename, folder_path=REPORTS_FOLDER):
+    # Create the "Reports" folder if it doesn't exist
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+    return os.path.join(folder_path, filename)
+
+
+def export_xlsx(report, file_path, max_rows=EXCEL_MAX_ROWS):
+    # Streams a report (column names + iterable of rows) into a write-only workbook, so memory use
+    # does not grow with the number of rows. Rows past the Excel limit continue on a new sheet.
+    # Returns the number of data rows written.
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = max_rows
+    written = 0
+
+    for row in report:
+        if sheet_rows >= max_rows:
+            sheet = workbook.create_sheet()
+            sheet.append(report.columns)
+            sheet_rows = 1
+        sheet.append(row)
+        sheet_rows += 1
+        written += 1
+
+    if sheet is None:
+        workbook.create_sheet().append(report.columns)
+
+    workbook.save(file_path)
+    return written
+
+
+def export_csv(report, file_path):
+    written = 0
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(report.columns)
+        for row in report:
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def export_jsonl_gz(report, file_path):
+    # One JSON object per line, gzip compressed
+    written = 0
+    columns = report.columns
+    with gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=6) as file:
+        for row in report:
+            file.write(json.dumps(dict(zip(columns, row))))
+            file.write('\n')
+            written += 1
+    return written
+
+
+def parquet_schema(columns, batch):
+    import pyarrow as pa
+
+    fields = []
+    for index, name in enumerate(columns):
+        column_type = pa.array([row[index] for row in batch]).type
+        if pa.types.is_integer(column_type) and name not in INTEGER_COLUMNS:
+            column_type = pa.float64()
+        elif pa.types.is_null(column_type):
+            column_type = pa.float64()
+        fields.append(pa.field(name, column_type))
+    return pa.schema(fields)
+
+
+def export_parquet(report, file_path, batch_rows=PARQUET_BATCH_ROWS):
+    # Columnar binary output; rows are converted to columns one row group at a time
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("The Parquet export needs the pyarrow library (pip install pyarrow)") from None
+
+    written = 0
+    writer = None
+    rows = iter(report)
+    try:
+        while True:
+            batch = [row for _, row in zip(range(batch_rows), rows)]
+            if not batch:
+                break
+            if writer is None:
+                schema = parquet_schema(report.columns, batch)
+                writer = pq.ParquetWriter(file_path, schema, compression='snappy')
+            arrays = [pa.array([row[index] for row in batch], type=field.type)
+                      for index, field in enumerate(schema)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            written += len(batch)
+
+        if writer is None:
+            schema = pa.schema([pa.field(name, pa.float64()) for name in report.columns])
+            writer = pq.ParquetWriter(file_path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+# Export formats: name -> (file extension, export function)
+EXPORTERS = {
+    'xlsx': ('.xlsx', export_xlsx),
+    'csv': ('.csv', export_csv),
+    'jsonl.gz': ('.jsonl.gz', export_jsonl_gz),
+    'parquet': ('.parquet', export_parquet),
+}
+
+
+class ProgressStream:
+    # Passes a report through to an exporter, calling progress(rows so far) every `every` rows.
+    # An exception raised by the callback (e.g. a cancelled task) aborts the export.
+
+    def __init__(self, report, progress, every=PROGRESS_ROWS):
+        self.columns = report.columns
+        self.report = report
+        self.progress = progress
+        self.every = every
+
+    def __bool__(self):
+        return bool(self.report)
+
+    def __iter__(self):
+        count = 0
+        for row in self.report:
+            yield row
+            count += 1
+            if count % self.every == 0:
+                self.progress(count)
+        self.progress(count)
+
+
+def export_report(report, name, export_format='xlsx', folder_path=REPORTS_FOLDER, progress=None):
+    # Writes the report to the "Reports" folder as <name><extension>; returns (file path, rows written).
+    # progress, if given, is called with the number of rows written so far. A partly written file is
+    # removed when the export fails or is cancelled.
+    if export_format not in EXPORTERS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {', '.join(EXPORTERS)}")
+
+    extension, exporter = EXPORTERS[export_format]
+    file_path = report_path(name + extension, folder_path)
+    # A cached report already written to this file, which is unchanged since, is not written again
+    exports = getattr(report, 'exports', None)
+    if exports is not None and file_path in exports and exports[file_path][0] == file_signature(file_path):
+        return file_path, exports[file_path][1]
+
+    if progress is not None:
+        report = ProgressStream(report, progress)
+    start = time.perf_counter()
+    try:
+        written = exporter(report, file_path)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    if payroll_metrics.enabled:
+        # Streamed reports are queried while they are written, so this includes the query
+        payroll_metrics.metrics.add_export(export_format, written, os.path.getsize(file_path),
+                                           time.perf_counter() - start)
+    if exports is not None:
+        exports[file_path] = (file_signature(file_path), written)
+    return file_path, written
+
+
+def file_signature(file_path):
+    # Size and modification time of a file, None when it is missing
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
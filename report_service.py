@@ -0,0 +1,351 @@
+"""Local HTTP service for the payroll reports, for tools that need the report data without the GUI.
+
+    python payroll_cli.py serve --port 8765
+
+    GET /reports/monthly?employee_id=7                          Monthly Salary Report
+    GET /reports/summary?employee_id=7&start=2024-01-01&end=2024-12-31   Overall Salary Summary
+    GET /reports/gross?start=2024-01-01&end=2024-01-31&page=2    Gross Pay Report
+    GET /stats                                                   request and query counters
+
+Reports are paginated JSON by default (page, page_size); format=csv streams the whole report as CSV.
+The service runs on asyncio; the queries run on a bounded thread pool, and identical requests that
+arrive while their query is running share it instead of querying again. With a ReportCache, repeated
+JSON pages are served from memory until the salary data changes. Only meant for localhost:
+there is no authentication.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from payroll_database import ReportStream
+import payroll_metrics
+import report_export
+from report_export import REPORT_TYPES
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Rows per JSON page, by default and at most
+PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Query threads, and the queries allowed to wait for one before requests are turned away with 503
+QUERY_WORKERS = 4
+MAX_PENDING_QUERIES = 64
+
+# Rows per CSV chunk, and chunks buffered for each client of a stream
+CSV_CHUNK_ROWS = 2000
+CSV_BUFFERED_CHUNKS = 4
+
+# Largest request head (request line and headers) accepted
+MAX_HEAD_BYTES = 16384
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class RequestError(Exception):
+    # Answered with its HTTP status and message
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def report_query(report_type, employee_id=None, start_date=None, end_date=None):
+    # report_export.report_query, with its errors as HTTP errors
+    if report_type not in REPORT_TYPES:
+        raise RequestError(404, f"unknown report {report_type!r}, expected one of {', '.join(REPORT_TYPES)}")
+    try:
+        return report_export.report_query(report_type, employee_id, start_date, end_date)
+    except ValueError as error:
+        raise RequestError(400, str(error)) from None
+
+
+class CsvBroadcast:
+    # One streamed CSV query shared by every client that asked for it before its first chunk was sent.
+    # The query thread waits for the slowest client (each buffers a few chunks), and stops early when
+    # every client has gone.
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.clients = []
+        self.started = False
+
+    def join(self):
+        client = asyncio.Queue(CSV_BUFFERED_CHUNKS)
+        self.clients.append(client)
+        return client
+
+    def leave(self, client):
+        if client in self.clients:
+            self.clients.remove(client)
+        # Unblocks a publish waiting on this client
+        while not client.empty():
+            client.get_nowait()
+
+    async def publish(self, chunk):
+        # Returns False when there is nobody left to send to
+        self.started = True
+        for client in list(self.clients):
+            if client in self.clients:
+                await client.put(chunk)
+        return bool(self.clients)
+
+    def send(self, chunk):
+        # From the query thread
+        return asyncio.run_coroutine_threadsafe(self.publish(chunk), self.loop).result()
+
+
+class ReportService:
+    # Serves the reports of a PayrollDB over HTTP; start it with serve() (or run_report_service)
+
+    def __init__(self, payroll_db, workers=QUERY_WORKERS, max_pending=MAX_PENDING_QUERIES, cache=None):
+        # cache: a payroll_cache.ReportCache the JSON pages are read through (CSV is always streamed)
+        self.payroll_db = payroll_db
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='report-query')
+        self.max_pending = max_pending
+        self.pending = 0
+        self.pages = {}    # request key -> task of the page query being run for it
+        self.streams = {}  # request key -> CsvBroadcast not yet started
+        self.stats = {'requests': 0, 'queries': 0, 'coalesced': 0, 'rejected': 0, 'errors': 0}
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        # Runs until cancelled; ready (if given) is called with the bound (host, port)
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEAD_BYTES)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def run_query(self, function, *args):
+        # On the query threads; at most max_pending queries are running or waiting for a thread
+        if self.pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            raise RequestError(503, "too many report queries, try again later")
+        self.pending += 1
+        self.stats['queries'] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+        finally:
+            self.pending -= 1
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        # One connection, kept open for further requests unless the client asks to close it
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                method, target, keep_alive = self.parse_head(head)
+                self.stats['requests'] += 1
+                try:
+                    await self.dispatch(writer, method, target, keep_alive)
+                except RequestError as error:
+                    await self.send_json(writer, {'error': str(error)}, keep_alive, error.status)
+                except ConnectionError:
+                    return
+                except Exception as error:
+                    self.stats['errors'] += 1
+                    await self.send_json(writer, {'error': f"{type(error).__name__}: {error}"}, False, 500)
+                    return
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    @staticmethod
+    def parse_head(head):
+        lines = head.decode('latin-1').split('\r\n')
+        parts = lines[0].split()
+        method, target, version = (parts + ['', '', ''])[:3]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+        connection = headers.get('connection', '')
+        keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        return method, target, keep_alive
+
+    async def dispatch(self, writer, method, target, keep_alive):
+        if method != 'GET':
+            raise RequestError(405, "only GET is supported")
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        path = url.path.rstrip('/')
+
+        if path == '/stats':
+            stats = dict(self.stats, pending=self.pending)
+            if self.cache is not None:
+                stats['cache'] = self.cache.stats()
+            if payroll_metrics.enabled:
+                stats['metrics'] = payroll_metrics.metrics.snapshot()
+            await self.send_json(writer, stats, keep_alive)
+            return
+        if not path.startswith('/reports/'):
+            raise RequestError(404, f"no such resource {url.path!r}")
+
+        report_type = path[len('/reports/'):]
+        sql, params = report_query(report_type, query.get('employee_id'), query.get('start'), query.get('end'))
+        output = query.get('format', 'json')
+        if output == 'csv':
+            await self.send_csv(writer, report_type, sql, params, keep_alive)
+        elif output == 'json':
+            page, page_size = self.page_params(query)
+            body = await self.page(report_type, sql, params, page, page_size)
+            await self.send(writer, 200, 'application/json', body, keep_alive)
+        else:
+            raise RequestError(400, f"unknown format {output!r}, expected json or csv")
+
+    @staticmethod
+    def page_params(query):
+        try:
+            page = int(query.get('page', 1))
+            page_size = int(query.get('page_size', PAGE_SIZE))
+        except ValueError:
+            raise RequestError(400, "page and page_size must be whole numbers") from None
+        if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise RequestError(400, f"page must be 1 or more and page_size 1 to {MAX_PAGE_SIZE}")
+        return page, page_size
+
+    async def send(self, writer, status, content_type, body, keep_alive):
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                     f"\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    async def send_json(self, writer, value, keep_alive, status=200):
+        await self.send(writer, status, 'application/json', json.dumps(value).encode(), keep_alive)
+
+    # JSON pages
+
+    async def page(self, report_type, sql, params, page, page_size):
+        # The encoded page; identical requests share the query of the first one
+        key = (report_type, params, page, page_size)
+        task = self.pages.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.run_query(self.read_page, report_type, sql, params, page, page_size))
+            self.pages[key] = task
+            task.add_done_callback(lambda _: self.pages.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+        # A client going away must not cancel the query of the others
+        return await asyncio.shield(task)
+
+    def read_page(self, report_type, sql, params, page, page_size):
+        # Query thread: one row more than the page tells whether there is a next page
+        sql = f"SELECT * FROM ({sql}) LIMIT ? OFFSET ?"
+        params = (*params, page_size + 1, (page - 1) * page_size)
+        if self.cache is not None:
+            # Pages are cached one by one, so a miss costs no more than the page itself
+            report = report_export.cached_query(self.cache, self.payroll_db, f"{report_type} page", sql, params)
+            columns, rows = report.columns, report.rows
+        else:
+            cursor = self.payroll_db.conn.execute(sql, params)
+            columns, rows = [column[0] for column in cursor.description], cursor.fetchall()
+        return json.dumps({
+            'report': report_type,
+            'title': REPORT_TYPES[report_type],
+            'page': page,
+            'page_size': page_size,
+            'next_page': page + 1 if len(rows) > page_size else None,
+            'rows': [dict(zip(columns, row)) for row in rows[:page_size]],
+        }).encode()
+
+    # CSV streams
+
+    async def send_csv(self, writer, report_type, sql, params, keep_alive):
+        # Chunked response fed by a CsvBroadcast; a new query starts unless an identical one has not
+        # sent anything yet
+        key = (report_type, params)
+        broadcast = self.streams.get(key)
+        if broadcast is None or broadcast.started:
+            broadcast = self.streams[key] = CsvBroadcast(asyncio.get_running_loop())
+            client = broadcast.join()
+            query = asyncio.ensure_future(self.run_query(self.stream_csv, broadcast, sql, params))
+            query.add_done_callback(lambda done: self.stream_done(key, broadcast, done))
+        else:
+            self.stats['coalesced'] += 1
+            client = broadcast.join()
+
+        headers_sent = False
+        try:
+            while True:
+                chunk = await client.get()
+                if isinstance(chunk, Exception):
+                    if headers_sent:
+                        # Too late for an error status: cut the response short
+                        raise ConnectionError(str(chunk))
+                    raise chunk
+                if not headers_sent:
+                    writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: text/csv; charset=utf-8\r\n"
+                                 f"Content-Disposition: inline; filename=\"{report_type}.csv\"\r\n"
+                                 f"Transfer-Encoding: chunked\r\n"
+                                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1'))
+                    headers_sent = True
+                if chunk is None:
+                    writer.write(b'0\r\n\r\n')
+                    await writer.drain()
+                    return
+                writer.write(f"{len(chunk):x}\r\n".encode('latin-1') + chunk + b'\r\n')
+                await writer.drain()
+        finally:
+            broadcast.leave(client)
+
+    def stream_done(self, key, broadcast, query):
+        if self.streams.get(key) is broadcast:
+            del self.streams[key]
+        error = query.exception() if not query.cancelled() else RequestError(503, "the report query was cancelled")
+        if error is not None:
+            # Also reaches the clients when the query was turned away before it started
+            for client in list(broadcast.clients):
+                client.put_nowait(error if isinstance(error, RequestError) else RequestError(500, str(error)))
+
+    def stream_csv(self, broadcast, sql, params):
+        # Query thread: sends the report as CSV chunks, then None. Never cached, so memory stays flat
+        # whatever the size of the report.
+        report = ReportStream(self.payroll_db.conn.execute(sql, params), CSV_CHUNK_ROWS)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(report.columns)
+        rows = 0
+        for row in report:
+            writer.writerow(row)
+            rows += 1
+            if rows % CSV_CHUNK_ROWS == 0:
+                if not broadcast.send(buffer.getvalue().encode()):
+                    return
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            broadcast.send(buffer.getvalue().encode())
+        broadcast.send(None)
+
+
+def run_report_service(payroll_db, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=QUERY_WORKERS, cache=None):
+    # Blocks until interrupted
+    service = ReportService(payroll_db, workers, cache=cache)
+
+    def ready(address):
+        print(f"Serving the payroll reports on http://{address[0]}:{address[1]}/reports/ (Ctrl+C to stop)")
+
+    started = time.perf_counter()
+    try:
+        asyncio.run(service.serve(host, port, ready))
+    except KeyboardInterrupt:
+        pass
+    print(f"Served {service.stats['requests']} request(s) with {service.stats['queries']} queries "
+          f"in {time.perf_counter() - started:.0f}s")
@@ -0,0 +1,147 @@
+"""Synthetic employees and salary history for load testing and benchmarks.
+
+Every employee gets exactly one salary entry per month, so the rows are unique by construction and
+are bulk-loaded without any existence checks. Pay figures are computed with the payroll formulas
+from the generated attendance, e.g.
+
+    python payroll_cli.py --db load_test.db db generate --employees 50000 --months 120
+"""
+
+import calendar
+from datetime import date
+
+import numpy as np
+
+from payroll_database import INSERT_SALARY, INSERT_SALARY_OR_IGNORE
+from payroll_engine import GOVERNMENT_TAX_RATE, EmployeeRates, compute_payroll, unpaid_absence
+from payroll_rules import PayrollRules
+
+# Default shape of the generated data
+DISTRIBUTION = {
+    'salary_range': (3000, 10000),
+    'overtime_rate_range': (10, 25),
+    'allowance_range': (500, 2000),
+    'absence_mean': 1.0,         # mean absent days per month (Poisson)
+    'holiday_mean': 2.0,         # mean holidays per month (Poisson)
+    'overtime_share': 0.4,       # share of employee-months with overtime
+    'overtime_mean': 8.0,        # mean overtime hours when there is overtime (Poisson)
+}
+
+# Employee names are a random first name and last name
+FIRST_NAMES = (
+    'Aisha', 'Alex', 'Amal', 'Ana', 'Ben', 'Chen', 'Daniel', 'David', 'Dilan', 'Elena', 'Emily', 'Fatima', 'Hana',
+    'Ibrahim', 'Isuru', 'James', 'Jane', 'John', 'Kamal', 'Kavya', 'Lily', 'Luca', 'Maria', 'Matthew', 'Mei',
+    'Michael', 'Nadia', 'Nimal', 'Olivia', 'Omar', 'Priya', 'Ravi', 'Robert', 'Sahan', 'Sara', 'Sophia',
+    'Tharindu', 'Wei', 'Yusuf', 'Zara',
+)
+LAST_NAMES = (
+    'Anderson', 'Bandara', 'Brown', 'Chen', 'Clark', 'Davis', 'Dias', 'Fernando', 'Garcia', 'Gunawardena',
+    'Haddad', 'Jayasinghe', 'Johnson', 'Khan', 'Kumar', 'Lewis', 'Li', 'Martinez', 'Mendis', 'Nguyen',
+    'Okafor', 'Patel', 'Perera', 'Rajapaksa', 'Rodriguez', 'Rossi', 'Sato', 'Silva', 'Smith', 'Thompson',
+    'Wang', 'Wijesinghe', 'Williams', 'Wilson', 'Young', 'Zhang',
+)
+
+# Salary rows generated and written per batch
+BATCH_ROWS = 200000
+
+
+def month_starts(start_month, months):
+    year, month = start_month.year, start_month.month
+    for _ in range(months):
+        yield date(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def generate_employees(payroll_db, count, rng, distribution=DISTRIBUTION):
+    # Adds `count` employees with random salary figures; returns the number added
+    salaries = rng.integers(*distribution['salary_range'], count, endpoint=True).tolist()
+    overtime_rates = rng.integers(*distribution['overtime_rate_range'], count, endpoint=True).tolist()
+    allowances = rng.integers(*distribution['allowance_range'], count, endpoint=True).tolist()
+    first_names = rng.integers(len(FIRST_NAMES), size=count).tolist()
+    last_names = rng.integers(len(LAST_NAMES), size=count).tolist()
+
+    return payroll_db.insert_many((f"{FIRST_NAMES[first_names[i]]} {LAST_NAMES[last_names[i]]}", salaries[i],
+                                   overtime_rates[i], allowances[i]) for i in range(count))
+
+
+def salary_batches(rates, start_month, months, rng, distribution=DISTRIBUTION, leave_limit=None,
+                   tax_rate=GOVERNMENT_TAX_RATE):
+    # Yields salary rows for every employee and month, a batch of employees at a time.
+    # Rows are ordered by employee, then month, which keeps the (employee_id, salaried_month) index
+    # appends sequential.
+    # With a leave_limit, absences beyond it within a year are unpaid, counting only the generated months.
+    # tax_rate is as in compute_payroll.
+    starts = list(month_starts(start_month, months))
+    salaried_months = np.array([start.replace(day=28).strftime('%Y-%m-%d') for start in starts])
+    cycle_days = np.array([calendar.monthrange(start.year, start.month)[1] for start in starts])
+    years = np.array([start.year for start in starts])
+
+    batch_employees = max(BATCH_ROWS // max(months, 1), 1)
+    for first in range(0, len(rates), batch_employees):
+        last = min(first + batch_employees, len(rates))
+        shape = (last - first, months)
+
+        absent = np.minimum(rng.poisson(distribution['absence_mean'], shape), cycle_days)
+        holidays = np.minimum(rng.poisson(distribution['holiday_mean'], shape), cycle_days - absent)
+        overtime_hours = np.where(rng.random(shape) < distribution['overtime_share'],
+                                  rng.poisson(distribution['overtime_mean'], shape), 0)
+
+        unpaid = absent
+        if leave_limit is not None:
+            # Leave taken earlier in the same year: the running total of the year's months before each one
+            taken = np.zeros_like(absent)
+            for year in np.unique(years):
+                columns = years == year
+                taken[:, columns] = np.cumsum(absent[:, columns], axis=1) - absent[:, columns]
+            unpaid = unpaid_absence(absent, taken, leave_limit)
+
+        no_pay, base_pay, gross_pay = compute_payroll(
+            rates.monthly_salary[first:last, None], rates.allowances[first:last, None],
+            rates.overtime_rate[first:last, None], unpaid, overtime_hours, cycle_days, tax_rate)
+
+        yield zip(np.repeat(rates.employee_id[first:last], months).tolist(), absent.ravel().tolist(),
+                  holidays.ravel().tolist(), overtime_hours.ravel().tolist(),
+                  np.broadcast_to(no_pay, shape).ravel().tolist(), np.broadcast_to(base_pay, shape).ravel().tolist(),
+                  np.broadcast_to(gross_pay, shape).ravel().tolist(), np.tile(salaried_months, shape[0]).tolist())
+
+
+def generate_salary_history(payroll_db, start_month, months, rng, distribution=DISTRIBUTION, skip_existing=False,
+                            first_employee_id=None):
+    # Adds one salary entry per month for every employee in the database (or those from
+    # first_employee_id on); returns the number added.
+    # With skip_existing, months already recorded for an employee are left untouched.
+    rates = EmployeeRates.load(payroll_db)
+    if first_employee_id is not None:
+        rates = rates.select(rates.employee_id >= first_employee_id)
+    # Paid by the current payroll settings, as run_payroll and recompute_changes would
+    rules = PayrollRules.load(payroll_db)
+    written = 0
+    if skip_existing:
+        # The unique index is what skips the existing entries, so it has to stay in place
+        with payroll_db.transaction():
+            for rows in salary_batches(rates, start_month, months, rng, distribution, rules.leave_limit,
+                                       rules.tax):
+                written += payroll_db.execute_many(INSERT_SALARY_OR_IGNORE, rows)
+    else:
+        with payroll_db.salary_bulk_load():
+            for rows in salary_batches(rates, start_month, months, rng, distribution, rules.leave_limit,
+                                       rules.tax):
+                written += payroll_db.execute_many(INSERT_SALARY, rows)
+    return written
+
+
+def generate_dataset(payroll_db, employees, months, start_month=date(2018, 1, 1), seed=0, **distribution):
+    # Adds `employees` employees with `months` months of salary history each, in a single transaction.
+    # Keyword arguments override entries of DISTRIBUTION.
+    distribution = dict(DISTRIBUTION, **distribution)
+    unknown = set(distribution) - set(DISTRIBUTION)
+    if unknown:
+        raise ValueError(f"Unknown distribution setting(s): {', '.join(sorted(unknown))}")
+
+    rng = np.random.default_rng(seed)
+    with payroll_db.transaction():
+        first = payroll_db.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM employees").fetchone()[0]
+        generate_employees(payroll_db, employees, rng, distribution)
+        salary_entries = generate_salary_history(payroll_db, start_month, months, rng, distribution,
+                                                 first_employee_id=first)
+    return employees, salary_entries
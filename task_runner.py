@@ -0,0 +1,171 @@
+"""Background tasks for the Tk GUI.
+
+Long operations (report queries and exports) run on a thread pool so the Tk event loop keeps
+drawing and handling input. Worker threads never touch widgets: they post progress and results to a
+queue, and the GUI thread drains it with after() polling and calls the task callbacks there.
+
+Only the after() method of the widget is used, so the runner also works with a stand-in event loop
+(see benchmarks/bench_gui_latency.py).
+"""
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# How often the GUI thread checks for task events while tasks are active
+POLL_MS = 50
+
+# Task states
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Task:
+    # One unit of work. The function gets the task as its first argument and may call progress() and
+    # check_cancelled() from the worker thread; callbacks run on the GUI thread.
+
+    _ids = itertools.count(1)
+
+    def __init__(self, name, function, args=(), on_done=None, on_error=None, on_progress=None, on_cancel=None):
+        self.id = next(self._ids)
+        self.name = name
+        self.function = function
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.on_cancel = on_cancel
+        self.state = QUEUED
+        self.started = self.finished = None
+        self._cancelled = threading.Event()
+        self._events = None
+
+    def cancel(self):
+        # Queued tasks never start; running tasks stop at their next check_cancelled()/progress() call
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check_cancelled(self):
+        if self._cancelled.is_set():
+            raise TaskCancelled(self.name)
+
+    def progress(self, done, total=None):
+        # Called from the worker thread; also a cancellation point
+        self.check_cancelled()
+        self._events.put((self, 'progress', (done, total)))
+
+    def run(self):
+        if self._cancelled.is_set():
+            self._events.put((self, CANCELLED, None))
+            return
+        self.started = time.perf_counter()
+        self._events.put((self, RUNNING, None))
+        try:
+            result = self.function(self, *self.args)
+        except TaskCancelled:
+            self._events.put((self, CANCELLED, None))
+        except Exception as error:
+            self._events.put((self, FAILED, error))
+        else:
+            self._events.put((self, DONE, result))
+
+
+class TaskRunner:
+    def __init__(self, widget, workers=2, poll_ms=POLL_MS, on_change=None):
+        # on_change(task) is called on the GUI thread whenever a task changes state
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.on_change = on_change
+        self.tasks = []  # queued and running tasks, in submission order
+        self._events = queue.SimpleQueue()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='task')
+        self._polling = False
+
+    def submit(self, task):
+        task._events = self._events
+        self.tasks.append(task)
+        self._executor.submit(task.run)
+        if self.on_change:
+            self.on_change(task)
+        if not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_ms, self._poll)
+        return task
+
+    def cancel_all(self):
+        for task in self.tasks:
+            task.cancel()
+
+    def shutdown(self):
+        # Cancels everything; queued tasks are dropped, running ones stop at their next check
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        # Runs on the GUI thread: hands the queued task events to their callbacks
+        while True:
+            try:
+                task, kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            self._dispatch(task, kind, payload)
+
+        self._polling = bool(self.tasks)
+        if self._polling:
+            self.widget.after(self.poll_ms, self._poll)
+
+    def _dispatch(self, task, kind, payload):
+        if kind == 'progress':
+            if task.on_progress and not task.cancelled:
+                task.on_progress(task, *payload)
+            return
+
+        task.state = kind
+        if kind in (DONE, FAILED, CANCELLED):
+            task.finished = time.perf_counter()
+            self.tasks.remove(task)
+        if self.on_change:
+            self.on_change(task)
+
+        if kind == DONE and task.on_done:
+            task.on_done(task, payload)
+        elif kind == FAILED and task.on_error:
+            task.on_error(task, payload)
+        elif kind == CANCELLED and task.on_cancel:
+            task.on_cancel(task)
+
+
+class LatencyMonitor:
+    # Measures how late after() callbacks fire on the event loop: a responsive GUI thread runs them
+    # close to on time, a blocked one late by however long it was blocked
+
+    def __init__(self, widget, interval_ms=10):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.delays = []
+        self._running = False
+        self._expected = None
+
+    def start(self):
+        self._running = True
+        self._schedule()
+
+    def stop(self):
+        self._running = False
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self.widget.after(self.interval_ms, self._tick)
+
+    def _tick(self):
+        self.delays.append(max(time.perf_counter() - self._expected, 0.0))
+        if self._running:
+            self._schedule()
@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.bench_import_time import BUDGETS_MS, check_module
+
+
+@pytest.mark.parametrize('module', sorted(BUDGETS_MS))
+def test_import_within_budget(module):
+    # Within its import time budget, without importing the heavy modules or creating files
+    median, failures = check_module(module)
+    assert not failures, "\n".join(failures)